@@ -0,0 +1,94 @@
+"""Start-up import time of the app's modules, measured in fresh interpreters.
+
+The modules ``main.py`` imports at start-up are timed together. Heavy
+optional dependencies are timed on their own for comparison. The run fails
+if importing the app modules pulls in a dependency that should only load on
+first use.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imported by the app on first use; checked with the start-up set so they stay light too
+FIRST_USE_MODULES = ("ocr_pipeline.fingerprint",)
+LAZY_DEPENDENCIES = ("mistralai", "PyPDF2", "reportlab", "markdown", "PIL")
+REFERENCE_MODULES = ("streamlit", "mistralai.client", "PyPDF2", "reportlab.platypus")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": sorted({{m.split(".")[0] for m in sys.modules}})}}))
+"""
+
+
+def app_modules(path=os.path.join(REPO_ROOT, "main.py")):
+    """The ``ocr_pipeline`` modules ``main.py`` imports at start-up, read from its top-level imports."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    modules = set(FIRST_USE_MODULES)
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        elif isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        else:
+            continue
+        modules.update(name for name in names if name.split(".")[0] == "ocr_pipeline")
+    return tuple(sorted(modules))
+
+
+def measure(modules, repeat):
+    """Median import time of ``modules`` over ``repeat`` fresh interpreters, plus the modules loaded."""
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", PROBE.format(modules=tuple(modules))],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"}
+        result = json.loads(proc.stdout)
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"median_ms": round(statistics.median(timings) * 1000, 1), "min_ms": round(min(timings) * 1000, 1), "loaded": loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.import_time", description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Interpreters started per measurement (default: %(default)s)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {"app": measure(app_modules(), args.repeat)}
+    for name in REFERENCE_MODULES:
+        results[name] = measure([name], args.repeat)
+
+    leaked = [dep for dep in LAZY_DEPENDENCIES if dep in results["app"].get("loaded", [])]
+    width = max(len(key) for key in results)
+    for key, value in results.items():
+        if "error" in value:
+            print(f"{key:<{width}}  unavailable ({value['error']})")
+        else:
+            print(f"{key:<{width}}  {value['median_ms']:>8.1f} ms median  {value['min_ms']:>8.1f} ms min")
+    if leaked:
+        print(f"app start-up imports lazy dependencies: {', '.join(leaked)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                key: {k: v for k, v in value.items() if k != "loaded"} for key, value in results.items()
+            } | {"leaked": leaked}, f, indent=2)
+    return 1 if leaked or "error" in results["app"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""Local stand-in for the Mistral OCR endpoint (``POST /v1/ocr``).
+
+Latency, per-page delay, error injection and response size are configurable
+so the pipeline can be benchmarked without API credits or network variance.
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_MARKER = re.compile(rb"/Type\s*/Page\b")
+FILLER = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua. "
+)
+
+
+class MockConfig:
+    """Behaviour knobs for the mock server."""
+
+    def __init__(self, latency="lognormal", latency_ms=400.0, latency_sigma=0.5, per_page_ms=50.0,
+                 error_429=0.0, error_502=0.0, markdown_chars=2000, image_base64_bytes=0, seed=None):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.per_page_ms = per_page_ms
+        self.error_429 = error_429
+        self.error_502 = error_502
+        self.markdown_chars = markdown_chars
+        self.image_base64_bytes = image_base64_bytes
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def base_delay(self):
+        """Fixed per-request latency in seconds, drawn from the configured distribution."""
+        with self.lock:
+            if self.latency == "constant":
+                ms = self.latency_ms
+            elif self.latency == "uniform":
+                ms = self.random.uniform(0, 2 * self.latency_ms)
+            else:
+                ms = self.latency_ms * self.random.lognormvariate(0, self.latency_sigma)
+        return ms / 1000.0
+
+    def roll_error(self):
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.error_429:
+            return 429
+        if roll < self.error_429 + self.error_502:
+            return 502
+        return None
+
+
+def count_pages(document):
+    """Page count of the request document (1 for images and remote URLs)."""
+    source = document.get("document_url") or document.get("image_url") or ""
+    if isinstance(source, dict):
+        source = source.get("url", "")
+    if not source.startswith("data:application/pdf"):
+        return 1
+    data = base64.b64decode(source.split(",", 1)[1])
+    try:
+        import PyPDF2
+        return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+    except Exception:
+        return max(1, len(PAGE_MARKER.findall(data)))
+
+
+def build_response(config, pages, request_bytes, include_image_base64):
+    markdown = (FILLER * (config.markdown_chars // len(FILLER) + 1))[:config.markdown_chars]
+    image_payload = "A" * config.image_base64_bytes if include_image_base64 else None
+    return {
+        "model": "mistral-ocr-latest",
+        "pages": [
+            {
+                "index": n,
+                "markdown": f"# Page {n + 1}\n\n{markdown}",
+                "images": [] if image_payload is None else [{
+                    "id": f"img-{n}.jpeg",
+                    "top_left_x": 0,
+                    "top_left_y": 0,
+                    "bottom_right_x": 100,
+                    "bottom_right_y": 100,
+                    "image_base64": f"data:image/jpeg;base64,{image_payload}",
+                }],
+                "dimensions": {"dpi": 200, "height": 2200, "width": 1700},
+            }
+            for n in range(pages)
+        ],
+        "usage_info": {"pages_processed": pages, "doc_size_bytes": request_bytes},
+    }
+
+
+class MockOCRHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.path.rstrip("/") != "/v1/ocr":
+            return self._send(404, {"message": "Not found"})
+
+        config = self.server.config
+        request = json.loads(body)
+        pages = count_pages(request.get("document", {}))
+        time.sleep(config.base_delay() + pages * config.per_page_ms / 1000.0)
+
+        stats = self.server.stats
+        with stats["lock"]:
+            stats["requests"] += 1
+            stats["bytes_in"] += length
+
+        error = config.roll_error()
+        if error == 429:
+            return self._send(429, {"message": "Requests rate limit exceeded"})
+        if error == 502:
+            return self._send(502, {"message": "Bad gateway"})
+
+        response = build_response(config, pages, length, request.get("include_image_base64", False))
+        with stats["lock"]:
+            stats["pages"] += pages
+        self._send(200, response)
+
+
+class MockOCRServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, MockOCRHandler)
+        self.config = config
+        self.stats = {"lock": threading.Lock(), "requests": 0, "pages": 0, "bytes_in": 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_mock_server(config, host="127.0.0.1", port=0):
+    """Start the mock server on a background thread and return it."""
+    server = MockOCRServer((host, port), config)
+    thread = threading.Thread(target=server.serve_forever, name="mock-ocr", daemon=True)
+    thread.start()
+    return server
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency", choices=("constant", "uniform", "lognormal"), default="lognormal", help="Per-request latency distribution (default: %(default)s)")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="Mean per-request latency (default: %(default)s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal sigma (default: %(default)s)")
+    parser.add_argument("--per-page-ms", type=float, default=50.0, help="Extra latency per page (default: %(default)s)")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-502", type=float, default=0.0, help="Fraction of requests answered with 502")
+    parser.add_argument("--markdown-chars", type=int, default=2000, help="Markdown size per page (default: %(default)s)")
+    parser.add_argument("--image-base64-bytes", type=int, default=0, help="Base64 image payload per page when include_image_base64 is set")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+
+
+def config_from_args(args):
+    return MockConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        per_page_ms=args.per_page_ms,
+        error_429=args.error_429,
+        error_502=args.error_502,
+        markdown_chars=args.markdown_chars,
+        image_base64_bytes=args.image_base64_bytes,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.mock_server", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8910)
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+    server = MockOCRServer((args.host, args.port), config_from_args(args))
+    print(f"Mock OCR server on {server.url}/v1/ocr")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Offline throughput benchmark of the OCR pipeline against the local mock server."""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ocr_pipeline import pipeline
+from ocr_pipeline.client import get_client
+from ocr_pipeline.dispatch import Dispatcher
+from ocr_pipeline.governor import GOVERNOR
+from ocr_pipeline.pipeline import process_image, process_images, process_pdf_bytes
+from ocr_pipeline.singleflight import IN_FLIGHT
+
+from .mock_server import add_config_arguments, config_from_args, start_mock_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = {
+    "paper": (os.path.join(REPO_ROOT, "2201.04234v3.pdf"), "application/pdf"),
+    "prescription": (os.path.join(REPO_ROOT, "A-sample-prescription-image-in-grayscale-version.png"), "image/png"),
+}
+CORPORA = {
+    "paper": ["paper"],
+    "prescription": ["prescription"],
+    "mixed": ["paper", "prescription", "prescription", "prescription"],
+}
+
+
+def load_corpus(name, copies):
+    """Return (name, bytes, mime_type) tuples for ``copies`` repetitions of a corpus."""
+    cache = {}
+    items = []
+    for n in range(copies):
+        for fixture in CORPORA[name]:
+            if fixture not in cache:
+                path, mime_type = FIXTURES[fixture]
+                with open(path, "rb") as f:
+                    cache[fixture] = (f.read(), mime_type)
+            data, mime_type = cache[fixture]
+            items.append((f"{fixture}_{n}", data, mime_type))
+    return items
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(client, item, chunk_size, dispatcher=None):
+    name, data, mime_type = item
+    start = time.perf_counter()
+    if mime_type == "application/pdf":
+        doc = process_pdf_bytes(client, name, data, chunk_size=chunk_size, dispatcher=dispatcher, preview_src=None)
+    else:
+        doc = process_image(client, name, image_bytes=data, mime_type=mime_type, dispatcher=dispatcher, preview_src=None)
+    return time.perf_counter() - start, doc
+
+
+def run_benchmark(client, items, concurrency, chunk_size, dispatcher=None, pack_images=False):
+    latencies = []
+    pages = 0
+    failures = 0
+    packed = [item for item in items if item[2] != "application/pdf"] if pack_images else []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = executor.map(
+            lambda item: run_one(client, item, chunk_size, dispatcher), [item for item in items if item not in packed]
+        )
+        if packed:
+            images = [{"name": name, "data": data, "mime_type": mime_type, "preview_src": None} for name, data, mime_type in packed]
+            for doc in process_images(client, images, dispatcher=dispatcher):
+                latencies.append(time.perf_counter() - start)
+                pages += doc.page_count
+                failures += bool(doc.errors)
+        for latency, doc in outcomes:
+            latencies.append(latency)
+            pages += doc.page_count
+            failures += bool(doc.errors)
+    elapsed = time.perf_counter() - start
+    return {
+        "documents": len(items),
+        "pages": pages,
+        "failed_documents": failures,
+        "elapsed_s": round(elapsed, 3),
+        "documents_per_s": round(len(items) / elapsed, 3),
+        "pages_per_s": round(pages / elapsed, 3),
+        "latency_p50_s": round(percentile(latencies, 50), 3),
+        "latency_p95_s": round(percentile(latencies, 95), 3),
+        "latency_p99_s": round(percentile(latencies, 99), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__)
+    parser.add_argument("--corpus", choices=sorted(CORPORA), default="mixed", help="Fixture corpus (default: %(default)s)")
+    parser.add_argument("--copies", type=int, default=5, help="Repetitions of the corpus (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Documents in flight (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=10, help="Pages per PDF chunk (default: %(default)s)")
+    parser.add_argument("--no-pause", action="store_true", help="Skip the pipeline's fixed pause after each request")
+    parser.add_argument("--dispatch", type=int, default=0, help="Send requests through the async dispatcher with this many in flight")
+    parser.add_argument("--pack-images", action="store_true", help="Send the corpus's images in shared multi-page PDF requests")
+    parser.add_argument("--share-requests", action="store_true", help="Let concurrent identical requests (the corpus copies) share one call")
+    parser.add_argument("--json", help="Also write the results to this file")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.no_pause:
+        pipeline.REQUEST_PAUSE = 0
+    # The corpus copies are identical; by default they stand in for distinct documents
+    IN_FLIGHT.enabled = args.share_requests
+    GOVERNOR.configure(max_requests=max(args.concurrency, args.dispatch))
+    server = start_mock_server(config_from_args(args))
+    client = get_client("benchmark", max_connections=max(args.concurrency, args.dispatch), server_url=server.url)
+    items = load_corpus(args.corpus, args.copies)
+
+    dispatcher = Dispatcher(args.dispatch) if args.dispatch > 0 else None
+    results = run_benchmark(client, items, args.concurrency, args.chunk_size, dispatcher, args.pack_images)
+    results["requests"] = server.stats["requests"]
+    results["request_mb"] = round(server.stats["bytes_in"] / (1024 * 1024), 2)
+    results["config"] = {k: v for k, v in vars(args).items() if k != "json"}
+    server.shutdown()
+
+    width = max(len(key) for key in results)
+    for key, value in results.items():
+        if key != "config":
+            print(f"{key:<{width}}  {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,26 @@
 import streamlit as st
 import os
 import base64
-import json
 import time
-import tempfile
-from mistralai.client import Mistral
-import PyPDF2
-import io
-import re
-import markdown
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-import hashlib
+from ocr_pipeline.cancellation import CancelToken
+from ocr_pipeline.client import get_client
+from ocr_pipeline.dispatch import DEFAULT_CONCURRENCY, get_dispatcher
+from ocr_pipeline.document import OCRDocument
+from ocr_pipeline.download import PdfDownloader, Prefetcher
+from ocr_pipeline.export import create_pdf_from_markdown, json_payload
+from ocr_pipeline.governor import GOVERNOR
+from ocr_pipeline.imaging import ImagePrep, pillow_available
+from ocr_pipeline.jobqueue import JobQueue
+from ocr_pipeline.journal import JobJournal, source_key
+from ocr_pipeline.metrics import EXPORT_SECONDS, QUEUE_DEPTH, start_metrics_server
+from ocr_pipeline.packing import FrameChunks, is_tiff
+from ocr_pipeline.pipeline import (PARTIAL_NOTE, process_image, process_image_frames, process_images,
+                                   process_pdf_bytes, process_pdf_url, shortest_first)
+from ocr_pipeline.profiling import Profiler
+from ocr_pipeline.tiling import ImageTiler
+from ocr_pipeline.timing import NULL_TIMELINE, Timeline
+from ocr_pipeline.workers import ProcessWorkerPool
 
 # Set page configuration with a modern layout
 st.set_page_config(
@@ -1081,11 +1085,7 @@ st.markdown("""
 # Initialize session state
 def init_session_state():
     defaults = {
-        "ocr_result": [],
-        "cleaned_result": [],
-        "preview_src": [],
-        "image_bytes": [],
-        "file_names": [],
+        "documents": [],
         "processing_history": [],
         "total_pages_processed": 0,
         "total_documents_processed": 0,
@@ -1101,6 +1101,32 @@ def init_session_state():
 
 init_session_state()
 
+@st.cache_resource
+def get_journal():
+    """Process-wide job journal shared by all sessions."""
+    return JobJournal()
+
+@st.cache_resource
+def get_job_queue():
+    """Process-wide handle on the local job queue."""
+    queue = JobQueue()
+    QUEUE_DEPTH.set_function(queue.depth)
+    return queue
+
+@st.cache_resource
+def get_metrics_server():
+    """Prometheus endpoint on $OCR_METRICS_PORT, if set."""
+    return start_metrics_server()
+
+@st.cache_resource
+def get_worker_pool(api_key):
+    """Worker processes draining the job queue, started once per server process."""
+    pool = ProcessWorkerPool(api_key)
+    pool.start()
+    return pool
+
+get_metrics_server()
+
 # Sidebar with enhanced features
 with st.sidebar:
     st.markdown("""
@@ -1162,6 +1188,20 @@ with st.sidebar:
         </div>
         """, unsafe_allow_html=True)
     
+    # Unfinished jobs from the journal (interrupted sessions or restarts)
+    unfinished_jobs = get_journal().list_jobs(status="running", limit=5)
+    if unfinished_jobs:
+        st.markdown("### ♻️ Unfinished Jobs")
+        for job in unfinished_jobs:
+            chunks_done = sum(d["chunks_done"] for d in job["documents"])
+            st.markdown(f"""
+            <div class="history-item">
+                <div class="history-item-title">Job {job['job_id']}</div>
+                <div class="history-item-meta">{len(job['documents'])} docs • {chunks_done} chunks saved • {datetime.fromtimestamp(job['updated_at']).strftime('%H:%M')}</div>
+            </div>
+            """, unsafe_allow_html=True)
+        st.caption("Re-submit the same files to resume; finished chunks are skipped.")
+    
     st.markdown("<div class='custom-divider'></div>", unsafe_allow_html=True)
     
     # Advanced Settings
@@ -1293,305 +1333,17 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Helper functions
-def split_pdf(pdf_bytes, chunk_size=100):
-    """Split large PDFs into smaller chunks for processing."""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-    total_pages = len(pdf_reader.pages)
-    chunks = []
-    
-    if total_pages <= chunk_size:
-        return [pdf_bytes], total_pages
-    
-    for i in range(0, total_pages, chunk_size):
-        end_page = min(i + chunk_size, total_pages)
-        pdf_writer = PyPDF2.PdfWriter()
-        
-        for page_num in range(i, end_page):
-            pdf_writer.add_page(pdf_reader.pages[page_num])
-        
-        output = io.BytesIO()
-        pdf_writer.write(output)
-        output.seek(0)
-        chunks.append(output.getvalue())
-    
-    return chunks, total_pages
-
-def clean_ocr_text(text, cleanup_level="medium"):
-    """Clean up OCR text with configurable intensity."""
-    original_text = text
-    
-    # Level-based cleaning intensity
-    if cleanup_level == "light":
-        # Just basic cleanup
-        text = re.sub(r'(\d+\.){10,}(\d+)', '', text)
-        text = re.sub(r'!\[img-\d+\.jpeg\]\(img-\d+\.jpeg\)', '', text)
-        return text
-    
-    # Table formatting
-    table_pattern = r'(\|[^\n]+\|)'
-    def fix_table(match):
-        table_row = match.group(1)
-        cells = table_row.split('|')
-        cells = [cell.strip() for cell in cells if cell.strip()]
-        if cells:
-            return '| ' + ' | '.join(cells) + ' |'
-        return match.group(1)
-    
-    text = re.sub(table_pattern, fix_table, text)
-    
-    # Remove garbage sequences
-    text = re.sub(r'(\d+\.){10,}(\d+)', '', text)
-    
-    # Fix heading formatting
-    text = re.sub(r'#([A-Z])', r'# \1', text)
-    text = re.sub(r'(# [^\n]+)\n\1', r'\1', text)
-    
-    # Clean up image references
-    text = re.sub(r'!\[img-\d+\.jpeg\]\(img-\d+\.jpeg\)', '', text)
-    
-    # Chapter formatting
-    text = re.sub(r'(?<!#)Chapter (\d+)', r'## Chapter \1', text)
-    
-    if cleanup_level == "aggressive":
-        # Additional aggressive cleaning
-        text = re.sub(r'\n{4,}', '\n\n\n', text)
-        text = re.sub(r'[ \t]+\n', '\n', text)
-        text = re.sub(r'\n[ \t]+', '\n', text)
-        
-        # Join broken lines
-        lines = text.split('\n')
-        i = 0
-        while i < len(lines) - 1:
-            if (lines[i] and not lines[i].startswith('#') and 
-                not lines[i].startswith('|') and not lines[i].startswith('```') and
-                not lines[i].startswith('- ') and not lines[i].startswith('* ') and
-                not lines[i].startswith('1. ') and not lines[i].endswith('.') and
-                not lines[i].endswith('?') and not lines[i].endswith('!') and
-                not lines[i].endswith(':') and lines[i+1] and
-                not lines[i+1].startswith('#') and not lines[i+1].startswith('|') and
-                not lines[i+1].startswith('```') and not lines[i+1].startswith('- ') and
-                not lines[i+1].startswith('* ') and not lines[i+1].startswith('1. ')):
-                lines[i] = lines[i] + ' ' + lines[i+1]
-                lines.pop(i+1)
-            else:
-                i += 1
-        text = '\n'.join(lines)
-    
-    # Spacing around headers
-    text = re.sub(r'(^|\n)(#+ [^\n]+)(?!\n\n)', r'\1\2\n\n', text)
-    
-    return text
-
-def create_pdf_from_markdown(markdown_text, file_name):
-    """Convert markdown text to a beautifully formatted PDF."""
-    try:
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(
-            buffer, 
-            pagesize=letter,
-            rightMargin=60, 
-            leftMargin=60,
-            topMargin=60, 
-            bottomMargin=60
-        )
-        
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Title'],
-            textColor=colors.HexColor('#6366f1'),
-            fontSize=24,
-            fontName='Helvetica-Bold',
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-        
-        heading1_style = ParagraphStyle(
-            'CustomH1',
-            parent=styles['Heading1'],
-            textColor=colors.HexColor('#1f2937'),
-            fontSize=18,
-            fontName='Helvetica-Bold',
-            spaceBefore=20,
-            spaceAfter=12
-        )
-        
-        heading2_style = ParagraphStyle(
-            'CustomH2',
-            parent=styles['Heading2'],
-            textColor=colors.HexColor('#374151'),
-            fontSize=14,
-            fontName='Helvetica-Bold',
-            spaceBefore=16,
-            spaceAfter=8
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            leading=14,
-            textColor=colors.HexColor('#4b5563'),
-            alignment=TA_JUSTIFY
-        )
-        
-        code_style = ParagraphStyle(
-            'CustomCode',
-            parent=styles['Normal'],
-            fontName='Courier',
-            fontSize=8,
-            backColor=colors.HexColor('#f3f4f6'),
-            borderPadding=8,
-            leading=12
-        )
-        
-        def sanitize_text(text):
-            text = re.sub(r'<([^>]+)>', r'&lt;\1&gt;', text)
-            replacements = {
-                '&': '&amp;',
-                '"': '&quot;',
-                "'": '&#39;',
-                '\u2028': ' ',
-                '\u2029': ' ',
-            }
-            for char, replacement in replacements.items():
-                text = text.replace(char, replacement)
-            return text
-        
-        sanitized_text = sanitize_text(markdown_text)
-        lines = sanitized_text.split('\n')
-        
-        # Add document header
-        elements.append(Paragraph(f"📄 {file_name}", title_style))
-        elements.append(Paragraph(f"Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", 
-                                 ParagraphStyle('Meta', parent=normal_style, alignment=TA_CENTER, textColor=colors.HexColor('#9ca3af'))))
-        elements.append(Spacer(1, 30))
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            if line.startswith('# '):
-                elements.append(Paragraph(sanitize_text(line[2:]), title_style))
-                elements.append(Spacer(1, 12))
-            elif line.startswith('## '):
-                elements.append(Paragraph(sanitize_text(line[3:]), heading1_style))
-                elements.append(Spacer(1, 10))
-            elif line.startswith('### '):
-                elements.append(Paragraph(sanitize_text(line[4:]), heading2_style))
-                elements.append(Spacer(1, 8))
-            elif line.startswith('|') and '|' in line[1:]:
-                table_data = []
-                table_row = [sanitize_text(cell.strip()) for cell in line.split('|') if cell.strip()]
-                table_data.append(table_row)
-                i += 1
-                if i < len(lines) and '---' in lines[i]:
-                    i += 1
-                while i < len(lines) and lines[i].strip().startswith('|'):
-                    table_row = [sanitize_text(cell.strip()) for cell in lines[i].split('|') if cell.strip()]
-                    table_data.append(table_row)
-                    i += 1
-                if table_data:
-                    max_cols = max(len(row) for row in table_data)
-                    for row in table_data:
-                        while len(row) < max_cols:
-                            row.append('')
-                    table = Table(table_data)
-                    table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 9),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                        ('TOPPADDING', (0, 0), (-1, 0), 12),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
-                    ]))
-                    elements.append(table)
-                    elements.append(Spacer(1, 12))
-                continue
-            elif line.startswith('```'):
-                code_content = []
-                i += 1
-                while i < len(lines) and not lines[i].startswith('```'):
-                    code_content.append(sanitize_text(lines[i]))
-                    i += 1
-                if i < len(lines):
-                    i += 1
-                if code_content:
-                    code_text = '<pre>' + '\n'.join(code_content) + '</pre>'
-                    elements.append(Paragraph(code_text, code_style))
-                    elements.append(Spacer(1, 12))
-                continue
-            elif line and not line.startswith(('- ', '* ', '1. ')):
-                paragraph_text = line
-                next_idx = i + 1
-                while (next_idx < len(lines) and 
-                       lines[next_idx].strip() and 
-                       not lines[next_idx].strip().startswith(('# ', '## ', '### ', '- ', '* ', '1. ', '|', '```'))):
-                    paragraph_text += ' ' + lines[next_idx].strip()
-                    next_idx += 1
-                try:
-                    elements.append(Paragraph(sanitize_text(paragraph_text), normal_style))
-                    elements.append(Spacer(1, 8))
-                except Exception:
-                    elements.append(Paragraph('[Content rendering error]', normal_style))
-                    elements.append(Spacer(1, 8))
-                i = next_idx - 1
-            elif line.startswith(('- ', '* ')):
-                list_items = [line[2:]]
-                next_idx = i + 1
-                while next_idx < len(lines) and lines[next_idx].strip().startswith(('- ', '* ')):
-                    list_items.append(lines[next_idx].strip()[2:])
-                    next_idx += 1
-                for item in list_items:
-                    bullet_text = '• ' + sanitize_text(item)
-                    try:
-                        elements.append(Paragraph(bullet_text, normal_style))
-                    except Exception:
-                        elements.append(Paragraph('• [Item error]', normal_style))
-                elements.append(Spacer(1, 8))
-                i = next_idx - 1
-            
-            i += 1
-        
-        if len(elements) <= 3:
-            elements.append(Paragraph(f"{file_name} - Extracted Text", title_style))
-            elements.append(Spacer(1, 12))
-            elements.append(Paragraph("Document processed successfully.", normal_style))
-        
-        doc.build(elements)
-        pdf_data = buffer.getvalue()
-        buffer.close()
-        return pdf_data
-        
-    except Exception as e:
-        st.warning(f"PDF generation error: {e}")
-        return None
-
-def get_word_count(text):
-    """Get approximate word count from text."""
-    return len(text.split())
-
-def get_char_count(text):
-    """Get character count from text."""
-    return len(text)
-
 # Main app section
 st.markdown('<div class="section-container">', unsafe_allow_html=True)
 
 # API Key handling
 api_key = None
+shared_api_key = False
 
 try:
     if hasattr(st, 'secrets') and len(st.secrets) > 0 and "MISTRAL_API_KEY" in st.secrets:
         api_key = st.secrets["MISTRAL_API_KEY"]
+        shared_api_key = True
         st.session_state["api_key_valid"] = True
         st.markdown('''
         <div style="
@@ -1773,11 +1525,71 @@ if file_type == "PDF":
             value=False,
             help="Add page number markers in the extracted text"
         )
+        
+        checkpoint_enabled = st.checkbox(
+            "Checkpoint progress for resume",
+            value=True,
+            help="Save each finished chunk to the local job journal. Re-submitting the same file after an interruption skips chunks that already finished."
+        )
+        
+        pack_images = st.checkbox(
+            "Pack small images into shared requests",
+            value=pillow_available(),
+            disabled=not pillow_available(),
+            help="Send uploaded images up to 20 at a time as one multi-page PDF request instead of one request each. Results, file names and previews are unchanged." + ("" if pillow_available() else " Requires Pillow.")
+        )
+        
+        preprocess_images = st.checkbox(
+            "Optimize images before upload",
+            value=False,
+            disabled=not pillow_available(),
+            help="Turn uploaded images upright, downscale large photos and high-DPI scans, strip metadata and re-encode them before upload. The preview keeps the original." + ("" if pillow_available() else " Requires Pillow.")
+        )
+        
+        tile_images = st.checkbox(
+            "Tile oversized images",
+            value=False,
+            disabled=not pillow_available(),
+            help="Split images over 16 megapixels (posters, drawings, large scans) into overlapping tiles that are OCR'd concurrently, then merge their text in reading order. Takes precedence over image optimization for those images." + ("" if pillow_available() else " Requires Pillow.")
+        )
+        
+        download_pdf_urls = st.checkbox(
+            "Download large URL PDFs and send them in chunks",
+            value=True,
+            help="Fetch PDFs given by URL that are over 2 MB (up to 200 MB) and split them into chunks like uploads, instead of sending the whole document as one request by URL. Smaller PDFs, and any that cannot be downloaded, are still sent by URL."
+        )
+        
+        skip_redundant_pages = st.checkbox(
+            "Skip blank and duplicate pages",
+            value=False,
+            help="Don't send blank pages, and reuse the text of a page that repeats an earlier page of the same PDF or image batch instead of OCR'ing it again. Blank scans are only detected with Pillow installed."
+        )
+        
+        shortest_first_enabled = st.checkbox(
+            "Process short documents first",
+            value=True,
+            help="OCR uploaded files in order of page count and size, so one-page scans finish before a long book uploaded ahead of them. URLs keep their order, as their size is only known once fetched."
+        )
+        
+        keep_upload_order = st.checkbox(
+            "Keep results in upload order",
+            value=True,
+            disabled=not shortest_first_enabled,
+            help="Results appear as each document finishes and are put back in upload order once the batch is done."
+        )
 else:
     chunk_size = 100
     cleanup_level = "Medium"
     cleanup_enabled = True
     include_page_numbers = False
+    checkpoint_enabled = True
+    pack_images = pillow_available()
+    preprocess_images = False
+    tile_images = False
+    skip_redundant_pages = False
+    download_pdf_urls = True
+    shortest_first_enabled = True
+    keep_upload_order = True
 
 st.markdown("<div class='custom-divider'></div>", unsafe_allow_html=True)
 
@@ -1796,8 +1608,8 @@ if source_type == "URL":
     )
 else:
     st.markdown("### 📁 Upload Documents")
-    st.markdown(f'<p style="color: #71717a; font-size: 0.85rem; margin-bottom: 1rem;">Drag and drop or click to upload. Supports {"PDF files" if file_type == "PDF" else "PNG, JPG, JPEG, WEBP images"}.</p>', unsafe_allow_html=True)
-    file_types = ["pdf"] if file_type == "PDF" else ["jpg", "jpeg", "png", "webp"]
+    st.markdown(f'<p style="color: #71717a; font-size: 0.85rem; margin-bottom: 1rem;">Drag and drop or click to upload. Supports {"PDF files" if file_type == "PDF" else "PNG, JPG, JPEG, WEBP and multi-page TIFF images"}.</p>', unsafe_allow_html=True)
+    file_types = ["pdf"] if file_type == "PDF" else ["jpg", "jpeg", "png", "webp", "tif", "tiff"]
     uploaded_files = st.file_uploader(
         f"Upload {file_type} files",
         type=file_types,
@@ -1831,6 +1643,39 @@ st.markdown('<p style="color: #71717a; font-size: 0.9rem; margin-bottom: 1.25rem
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     process_button = st.button("🚀 Extract Text Now", use_container_width=True)
+    background_mode = False
+    if shared_api_key:
+        background_mode = st.checkbox(
+            "Run in background worker processes",
+            value=False,
+            help="Queue the batch for the shared worker pool instead of processing it in this session. Heavy batches then run on separate CPU cores and keep going if you close the tab."
+        )
+    profile_run = st.checkbox(
+        "🐞 Profile this run (debug)",
+        value=False,
+        help="Run PDF splitting, OCR requests, text cleanup and PDF export under a profiler. The pstats and flamegraph (collapsed stack) files appear in the Performance panel."
+    )
+
+def request_cancel():
+    st.session_state["cancel_requested"] = True
+
+def show_queue_position(slot, group):
+    """Tell the user how many other sessions' requests go before theirs while the server is at capacity."""
+    ahead = GOVERNOR.position(group)
+    in_flight = GOVERNOR.status()[0]
+    if ahead is None:
+        slot.empty()
+    elif ahead:
+        slot.markdown(f"⏳ Server busy: {ahead} request{'s' if ahead != 1 else ''} from other sessions ahead of yours ({in_flight} in flight)")
+    else:
+        slot.markdown(f"⏳ Server busy: your next request goes as soon as one of the {in_flight} in flight finishes")
+
+def url_base_name(url, n):
+    """Document name for the ``n``-th URL of a batch, from its last path segment."""
+    file_name = url.split("/")[-1]
+    if not file_name or "." not in file_name:
+        file_name = f"url_document_{n+1}"
+    return os.path.splitext(file_name)[0]
 
 # Processing logic
 if process_button:
@@ -1838,25 +1683,68 @@ if process_button:
         st.error("⚠️ Please enter at least one valid URL.")
     elif source_type == "Local Upload" and not uploaded_files:
         st.error(f"⚠️ Please upload at least one {file_type.lower()} file.")
+    elif background_mode:
+        get_worker_pool(api_key)
+        entries = []
+        previews = []
+        if source_type == "URL":
+            for n, url in enumerate(u.strip() for u in input_url.split("\n") if u.strip()):
+                entries.append({"name": url_base_name(url, n), "url": url, "file_type": file_type})
+                previews.append((url, None))
+        else:
+            for uploaded in uploaded_files:
+                data = uploaded.read()
+                entries.append({
+                    "name": os.path.splitext(uploaded.name)[0],
+                    "data": data,
+                    "mime_type": uploaded.type,
+                    "file_type": file_type
+                })
+                if file_type == "PDF":
+                    previews.append((f"data:application/pdf;base64,{base64.b64encode(data).decode('utf-8')}", None))
+                elif is_tiff(data):
+                    with FrameChunks(data) as frames:
+                        previews.append((None, frames.preview()))
+                else:
+                    previews.append((None, data))
+        job_id = get_job_queue().submit(entries, {
+            "chunk_size": chunk_size,
+            "cleanup_level": cleanup_level.lower() if cleanup_enabled else None,
+            "page_markers": include_page_numbers,
+            "preprocess_images": preprocess_images,
+            "tile_images": tile_images,
+            "skip_redundant_pages": skip_redundant_pages,
+            "download_pdf_urls": download_pdf_urls
+        }, order=shortest_first([entry.get("data") for entry in entries]) if shortest_first_enabled else None)
+        st.session_state["documents"] = []
+        st.session_state["background_job"] = job_id
+        st.session_state["background_previews"] = previews
+        st.session_state["background_counted"] = False
+        st.session_state["timeline"] = None
     else:
         with st.spinner("🔄 Initializing Mistral AI connection..."):
-            client = Mistral(api_key=api_key)
+            client = get_client(api_key, max_connections=DEFAULT_CONCURRENCY)
+            dispatcher = get_dispatcher()
         
         # Reset session state
-        st.session_state["ocr_result"] = []
-        st.session_state["cleaned_result"] = []
-        st.session_state["preview_src"] = []
-        st.session_state["image_bytes"] = []
-        st.session_state["file_names"] = []
+        st.session_state["documents"] = []
+        st.session_state["background_job"] = None
         
         sources = input_url.split("\n") if source_type == "URL" else uploaded_files
         sources = [s for s in sources if (isinstance(s, str) and s.strip()) or not isinstance(s, str)]
         
+        journal = get_journal() if checkpoint_enabled else None
+        job_id = None
+        if journal is not None:
+            job_id = journal.create_job({"file_type": file_type, "source_type": source_type, "chunk_size": chunk_size})
+            st.session_state["job_id"] = job_id
+        
         # Progress tracking
         progress_container = st.container()
         with progress_container:
             progress_bar = st.progress(0)
             status_text = st.empty()
+            queue_text = st.empty()
             metrics_cols = st.columns(4)
             with metrics_cols[0]:
                 current_file_metric = st.empty()
@@ -1866,199 +1754,261 @@ if process_button:
                 time_metric = st.empty()
             with metrics_cols[3]:
                 speed_metric = st.empty()
+            st.button("⏹️ Cancel", key="cancel_run", on_click=request_cancel, help="Takes effect once the chunk or image being waited on finishes; requests not yet sent are then dropped. Finished documents are kept.")
         
         start_time = time.time()
         total_pages = 0
+        doc_cleanup_level = cleanup_level.lower() if cleanup_enabled else None
+        timeline = Timeline(profiler=Profiler() if profile_run else None)
+        image_prep = ImagePrep() if preprocess_images else None
+        tiler = ImageTiler() if tile_images else None
+        st.session_state["timeline"] = timeline
         
-        for idx, source in enumerate(sources):
-            # Update progress
-            progress = int((idx) / len(sources) * 100)
-            progress_bar.progress(progress)
-            
-            # Get filename
-            if source_type == "URL":
-                file_name = source.strip().split("/")[-1]
-                display_name = source.strip()
-                if not file_name or "." not in file_name:
-                    file_name = f"url_document_{idx+1}"
-            else:
-                file_name = source.name
-                display_name = source.name
-            
-            base_name = os.path.splitext(file_name)[0]
-            st.session_state["file_names"].append(base_name)
+        # Short documents go first so they don't wait behind a long one;
+        # the k-th document processed is upload_order[k]-th in the upload
+        upload_order = list(range(len(sources)))
+        if shortest_first_enabled and source_type == "Local Upload":
+            with timeline.span("schedule", documents=len(sources)):
+                upload_order = shortest_first([source.getvalue() for source in sources])
+            sources = [sources[n] for n in upload_order]
+        
+        cancel_token = CancelToken()
+        packed = None
+        prefetcher = None
+        try:
+            if download_pdf_urls and file_type == "PDF" and source_type == "URL":
+                # Upcoming URLs download in the background while earlier documents are OCR'd
+                downloader = PdfDownloader(cache_dir=os.path.join(journal.directory, "downloads") if journal is not None else None)
+                prefetcher = Prefetcher(
+                    downloader,
+                    [(url_base_name(source.strip(), n), source.strip()) for n, source in enumerate(sources)],
+                    timeline=timeline,
+                    cancel=cancel_token
+                )
             
-            status_text.markdown(f"""
-            <div style="display: flex; align-items: center; gap: 0.75rem; margin: 1rem 0;">
-                <div class="status-badge badge-processing">⚡ Processing</div>
-                <span style="color: #fafafa; font-weight: 500;">{display_name[:50]}{'...' if len(display_name) > 50 else ''}</span>
-            </div>
-            """, unsafe_allow_html=True)
+            if file_type == "Image" and source_type == "Local Upload" and pack_images:
+                # Images are sent in bundles up front; the loop below takes their documents in order.
+                # Multi-page TIFFs are sent in chunks like PDFs instead.
+                batch, packed_slots = [], {}
+                for idx, source in enumerate(sources):
+                    data = source.getvalue()
+                    if is_tiff(data):
+                        continue
+                    name = os.path.splitext(source.name)[0]
+                    packed_slots[idx] = len(batch)
+                    batch.append({
+                        "name": name,
+                        "data": data,
+                        "mime_type": source.type,
+                        "display_name": source.name,
+                        "checkpoint": journal.checkpoint(
+                            job_id, source_key(data), name, source.name
+                        ) if journal is not None else None
+                    })
+                packed = process_images(
+                    client, batch,
+                    cleanup_level=doc_cleanup_level,
+                    timeline=timeline,
+                    dispatcher=dispatcher,
+                    cancel=cancel_token,
+                    image_prep=image_prep,
+                    tiler=tiler,
+                    skip_redundant=skip_redundant_pages
+                )
             
-            current_file_metric.metric("Current", f"{idx + 1}/{len(sources)}")
-            elapsed = time.time() - start_time
-            time_metric.metric("Elapsed", f"{elapsed:.1f}s")
+            for idx, source in enumerate(sources):
+                # Update progress
+                progress = int((idx) / len(sources) * 100)
+                progress_bar.progress(progress)
             
-            if file_type == "PDF":
+                # Get filename
                 if source_type == "URL":
-                    document = {"type": "document_url", "document_url": source.strip()}
-                    preview_src = source.strip()
-                    st.session_state["preview_src"].append(preview_src)
-                    
-                    try:
-                        ocr_response = client.ocr.process(
-                            model="mistral-ocr-latest",
-                            document=document,
-                            include_image_base64=True
-                        )
-                        time.sleep(0.5)
-                        
-                        pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-                        pages_metric.metric("Pages", len(pages))
-                        total_pages += len(pages)
-                        
-                        if include_page_numbers:
-                            result_text = "\n\n".join(f"--- Page {i+1} ---\n\n{page.markdown}" for i, page in enumerate(pages)) or "No result found."
-                        else:
-                            result_text = "\n\n".join(page.markdown for page in pages) or "No result found."
-                        
-                        if cleanup_enabled:
-                            cleaned_text = clean_ocr_text(result_text, cleanup_level.lower())
-                            st.session_state["cleaned_result"].append(cleaned_text)
-                        else:
-                            st.session_state["cleaned_result"].append(result_text)
-                            
-                    except Exception as e:
-                        result_text = f"Error extracting result: {e}"
-                        st.session_state["cleaned_result"].append(result_text)
-                    
-                    st.session_state["ocr_result"].append(result_text)
-                else:
-                    file_bytes = source.read()
-                    preview_src = f"data:application/pdf;base64,{base64.b64encode(file_bytes).decode('utf-8')}"
-                    st.session_state["preview_src"].append(preview_src)
-                    
-                    pdf_chunks, doc_pages = split_pdf(file_bytes, chunk_size)
-                    
-                    if len(pdf_chunks) > 1:
-                        st.info(f"📄 Splitting **{display_name}** ({doc_pages} pages) into {len(pdf_chunks)} chunks...")
-                        all_results = []
-                        
-                        chunk_progress = st.progress(0)
-                        chunk_text = st.empty()
-                        
-                        for i, chunk in enumerate(pdf_chunks):
-                            chunk_progress.progress(int((i) / len(pdf_chunks) * 100))
-                            chunk_text.markdown(f"Processing chunk {i+1}/{len(pdf_chunks)}...")
-                            
-                            try:
-                                encoded_pdf = base64.b64encode(chunk).decode("utf-8")
-                                document = {"type": "document_url", "document_url": f"data:application/pdf;base64,{encoded_pdf}"}
-                                
-                                ocr_response = client.ocr.process(
-                                    model="mistral-ocr-latest",
-                                    document=document,
-                                    include_image_base64=True
-                                )
-                                time.sleep(0.5)
-                                
-                                pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-                                chunk_text_result = "\n\n".join(page.markdown for page in pages) or ""
-                                all_results.append(chunk_text_result)
-                            except Exception as e:
-                                all_results.append(f"Error in chunk {i+1}: {e}")
-                        
-                        chunk_progress.empty()
-                        chunk_text.empty()
-                        
-                        result_text = "\n\n".join(all_results)
-                        total_pages += doc_pages
-                    else:
-                        try:
-                            encoded_pdf = base64.b64encode(file_bytes).decode("utf-8")
-                            document = {"type": "document_url", "document_url": f"data:application/pdf;base64,{encoded_pdf}"}
-                            
-                            ocr_response = client.ocr.process(
-                                model="mistral-ocr-latest",
-                                document=document,
-                                include_image_base64=True
-                            )
-                            time.sleep(0.5)
-                            
-                            pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-                            pages_metric.metric("Pages", len(pages))
-                            total_pages += len(pages)
-                            
-                            if include_page_numbers:
-                                result_text = "\n\n".join(f"--- Page {i+1} ---\n\n{page.markdown}" for i, page in enumerate(pages)) or "No result found."
-                            else:
-                                result_text = "\n\n".join(page.markdown for page in pages) or "No result found."
-                        except Exception as e:
-                            result_text = f"Error extracting result: {e}"
-                    
-                    if cleanup_enabled:
-                        cleaned_text = clean_ocr_text(result_text, cleanup_level.lower())
-                        st.session_state["cleaned_result"].append(cleaned_text)
-                    else:
-                        st.session_state["cleaned_result"].append(result_text)
-                    
-                    st.session_state["ocr_result"].append(result_text)
-            else:
-                # Image processing
-                if source_type == "URL":
-                    document = {"type": "image_url", "image_url": source.strip()}
-                    preview_src = source.strip()
+                    base_name = url_base_name(source.strip(), idx)
+                    display_name = source.strip()
                 else:
-                    file_bytes = source.read()
-                    mime_type = source.type
-                    encoded_image = base64.b64encode(file_bytes).decode("utf-8")
-                    document = {"type": "image_url", "image_url": f"data:{mime_type};base64,{encoded_image}"}
-                    preview_src = f"data:{mime_type};base64,{encoded_image}"
-                    st.session_state["image_bytes"].append(file_bytes)
+                    base_name = os.path.splitext(source.name)[0]
+                    display_name = source.name
+                doc_slot = len(st.session_state["documents"])
+            
+                status_text.markdown(f"""
+                <div style="display: flex; align-items: center; gap: 0.75rem; margin: 1rem 0;">
+                    <div class="status-badge badge-processing">⚡ Processing</div>
+                    <span style="color: #fafafa; font-weight: 500;">{display_name[:50]}{'...' if len(display_name) > 50 else ''}</span>
+                </div>
+                """, unsafe_allow_html=True)
+            
+                current_file_metric.metric("Current", f"{idx + 1}/{len(sources)}")
+                show_queue_position(queue_text, cancel_token)
+                elapsed = time.time() - start_time
+                time_metric.metric("Elapsed", f"{elapsed:.1f}s")
+            
+                source_bytes = source.strip().encode("utf-8") if source_type == "URL" else source.read()
+                downloaded = None
+                if prefetcher is not None:
+                    downloaded = prefetcher.get(idx)
+                    if downloaded is not None:
+                        source_bytes = downloaded
+                checkpoint = None
+                if packed is not None and idx in packed_slots:
+                    checkpoint = batch[packed_slots[idx]]["checkpoint"]
+                elif journal is not None:
+                    checkpoint = journal.checkpoint(
+                        job_id,
+                        source_key(source_bytes, url=source_type == "URL" and downloaded is None),
+                        base_name,
+                        display_name
+                    )
+            
+                if file_type == "PDF" and source_type == "URL" and downloaded is None:
+                    doc = process_pdf_url(
+                        client, base_name, source.strip(),
+                        page_markers=include_page_numbers,
+                        cleanup_level=doc_cleanup_level,
+                        checkpoint=checkpoint,
+                        timeline=timeline,
+                        dispatcher=dispatcher,
+                        cancel=cancel_token,
+                        display_name=display_name
+                    )
+                    pages_metric.metric("Pages", doc.page_count)
+                    total_pages += doc.page_count
+                elif file_type == "PDF" or (source_type == "Local Upload" and is_tiff(source_bytes)):
+                    chunk_ui = {}
+                
+                    def show_split(doc_pages, chunk_count):
+                        chunk_ui["pages"] = doc_pages
+                        if chunk_count > 1:
+                            st.info(f"📄 Splitting **{display_name}** ({doc_pages} pages) into {chunk_count} chunks...")
+                            chunk_ui["progress"] = st.progress(0)
+                            chunk_ui["text"] = st.empty()
+                
+                    def show_chunk(i, chunk_count):
+                        show_queue_position(queue_text, cancel_token)
+                        if "progress" in chunk_ui:
+                            chunk_ui["progress"].progress(int((i) / chunk_count * 100))
+                            chunk_ui["text"].markdown(f"Processing chunk {i+1}/{chunk_count}...")
                 
-                try:
-                    ocr_response = client.ocr.process(
-                        model="mistral-ocr-latest",
-                        document=document,
-                        include_image_base64=True
+                    def show_partial(partial, done, chunk_count):
+                        show_queue_position(queue_text, cancel_token)
+                        # Keep the pages so far in the results, so a cancelled run still has them
+                        st.session_state["documents"][doc_slot:] = [partial]
+                        pages_so_far = total_pages + partial.page_count
+                        pages_metric.metric("Pages", pages_so_far)
+                        elapsed = time.time() - start_time
+                        if elapsed > 0:
+                            speed_metric.metric("Speed", f"{pages_so_far / elapsed:.1f} pg/s")
+                        if "live" not in chunk_ui:
+                            chunk_ui["live"] = st.empty()
+                        latest = partial.page(partial.page_count - 1, cleaned=True) if partial.page_count else ""
+                        partial_b64 = base64.b64encode(partial.text.encode()).decode()
+                        chunk_ui["live"].markdown(f"""
+                        <div style="display: flex; align-items: center; gap: 0.75rem; margin: 0.5rem 0;">
+                            <span style="color: #a1a1aa;">Pages 1–{partial.page_count} of {chunk_ui["pages"]} ready ({done}/{chunk_count} chunks)</span>
+                            <a href="data:text/markdown;base64,{partial_b64}" download="{base_name}_partial.md" class="download-btn">📋 Partial Markdown</a>
+                        </div>
+                        <div class="text-preview">{latest[:4000]}</div>
+                        """, unsafe_allow_html=True)
+                
+                    # Multi-page TIFFs go through the same chunked requests as PDFs
+                    process_pages = process_pdf_bytes if file_type == "PDF" else process_image_frames
+                    # TIFF frames are decoded lazily, so they are not fingerprinted
+                    page_kwargs = {"skip_redundant": skip_redundant_pages} if file_type == "PDF" else {}
+                    if downloaded is not None:
+                        page_kwargs["preview_src"] = source.strip()
+                    doc = process_pages(
+                        client, base_name, source_bytes,
+                        chunk_size=chunk_size,
+                        page_markers=include_page_numbers,
+                        cleanup_level=doc_cleanup_level,
+                        on_split=show_split,
+                        on_chunk=show_chunk,
+                        on_partial=show_partial,
+                        checkpoint=checkpoint,
+                        timeline=timeline,
+                        dispatcher=dispatcher,
+                        cancel=cancel_token,
+                        display_name=display_name,
+                        **page_kwargs
                     )
-                    time.sleep(0.5)
-                    
-                    pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-                    pages_metric.metric("Pages", "1")
-                    total_pages += 1
-                    
-                    result_text = "\n\n".join(page.markdown for page in pages) or "No result found."
-                    
-                    if cleanup_enabled:
-                        cleaned_text = clean_ocr_text(result_text, cleanup_level.lower())
-                        st.session_state["cleaned_result"].append(cleaned_text)
-                    else:
-                        st.session_state["cleaned_result"].append(result_text)
-                except Exception as e:
-                    result_text = f"Error extracting result: {e}"
-                    st.session_state["cleaned_result"].append(result_text)
                 
-                st.session_state["ocr_result"].append(result_text)
-                st.session_state["preview_src"].append(preview_src)
+                    if "live" in chunk_ui:
+                        chunk_ui["live"].empty()
+                    if "progress" in chunk_ui:
+                        chunk_ui["progress"].empty()
+                        chunk_ui["text"].empty()
+                        total_pages += chunk_ui["pages"]
+                    else:
+                        pages_metric.metric("Pages", doc.page_count)
+                        total_pages += doc.page_count
+                else:
+                    # Image processing
+                    if packed is not None and idx in packed_slots:
+                        doc = next(packed)
+                    elif source_type == "URL":
+                        doc = process_image(
+                            client, base_name, url=source.strip(),
+                            cleanup_level=doc_cleanup_level,
+                            checkpoint=checkpoint,
+                            timeline=timeline,
+                            dispatcher=dispatcher,
+                            cancel=cancel_token,
+                            display_name=display_name
+                        )
+                    else:
+                        doc = process_image(
+                            client, base_name, image_bytes=source_bytes, mime_type=source.type,
+                            cleanup_level=doc_cleanup_level,
+                            checkpoint=checkpoint,
+                            timeline=timeline,
+                            dispatcher=dispatcher,
+                            cancel=cancel_token,
+                            image_prep=image_prep,
+                            tiler=tiler,
+                            skip_redundant=skip_redundant_pages,
+                            display_name=display_name
+                        )
+                    if not doc.errors:
+                        pages_metric.metric("Pages", "1")
+                        total_pages += 1
+            
+                if checkpoint is not None and checkpoint.resumed:
+                    st.info(f"♻️ Resumed {checkpoint.resumed} finished chunk{'s' if checkpoint.resumed > 1 else ''} of **{display_name}** from the job journal")
+            
+                st.session_state["documents"][doc_slot:] = [doc]
             
-            # Update speed metric
-            elapsed = time.time() - start_time
-            if elapsed > 0:
-                speed_metric.metric("Speed", f"{total_pages / elapsed:.1f} pg/s")
+                # Update speed metric
+                elapsed = time.time() - start_time
+                if elapsed > 0:
+                    speed_metric.metric("Speed", f"{total_pages / elapsed:.1f} pg/s")
             
-            # Add to history
-            st.session_state["processing_history"].append({
-                "name": display_name,
-                "type": file_type,
-                "pages": total_pages,
-                "time": datetime.now().strftime("%H:%M")
-            })
+                # Add to history
+                st.session_state["processing_history"].append({
+                    "name": display_name,
+                    "type": file_type,
+                    "pages": total_pages,
+                    "time": datetime.now().strftime("%H:%M")
+                })
+        finally:
+            # Clicking Cancel (or any widget) stops this run at its next Streamlit call;
+            # make sure nothing it queued keeps using the API afterwards
+            cancel_token.cancel()
+            if packed is not None:
+                packed.close()
+            if prefetcher is not None:
+                prefetcher.close()
+            if keep_upload_order:
+                # Documents are added as they finish, one per source processed
+                finished = st.session_state["documents"]
+                st.session_state["documents"] = [doc for _, doc in sorted(zip(upload_order, finished), key=lambda pair: pair[0])]
         
         # Complete progress
         progress_bar.progress(100)
+        queue_text.empty()
         total_time = time.time() - start_time
         
+        if journal is not None:
+            journal.finish_job(job_id)
+        
         st.session_state["total_documents_processed"] += len(sources)
         st.session_state["total_pages_processed"] += total_pages
         
@@ -2083,24 +2033,68 @@ if process_button:
         </div>
         """, unsafe_allow_html=True)
 
+if st.session_state.pop("cancel_requested", False):
+    kept = len(st.session_state["documents"])
+    st.warning(f"⏹️ Processing cancelled. {kept} document{'s' if kept != 1 else ''} kept, including the pages finished so far of the interrupted one; chunks already saved to the job journal are reused if you run the rest again.")
+
+# Background job status
+if st.session_state.get("background_job"):
+    job_status = get_job_queue().job_status(st.session_state["background_job"])
+    if job_status is not None:
+        counts = job_status["counts"]
+        finished = counts.get("done", 0) + counts.get("failed", 0) + counts.get("cancelled", 0)
+        total_docs = len(job_status["documents"])
+        
+        st.markdown("### 🛰️ Background Job")
+        if finished < total_docs and job_status["status"] != "cancelling":
+            if st.button("⏹️ Cancel job", key="cancel_background_job"):
+                get_job_queue().cancel(job_status["job_id"])
+                st.rerun()
+        st.progress(int(finished / total_docs * 100))
+        st.markdown(f"""
+        <div style="display: flex; align-items: center; gap: 0.75rem; margin: 0.5rem 0 1rem 0;">
+            <div class="status-badge badge-processing">⚡ {job_status['status'].title()}</div>
+            <span style="color: #a1a1aa;">Job {job_status['job_id']} • {finished}/{total_docs} documents • {counts.get('queued', 0)} queued • {counts.get('running', 0)} running</span>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        previews = st.session_state.get("background_previews", [])
+        documents = []
+        for entry in job_status["documents"]:
+            result = get_job_queue().load_result(job_status["job_id"], entry["index"])
+            if result is None:
+                continue
+            preview_src, image_bytes = previews[entry["index"]] if entry["index"] < len(previews) else (None, None)
+            documents.append(OCRDocument.from_dict(result, preview_src=preview_src, image_bytes=image_bytes))
+        st.session_state["documents"] = documents
+        
+        if finished < total_docs:
+            time.sleep(2)
+            st.rerun()
+        elif not st.session_state.get("background_counted"):
+            st.session_state["background_counted"] = True
+            st.session_state["total_documents_processed"] += total_docs
+            st.session_state["total_pages_processed"] += sum(doc.page_count for doc in documents)
+
 # Close main container
 st.markdown('</div>', unsafe_allow_html=True)
 
 # Display Results
-if st.session_state["ocr_result"]:
+if st.session_state["documents"]:
     st.markdown('<div class="results-section">', unsafe_allow_html=True)
     st.markdown("## 📋 Extraction Results")
     st.markdown('<p style="color: #71717a; font-size: 0.9rem; margin-bottom: 1.5rem;">Your extracted text is ready. Download in your preferred format.</p>', unsafe_allow_html=True)
     
     # Results summary
-    total_words = sum(get_word_count(r) for r in st.session_state["cleaned_result"])
-    total_chars = sum(get_char_count(r) for r in st.session_state["cleaned_result"])
+    documents = st.session_state["documents"]
+    total_words = sum(doc.word_count() for doc in documents)
+    total_chars = sum(doc.char_count() for doc in documents)
     
     sum_cols = st.columns(4)
     with sum_cols[0]:
         st.markdown(f"""
         <div class="metric-card">
-            <div class="metric-value">{len(st.session_state["ocr_result"])}</div>
+            <div class="metric-value">{len(documents)}</div>
             <div class="metric-label">Documents</div>
         </div>
         """, unsafe_allow_html=True)
@@ -2128,33 +2122,39 @@ if st.session_state["ocr_result"]:
     
     st.markdown("<div class='custom-divider'></div>", unsafe_allow_html=True)
     
+    timeline = st.session_state.get("timeline") or NULL_TIMELINE
+    
     # Tabs for each document
-    if len(st.session_state["ocr_result"]) > 1:
-        tabs = st.tabs([f"📄 {name}" for name in st.session_state["file_names"]])
+    if len(documents) > 1:
+        tabs = st.tabs([f"📄 {doc.name}" for doc in documents])
     else:
         tabs = [st.container()]
     
-    for idx, (result, tab) in enumerate(zip(st.session_state["ocr_result"], tabs)):
+    for idx, (doc, tab) in enumerate(zip(documents, tabs)):
         with tab:
-            file_base_name = st.session_state["file_names"][idx] if idx < len(st.session_state["file_names"]) else f"Document_{idx+1}"
-            cleaned_result = st.session_state["cleaned_result"][idx] if idx < len(st.session_state["cleaned_result"]) else result
+            file_base_name = doc.name or f"Document_{idx+1}"
             
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown("### 📄 Original Document")
                 
-                if file_type == "PDF":
-                    pdf_embed_html = f'<iframe src="{st.session_state["preview_src"][idx]}" width="100%" height="600" style="border-radius: 12px; border: 1px solid rgba(255, 255, 255, 0.1);"></iframe>'
+                if doc.file_type == "PDF" and not doc.preview_src:
+                    st.info("Preview not available for this document.")
+                elif doc.file_type == "PDF":
+                    pdf_embed_html = f'<iframe src="{doc.preview_src}" width="100%" height="600" style="border-radius: 12px; border: 1px solid rgba(255, 255, 255, 0.1);"></iframe>'
                     st.markdown(pdf_embed_html, unsafe_allow_html=True)
                 else:
-                    if source_type == "Local Upload" and st.session_state["image_bytes"]:
-                        st.image(st.session_state["image_bytes"][idx], use_container_width=True)
+                    if doc.image_bytes:
+                        st.image(doc.image_bytes, use_container_width=True)
                     else:
-                        st.image(st.session_state["preview_src"][idx], use_container_width=True)
+                        st.image(doc.preview_src, use_container_width=True)
             
             with col2:
                 st.markdown("### ✨ Extracted Text")
+                partial_note = next((error for error in doc.errors if error.startswith(PARTIAL_NOTE)), None)
+                if partial_note:
+                    st.warning(f"⏳ {partial_note}. Processing stopped before the rest of this document was extracted.")
                 
                 # Toggle options
                 col_a, col_b = st.columns(2)
@@ -2163,11 +2163,12 @@ if st.session_state["ocr_result"]:
                 with col_b:
                     show_stats = st.checkbox("Show statistics", value=True, key=f"stats_{idx}")
                 
-                display_text = result if show_raw else cleaned_result
+                with timeline.span("clean_ocr_text", document=doc.name, raw=show_raw):
+                    display_text = doc.view(raw=show_raw)
                 
                 if show_stats:
-                    word_count = get_word_count(display_text)
-                    char_count = get_char_count(display_text)
+                    word_count = doc.word_count(raw=show_raw)
+                    char_count = doc.char_count(raw=show_raw)
                     st.markdown(f"""
                     <div style="display: flex; gap: 1rem; margin-bottom: 1rem; flex-wrap: wrap;">
                         <span style="background: rgba(99, 102, 241, 0.1); padding: 0.375rem 0.75rem; border-radius: 6px; font-size: 0.8rem; color: #818cf8;">
@@ -2190,12 +2191,8 @@ if st.session_state["ocr_result"]:
                     download_row = '<div class="download-container">'
                     
                     # JSON download
-                    json_data = json.dumps({
-                        "filename": file_base_name,
-                        "extracted_at": datetime.now().isoformat(),
-                        "word_count": get_word_count(display_text),
-                        "content": display_text
-                    }, ensure_ascii=False, indent=2)
+                    with EXPORT_SECONDS.labels("json").time():
+                        json_data = json_payload(doc, raw=show_raw)
                     download_row += create_download_link(json_data, "application/json", f"{file_base_name}.json", "JSON", "📦")
                     
                     # TXT download
@@ -2206,9 +2203,12 @@ if st.session_state["ocr_result"]:
                     
                     # PDF download
                     try:
-                        pdf_data = create_pdf_from_markdown(display_text, file_base_name)
+                        with timeline.span("create_pdf_from_markdown", document=doc.name), EXPORT_SECONDS.labels("pdf").time():
+                            pdf_data = create_pdf_from_markdown(display_text, file_base_name)
                         if pdf_data:
                             download_row += create_download_link(pdf_data, "application/pdf", f"{file_base_name}_extracted.pdf", "PDF", "📄")
+                        else:
+                            st.warning("PDF generation failed for this document.")
                     except Exception as e:
                         pass
                     
@@ -2216,7 +2216,68 @@ if st.session_state["ocr_result"]:
                     st.markdown(download_row, unsafe_allow_html=True)
                 
                 # Text preview
-                st.markdown(f'<div class="text-preview">{display_text}</div>', unsafe_allow_html=True)
+                if display_text or not len(doc):
+                    st.markdown(f'<div class="text-preview">{display_text}</div>', unsafe_allow_html=True)
+                else:
+                    st.info(f"No text found: the {'page is' if len(doc) == 1 else f'{len(doc)} pages are'} blank.")
+    
+    # Performance breakdown
+    if timeline:
+        with st.expander("⏱️ Performance", expanded=False):
+            st.markdown('<p style="color: #a1a1aa; margin-bottom: 1rem; font-size: 0.875rem;">Time spent in each processing stage for the current results</p>', unsafe_allow_html=True)
+            st.dataframe(
+                [
+                    {"Stage": stage, "Calls": entry["calls"], "Total (s)": round(entry["total"], 3),
+                     "Mean (s)": round(entry["mean"], 3), "Max (s)": round(entry["max"], 3)}
+                    for stage, entry in timeline.summary().items()
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+            prepared = [span for span in timeline.spans if span["stage"] == "preprocess_image"]
+            if prepared:
+                before = sum(span["bytes"] for span in prepared)
+                after = sum(span["prepared_bytes"] for span in prepared)
+                st.markdown(f"**Image preprocessing:** {len(prepared)} image{'s' if len(prepared) != 1 else ''}, {before / 1024:,.0f} KB → {after / 1024:,.0f} KB uploaded ({(1 - after / before) * 100 if before else 0:.0f}% smaller)")
+            tiled = [span for span in timeline.spans if span["stage"] == "split_tiles"]
+            if tiled:
+                st.markdown(f"**Image tiling:** {len(tiled)} oversized image{'s' if len(tiled) != 1 else ''} sent as {sum(span['tiles'] for span in tiled)} tiles")
+            downloads = [span for span in timeline.spans if span["stage"] == "download_pdf"]
+            if downloads:
+                local = [span for span in downloads if span["mode"] == "local"]
+                st.markdown(f"**URL PDFs:** {len(local)} downloaded ({sum(span['bytes'] for span in local) / 1048576:,.1f} MB) and sent in chunks, {len(downloads) - len(local)} sent by URL")
+            shared = sum(span["stage"] == "ocr_shared" for span in timeline.spans)
+            if shared:
+                st.markdown(f"**Shared requests:** {shared} request{'s' if shared != 1 else ''} answered by an identical request already in flight, possibly from another session")
+            fingerprinted = [span for span in timeline.spans if span["stage"] == "fingerprint_pages"]
+            if fingerprinted:
+                blank = sum(span["blank"] for span in fingerprinted)
+                duplicates = sum(span["duplicates"] for span in fingerprinted)
+                saved = sum(span["requests_saved"] for span in fingerprinted)
+                st.markdown(f"**Page fingerprinting:** {blank} blank and {duplicates} duplicate page{'s' if duplicates != 1 else ''} skipped, {saved} request{'s' if saved != 1 else ''} saved")
+            per_document = timeline.by_document()
+            if len(per_document) > 1:
+                st.markdown("**Per document**")
+                st.dataframe(
+                    [
+                        {"Document": name, **{stage: round(seconds, 3) for stage, seconds in stages.items()}}
+                        for name, stages in per_document.items()
+                    ],
+                    use_container_width=True,
+                    hide_index=True
+                )
+            timings_b64 = base64.b64encode(timeline.to_json().encode()).decode()
+            downloads = f'<a href="data:application/json;base64,{timings_b64}" download="timings.json" class="download-btn">📦 Timings JSON</a>'
+            if timeline.profiler is not None:
+                pstats_b64 = base64.b64encode(timeline.profiler.pstats_bytes()).decode()
+                collapsed_b64 = base64.b64encode(timeline.profiler.collapsed().encode()).decode()
+                downloads += f'<a href="data:application/octet-stream;base64,{pstats_b64}" download="profile.pstats" class="download-btn">🐞 pstats</a>'
+                downloads += f'<a href="data:text/plain;base64,{collapsed_b64}" download="profile.collapsed" class="download-btn">🔥 Collapsed stacks</a>'
+            st.markdown(f'<div class="download-container">{downloads}</div>', unsafe_allow_html=True)
+            if timeline.profiler is not None:
+                report = timeline.profiler.report()
+                if report:
+                    st.code(report, language="text")
     
     st.markdown('</div>', unsafe_allow_html=True)
     
@@ -2226,11 +2287,8 @@ if st.session_state["ocr_result"]:
     with col2:
         st.markdown('<div class="secondary-btn">', unsafe_allow_html=True)
         if st.button("🗑️ Clear All Results", key="clear_results", use_container_width=True):
-            st.session_state["ocr_result"] = []
-            st.session_state["cleaned_result"] = []
-            st.session_state["preview_src"] = []
-            st.session_state["image_bytes"] = []
-            st.session_state["file_names"] = []
+            st.session_state["documents"] = []
+            st.session_state["background_job"] = None
             st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -0,0 +1,10 @@
+"""OCR processing pipeline shared by the Streamlit app and command-line tools."""
+
+from .cleanup import clean_ocr_text
+from .document import DocumentBuilder, OCRDocument
+
+__all__ = [
+    "DocumentBuilder",
+    "OCRDocument",
+    "clean_ocr_text",
+]
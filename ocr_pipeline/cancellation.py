@@ -0,0 +1,55 @@
+import threading
+import time
+
+CANCEL_GRACE = 5.0
+
+
+class Cancelled(Exception):
+    """Raised for work dropped because its batch was cancelled."""
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared by a batch and the work it started.
+
+    The chunk loop checks ``cancelled`` before each request; the dispatcher
+    drops requests that have not been sent yet and gives in-flight ones
+    ``CANCEL_GRACE`` seconds to finish before abandoning them.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.cancelled_at = None
+
+    def cancel(self):
+        if not self._event.is_set():
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise Cancelled("Cancelled")
+
+
+class PollingCancelToken(CancelToken):
+    """Token that also trips when ``check()`` returns true, polled at most every ``interval`` seconds."""
+
+    def __init__(self, check, interval=1.0):
+        super().__init__()
+        self._check = check
+        self._interval = interval
+        self._checked_at = 0.0
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and time.monotonic() - self._checked_at >= self._interval:
+            self._checked_at = time.monotonic()
+            if self._check():
+                self.cancel()
+        return self._event.is_set()
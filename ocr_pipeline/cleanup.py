@@ -0,0 +1,69 @@
+import re
+
+
+def clean_ocr_text(text, cleanup_level="medium"):
+    """Clean up OCR text with configurable intensity."""
+    original_text = text
+    
+    # Level-based cleaning intensity
+    if cleanup_level == "light":
+        # Just basic cleanup
+        text = re.sub(r'(\d+\.){10,}(\d+)', '', text)
+        text = re.sub(r'!\[img-\d+\.jpeg\]\(img-\d+\.jpeg\)', '', text)
+        return text
+    
+    # Table formatting
+    table_pattern = r'(\|[^\n]+\|)'
+    def fix_table(match):
+        table_row = match.group(1)
+        cells = table_row.split('|')
+        cells = [cell.strip() for cell in cells if cell.strip()]
+        if cells:
+            return '| ' + ' | '.join(cells) + ' |'
+        return match.group(1)
+    
+    text = re.sub(table_pattern, fix_table, text)
+    
+    # Remove garbage sequences
+    text = re.sub(r'(\d+\.){10,}(\d+)', '', text)
+    
+    # Fix heading formatting
+    text = re.sub(r'#([A-Z])', r'# \1', text)
+    text = re.sub(r'(# [^\n]+)\n\1', r'\1', text)
+    
+    # Clean up image references
+    text = re.sub(r'!\[img-\d+\.jpeg\]\(img-\d+\.jpeg\)', '', text)
+    
+    # Chapter formatting
+    text = re.sub(r'(?<!#)Chapter (\d+)', r'## Chapter \1', text)
+    
+    if cleanup_level == "aggressive":
+        # Additional aggressive cleaning
+        text = re.sub(r'\n{4,}', '\n\n\n', text)
+        text = re.sub(r'[ \t]+\n', '\n', text)
+        text = re.sub(r'\n[ \t]+', '\n', text)
+        
+        # Join broken lines
+        lines = text.split('\n')
+        i = 0
+        while i < len(lines) - 1:
+            if (lines[i] and not lines[i].startswith('#') and 
+                not lines[i].startswith('|') and not lines[i].startswith('```') and
+                not lines[i].startswith('- ') and not lines[i].startswith('* ') and
+                not lines[i].startswith('1. ') and not lines[i].endswith('.') and
+                not lines[i].endswith('?') and not lines[i].endswith('!') and
+                not lines[i].endswith(':') and lines[i+1] and
+                not lines[i+1].startswith('#') and not lines[i+1].startswith('|') and
+                not lines[i+1].startswith('```') and not lines[i+1].startswith('- ') and
+                not lines[i+1].startswith('* ') and not lines[i+1].startswith('1. ')):
+                lines[i] = lines[i] + ' ' + lines[i+1]
+                lines.pop(i+1)
+            else:
+                i += 1
+        text = '\n'.join(lines)
+    
+    # Spacing around headers
+    text = re.sub(r'(^|\n)(#+ [^\n]+)(?!\n\n)', r'\1\2\n\n', text)
+    
+    return text
+
@@ -0,0 +1,314 @@
+import argparse
+import glob
+import logging
+import mimetypes
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .client import get_client
+from .dispatch import Dispatcher
+from .export import EXPORT_FORMATS, output_paths, write_outputs
+from .governor import GOVERNOR
+from .imaging import DEFAULT_MAX_PIXELS, DEFAULT_QUALITY, DEFAULT_TARGET_DPI, ImagePrep, pillow_available
+from .journal import DEFAULT_JOURNAL_DIR, JobJournal, source_key
+from .packing import is_tiff
+from .pipeline import process_image, process_image_frames, process_images, process_pdf_bytes
+from .profiling import Profiler
+from .tiling import DEFAULT_MIN_TILE_PIXELS, DEFAULT_TILE_SIZE, ImageTiler
+from .timing import NULL_TIMELINE, Timeline
+
+logger = logging.getLogger(__name__)
+
+PDF_EXTENSIONS = (".pdf",)
+TIFF_EXTENSIONS = (".tif", ".tiff")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp") + TIFF_EXTENSIONS
+CLEANUP_LEVELS = ("none", "light", "medium", "aggressive")
+
+
+def _pattern_root(pattern):
+    """The directory that the files matched by ``pattern`` are named relative to."""
+    if os.path.isdir(pattern):
+        return pattern
+    parts = os.path.normpath(pattern).split(os.sep)
+    fixed = []
+    for part in parts:
+        if any(char in part for char in "*?["):
+            break
+        fixed.append(part)
+    if len(fixed) == len(parts):
+        # A plain file path
+        fixed = fixed[:-1]
+    return os.sep.join(fixed) or ("." if not pattern.startswith(os.sep) else os.sep)
+
+
+def iter_input_paths(patterns):
+    """Expand files, directories and glob patterns into ``(path, name)`` for each supported input file.
+
+    ``path`` is absolute. ``name`` is the file's path relative to the
+    directory or the fixed part of the pattern it was found under,
+    extension included, and names its outputs (see ``output_clashes``).
+    """
+    seen = set()
+    supported = PDF_EXTENSIONS + IMAGE_EXTENSIONS
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True) or [pattern]
+        root = os.path.abspath(_pattern_root(pattern))
+        for path in sorted(matches):
+            if not os.path.isfile(path) or not path.lower().endswith(supported):
+                continue
+            path = os.path.abspath(path)
+            if path not in seen:
+                seen.add(path)
+                yield path, os.path.relpath(path, root)
+
+
+def output_clashes(inputs):
+    """Groups of input paths from ``iter_input_paths`` that would write to the same outputs."""
+    by_name = {}
+    for path, name in inputs:
+        by_name.setdefault(os.path.normcase(name), []).append(path)
+    return [paths for paths in by_name.values() if len(paths) > 1]
+
+
+def is_up_to_date(path, name, output_dir, formats):
+    """True if every output named ``name`` for ``path`` exists and is newer than the input."""
+    source_mtime = os.path.getmtime(path)
+    for output in output_paths(name, output_dir, formats).values():
+        if not os.path.exists(output) or os.path.getmtime(output) < source_mtime:
+            return False
+    return True
+
+
+def load_input(path, journal=None, job_id=None):
+    """Read ``path`` and open its checkpoint; returns ``(name, data, checkpoint)``."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "rb") as f:
+        data = f.read()
+    checkpoint = None
+    if journal is not None:
+        checkpoint = journal.checkpoint(job_id, source_key(data), name, path)
+    return name, data, checkpoint
+
+
+def process_path(client, path, chunk_size=100, cleanup_level="medium", page_markers=False,
+                 journal=None, job_id=None, timeline=NULL_TIMELINE, dispatcher=None, image_prep=None, tiler=None,
+                 skip_redundant=False):
+    """OCR one local file through the same pipeline the app uses."""
+    name, data, checkpoint = load_input(path, journal, job_id)
+    if path.lower().endswith(PDF_EXTENSIONS):
+        doc = process_pdf_bytes(
+            client, name, data,
+            chunk_size=chunk_size,
+            page_markers=page_markers,
+            cleanup_level=cleanup_level,
+            checkpoint=checkpoint,
+            timeline=timeline,
+            dispatcher=dispatcher,
+            skip_redundant=skip_redundant,
+            display_name=path,
+            preview_src=None
+        )
+    elif is_tiff(data):
+        doc = process_image_frames(
+            client, name, data,
+            chunk_size=chunk_size,
+            page_markers=page_markers,
+            cleanup_level=cleanup_level,
+            checkpoint=checkpoint,
+            timeline=timeline,
+            dispatcher=dispatcher,
+            display_name=path,
+            preview_src=None,
+            image_bytes=None
+        )
+    else:
+        mime_type = mimetypes.guess_type(path)[0] or "image/png"
+        doc = process_image(
+            client, name, image_bytes=data, mime_type=mime_type,
+            cleanup_level=cleanup_level,
+            checkpoint=checkpoint,
+            timeline=timeline,
+            dispatcher=dispatcher,
+            image_prep=image_prep,
+            tiler=tiler,
+            skip_redundant=skip_redundant,
+            display_name=path,
+            preview_src=None
+        )
+    if checkpoint is not None and checkpoint.resumed:
+        logger.info("%s: resumed %d chunk(s) from job %s", path, checkpoint.resumed, job_id)
+    return doc
+
+
+def process_image_paths(client, paths, cleanup_level="medium", journal=None, job_id=None,
+                        timeline=NULL_TIMELINE, dispatcher=None, image_prep=None, tiler=None, skip_redundant=False):
+    """OCR image files packed into shared multi-page requests; yields ``(path, doc)`` in order."""
+    images = []
+    for path in paths:
+        name, data, checkpoint = load_input(path, journal, job_id)
+        images.append({
+            "name": name,
+            "data": data,
+            "mime_type": mimetypes.guess_type(path)[0] or "image/png",
+            "checkpoint": checkpoint,
+            "display_name": path,
+            "preview_src": None,
+        })
+    docs = process_images(client, images, cleanup_level, timeline, dispatcher, image_prep=image_prep, tiler=tiler,
+                          skip_redundant=skip_redundant)
+    yield from zip(paths, docs)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m ocr_pipeline",
+        description="Batch OCR PDFs and images with the Mistral OCR API."
+    )
+    parser.add_argument("inputs", nargs="+", help="Files, directories or glob patterns to process")
+    parser.add_argument("-o", "--output-dir", default="ocr_output", help="Directory for extracted text (default: %(default)s)")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="Documents processed in parallel (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=0, help="Dispatch OCR requests on an event loop with up to this many in flight, sending a PDF's chunks concurrently (default: one request at a time per document)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds when --requests is set (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Pages per PDF chunk (default: %(default)s)")
+    parser.add_argument("--cleanup", choices=CLEANUP_LEVELS, default="medium", help="Text cleanup level (default: %(default)s)")
+    parser.add_argument("--page-markers", action="store_true", help="Add page number markers to the extracted text")
+    parser.add_argument("--preprocess-images", action="store_true", help="Downscale, re-encode and strip metadata from images before upload (needs Pillow)")
+    parser.add_argument("--max-pixels", type=int, default=DEFAULT_MAX_PIXELS, help="Largest image size sent with --preprocess-images, in pixels (default: %(default)s)")
+    parser.add_argument("--target-dpi", type=int, default=DEFAULT_TARGET_DPI, help="Downscale images that record a higher DPI to this with --preprocess-images; 0 disables (default: %(default)s)")
+    parser.add_argument("--image-quality", type=int, default=DEFAULT_QUALITY, help="JPEG quality used by --preprocess-images (default: %(default)s)")
+    parser.add_argument("--pack-images", action="store_true", help="Send small images up to 20 at a time as one multi-page PDF request instead of one request each (needs Pillow)")
+    parser.add_argument("--tile-images", action="store_true", help="Split oversized images into overlapping tiles OCR'd concurrently and merge their text (needs Pillow)")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help="Tile height in pixels with --tile-images (default: %(default)s)")
+    parser.add_argument("--tile-min-pixels", type=int, default=DEFAULT_MIN_TILE_PIXELS, help="Only tile images larger than this many pixels with --tile-images (default: %(default)s)")
+    parser.add_argument("--skip-redundant-pages", action="store_true", help="Don't send blank pages, and reuse the text of pages that repeat an earlier page of the same PDF or image batch")
+    parser.add_argument("--formats", default="md,json", help=f"Comma-separated outputs from {', '.join(EXPORT_FORMATS)} (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="Reprocess files whose outputs are already up to date")
+    parser.add_argument("--job-id", help="Record progress under this job id; rerunning with the same id resumes finished chunks")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="Job journal location (default: %(default)s)")
+    parser.add_argument("--timings", metavar="PATH", help="Write per-stage timing spans as JSON to PATH")
+    parser.add_argument("--profile", metavar="DIR", help="Profile splitting, OCR requests, cleanup and export; write profile.pstats and profile.collapsed to DIR")
+    parser.add_argument("--api-key", default=os.environ.get("MISTRAL_API_KEY"), help="Mistral API key (default: $MISTRAL_API_KEY)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log debug output")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s"
+    )
+
+    formats = tuple(fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip())
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        logger.error("Unknown output format(s): %s", ", ".join(unknown))
+        return 2
+    if not args.api_key:
+        logger.error("No API key given; pass --api-key or set MISTRAL_API_KEY")
+        return 2
+    if (args.preprocess_images or args.pack_images or args.tile_images) and not pillow_available():
+        logger.error("--preprocess-images, --pack-images and --tile-images need Pillow; install it with pip install Pillow")
+        return 2
+
+    inputs = list(iter_input_paths(args.inputs))
+    clashes = output_clashes(inputs)
+    if clashes:
+        for group in clashes:
+            logger.error("Inputs would write the same outputs: %s", ", ".join(group))
+        return 2
+    names = dict(inputs)
+    paths = list(names)
+    pending = [p for p in paths if args.force or not is_up_to_date(p, names[p], args.output_dir, formats)]
+    logger.info("%d input file(s), %d up to date, %d to process", len(paths), len(paths) - len(pending), len(pending))
+    if not pending:
+        return 0
+    if any(path.lower().endswith(TIFF_EXTENSIONS) for path in pending) and not pillow_available():
+        logger.error("TIFF input needs Pillow; install it with pip install Pillow")
+        return 2
+
+    client = get_client(args.api_key, max_connections=max(args.concurrency, args.requests))
+    # One user per CLI run, so the concurrency flags set the process-wide cap
+    GOVERNOR.configure(max_requests=max(args.concurrency, args.requests))
+    dispatcher = Dispatcher(args.requests, args.timeout) if args.requests > 0 else None
+    cleanup_level = None if args.cleanup == "none" else args.cleanup
+    image_prep = ImagePrep(args.max_pixels, args.target_dpi, args.image_quality) if args.preprocess_images else None
+    tiler = ImageTiler(args.tile_size, min_pixels=args.tile_min_pixels, quality=args.image_quality) if args.tile_images else None
+    failures = 0
+
+    if args.timings or args.profile:
+        timeline = Timeline(profiler=Profiler() if args.profile else None)
+    else:
+        timeline = NULL_TIMELINE
+    journal = None
+    if args.job_id:
+        journal = JobJournal(args.journal_dir)
+        journal.create_job({"inputs": args.inputs, "chunk_size": args.chunk_size}, job_id=args.job_id)
+
+    def export(path, doc):
+        """Write ``doc``'s outputs; False if it failed without a single page extracted."""
+        for error in doc.errors:
+            logger.error("%s: %s", path, error)
+        if doc.errors and not doc.page_count:
+            return False
+        with timeline.span("export", document=doc.name):
+            written = write_outputs(doc, args.output_dir, formats, name=names[path])
+        if doc.errors:
+            logger.warning("%s: wrote the %d page(s) extracted, see the errors above -> %s",
+                           path, doc.page_count, ", ".join(written))
+        else:
+            logger.info("%s: %d page(s) -> %s", path, doc.page_count, ", ".join(written))
+        return True
+
+    packed = [
+        path for path in pending
+        if path.lower().endswith(IMAGE_EXTENSIONS) and not path.lower().endswith(TIFF_EXTENSIONS)
+    ] if args.pack_images else []
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {
+            executor.submit(
+                process_path, client, path, args.chunk_size, cleanup_level, args.page_markers,
+                journal, args.job_id, timeline, dispatcher, image_prep, tiler, args.skip_redundant_pages
+            ): path
+            for path in pending if path not in packed
+        }
+        if packed:
+            finished = 0
+            try:
+                for path, doc in process_image_paths(client, packed, cleanup_level, journal, args.job_id,
+                                                     timeline, dispatcher, image_prep, tiler,
+                                                     args.skip_redundant_pages):
+                    finished += 1
+                    if not export(path, doc):
+                        failures += 1
+            except Exception as e:
+                failures += len(packed) - finished
+                logger.error("%s: %s", packed[finished], e)
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                doc = future.result()
+            except Exception as e:
+                failures += 1
+                logger.error("%s: %s", path, e)
+                continue
+            if not export(path, doc):
+                failures += 1
+
+    if args.timings:
+        with open(args.timings, "w") as f:
+            f.write(timeline.to_json())
+    if args.profile:
+        logger.info("Profile written to %s", ", ".join(timeline.profiler.save(args.profile)))
+    if journal is not None:
+        journal.finish_job(args.job_id, "failed" if failures else "done")
+        journal.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
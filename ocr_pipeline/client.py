@@ -0,0 +1,80 @@
+import asyncio
+import atexit
+import hashlib
+import threading
+
+DEFAULT_MAX_CONNECTIONS = 8
+KEEPALIVE_EXPIRY = 60.0
+
+_lock = threading.Lock()
+_clients = {}
+_retired = []
+
+
+def _httpx():
+    # The SDK moved from httpx to the httpx2 fork; build pools with whichever it uses
+    try:
+        import httpx2 as httpx
+    except ImportError:
+        import httpx
+    return httpx
+
+
+class _PooledClient:
+    def __init__(self, api_key, server_url, max_connections):
+        from mistralai.client import Mistral
+
+        httpx = _httpx()
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        self.max_connections = max_connections
+        self.http = httpx.Client(follow_redirects=True, limits=limits)
+        self.async_http = httpx.AsyncClient(follow_redirects=True, limits=limits)
+        kwargs = {"server_url": server_url} if server_url else {}
+        self.sdk = Mistral(api_key=api_key, client=self.http, async_client=self.async_http, **kwargs)
+
+    def close(self):
+        self.http.close()
+        try:
+            asyncio.run(self.async_http.aclose())
+        except Exception:
+            pass
+
+
+def get_client(api_key, max_connections=DEFAULT_MAX_CONNECTIONS, server_url=None):
+    """Shared Mistral client for ``api_key``, keeping its connection pool alive across runs.
+
+    The pool holds at least ``max_connections`` keep-alive connections, so
+    concurrent chunk requests reuse warm TLS connections instead of opening
+    new ones for every batch. Asking for a larger pool than the cached
+    client has replaces it; the old client is closed at exit, since other
+    threads may still be using it.
+    """
+    key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), server_url)
+    max_connections = max(max_connections, DEFAULT_MAX_CONNECTIONS)
+    with _lock:
+        pooled = _clients.get(key)
+        if pooled is None or pooled.max_connections < max_connections:
+            if pooled is not None:
+                _retired.append(pooled)
+            pooled = _clients[key] = _PooledClient(api_key, server_url, max_connections)
+        return pooled.sdk
+
+
+def close_clients():
+    """Close every cached client and its connection pool."""
+    with _lock:
+        pooled = list(_clients.values()) + _retired
+        _clients.clear()
+        _retired.clear()
+    for client in pooled:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_clients)
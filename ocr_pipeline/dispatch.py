@@ -0,0 +1,175 @@
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+import time
+
+from . import metrics
+from .cancellation import CANCEL_GRACE, Cancelled
+from .governor import GOVERNOR
+from .pipeline import OCR_MODEL, extract_pages, response_bytes
+from .singleflight import IN_FLIGHT, request_key
+from .timing import NULL_TIMELINE
+
+DEFAULT_CONCURRENCY = int(os.environ.get("OCR_DISPATCH_CONCURRENCY", "8"))
+DEFAULT_TIMEOUT = float(os.environ.get("OCR_REQUEST_TIMEOUT", "300"))
+
+
+def _process_profiled(client, timeline, kwargs):
+    """The blocking SDK call, profiled as part of the ``ocr_request`` span it runs for."""
+    with timeline.profiled("ocr_request"):
+        return client.ocr.process(**kwargs)
+
+
+class Dispatcher:
+    """Runs OCR requests concurrently on one background event loop.
+
+    ``submit`` schedules a request and returns a ``concurrent.futures.Future``,
+    so synchronous code (the Streamlit script, worker threads) can fan out
+    many requests and collect them in order. Each request is first admitted
+    by the process-wide ``governor.GOVERNOR``; then at most
+    ``max_concurrency`` of this dispatcher's requests are in flight at once,
+    each is abandoned after ``timeout`` seconds, and cancelling a future
+    cancels its request. Requests carrying a cancelled ``CancelToken`` are
+    dropped before they are sent. A request identical to one already in
+    flight waits for its response instead (see
+    ``singleflight.InFlightRequests``). The SDK's ``process_async`` is used
+    when the client has it; otherwise the blocking call runs in the loop's
+    default executor.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ocr-dispatch", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._ready.set()
+        self._loop.run_forever()
+
+    def _call(self, client, payload, include_image_base64, timeline=NULL_TIMELINE):
+        kwargs = {"model": OCR_MODEL, "document": payload, "include_image_base64": include_image_base64}
+        process_async = getattr(client.ocr, "process_async", None)
+        if process_async is not None:
+            return process_async(**kwargs)
+        return self._loop.run_in_executor(None, functools.partial(_process_profiled, client, timeline, kwargs))
+
+    async def _request(self, client, payload, include_image_base64, timeout, timeline, cancel, span_attrs):
+        key = request_key(OCR_MODEL, payload, include_image_base64)
+        flight, leader = IN_FLIGHT.join(key)
+        if not leader:
+            # Wait for the identical request in flight without taking a concurrency slot
+            start = time.perf_counter()
+            try:
+                pages = await asyncio.wrap_future(flight)
+            except Exception:
+                pass
+            else:
+                timeline.add("ocr_shared", time.perf_counter() - start, **span_attrs)
+                return pages
+            return await self._send(client, payload, include_image_base64, timeout, timeline, cancel, span_attrs)
+        try:
+            pages = await self._send(client, payload, include_image_base64, timeout, timeline, cancel, span_attrs)
+        except BaseException as e:
+            IN_FLIGHT.land(key, flight, error=e if isinstance(e, Exception) else Cancelled("Cancelled"))
+            raise
+        IN_FLIGHT.land(key, flight, pages)
+        return pages
+
+    async def _send(self, client, payload, include_image_base64, timeout, timeline, cancel, span_attrs):
+        source = payload.get("document_url") or payload.get("image_url") or ""
+        ticket = GOVERNOR.request(cancel, len(source))
+        try:
+            await asyncio.wrap_future(ticket.future)
+            GOVERNOR.waited(ticket, timeline, **span_attrs)
+            return await self._call_limited(client, payload, include_image_base64, source, timeout, timeline, cancel,
+                                            span_attrs)
+        finally:
+            GOVERNOR.release(ticket)
+
+    async def _call_limited(self, client, payload, include_image_base64, source, timeout, timeline, cancel, span_attrs):
+        async with self._semaphore:
+            if cancel is not None and cancel.cancelled:
+                raise Cancelled("Cancelled before it was sent")
+            metrics.UPLOAD_BYTES.inc(len(source) if source.startswith("data:") else 0)
+            start = time.perf_counter()
+            try:
+                # A span rather than a timing added afterwards, so a profiler samples the loop while requests are in flight
+                with timeline.span("ocr_request", **span_attrs), metrics.REQUESTS_IN_FLIGHT.track_inprogress():
+                    response = await asyncio.wait_for(self._call(client, payload, include_image_base64, timeline), timeout)
+            except asyncio.CancelledError:
+                metrics.REQUEST_SECONDS.labels("cancelled").observe(time.perf_counter() - start)
+                raise
+            except asyncio.TimeoutError:
+                metrics.REQUEST_SECONDS.labels("timeout").observe(time.perf_counter() - start)
+                metrics.RESPONSES.labels("timeout").inc()
+                raise TimeoutError(f"OCR request timed out after {timeout:g}s")
+            except Exception as e:
+                metrics.REQUEST_SECONDS.labels("error").observe(time.perf_counter() - start)
+                metrics.RESPONSES.labels(metrics.status_class(e)).inc()
+                raise
+            metrics.REQUEST_SECONDS.labels("ok").observe(time.perf_counter() - start)
+            metrics.RESPONSES.labels("2xx").inc()
+            pages = extract_pages(response)
+            metrics.DOWNLOAD_BYTES.inc(response_bytes(pages))
+            return pages
+
+    def submit(self, client, payload, include_image_base64=True, timeout=None, timeline=NULL_TIMELINE,
+               cancel=None, **span_attrs):
+        """Schedule one OCR request; the returned future resolves to its pages."""
+        return asyncio.run_coroutine_threadsafe(
+            self._request(client, payload, include_image_base64, timeout or self.timeout, timeline, cancel, span_attrs),
+            self._loop
+        )
+
+    @staticmethod
+    def result(future, cancel=None, grace=CANCEL_GRACE):
+        """Wait for ``future``; once ``cancel`` trips, wait at most ``grace`` more seconds."""
+        if cancel is None:
+            return future.result()
+        while not cancel.cancelled:
+            try:
+                return future.result(timeout=0.25)
+            except concurrent.futures.TimeoutError:
+                pass
+        remaining = cancel.cancelled_at + grace - time.monotonic()
+        try:
+            return future.result(timeout=max(0.0, remaining))
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise Cancelled("Abandoned in flight after cancellation")
+
+    def request(self, client, payload, include_image_base64=True, timeout=None, timeline=NULL_TIMELINE,
+                cancel=None, **span_attrs):
+        """Blocking form of ``submit``; the request is cancelled if the caller is interrupted."""
+        future = self.submit(client, payload, include_image_base64, timeout, timeline, cancel, **span_attrs)
+        try:
+            return self.result(future, cancel)
+        finally:
+            future.cancel()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Process-wide dispatcher; the cached client's async pool is bound to its loop."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher()
+        return _dispatcher
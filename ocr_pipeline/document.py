@@ -0,0 +1,192 @@
+from array import array
+
+from . import metrics
+from .cleanup import clean_ocr_text
+
+PAGE_SEPARATOR = "\n\n"
+EMPTY_RESULT = "No result found."
+
+
+class OCRDocument:
+    """OCR result for one source document, stored as a single text buffer.
+
+    Page boundaries are kept as offset arrays into the buffer, so page lookup
+    and per-page export are plain slices. The cleaned view is computed on
+    first access and cached.
+    """
+
+    __slots__ = (
+        "name",
+        "display_name",
+        "file_type",
+        "preview_src",
+        "image_bytes",
+        "cleanup_level",
+        "errors",
+        "_buffer",
+        "_starts",
+        "_ends",
+        "_cleaned",
+        "_stats",
+    )
+
+    def __init__(self, name, buffer, starts=None, ends=None, display_name=None,
+                 file_type="PDF", preview_src=None, image_bytes=None, cleanup_level="medium",
+                 errors=None):
+        self.name = name
+        self.display_name = display_name or name
+        self.file_type = file_type
+        self.preview_src = preview_src
+        self.image_bytes = image_bytes
+        self.cleanup_level = cleanup_level
+        self.errors = errors or []
+        self._buffer = buffer
+        self._starts = starts if starts is not None else array("q")
+        self._ends = ends if ends is not None else array("q")
+        self._cleaned = None
+        self._stats = {}
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __repr__(self):
+        return f"OCRDocument(name={self.name!r}, pages={len(self)}, chars={len(self._buffer)})"
+
+    @property
+    def page_count(self):
+        return len(self._starts)
+
+    @property
+    def text(self):
+        """Raw OCR text for the whole document."""
+        return self._buffer
+
+    @property
+    def cleaned(self):
+        """Cleaned text, or the raw text when cleanup is disabled."""
+        if self.cleanup_level is None:
+            return self._buffer
+        if self._cleaned is None:
+            with metrics.CLEANUP_SECONDS.time():
+                self._cleaned = clean_ocr_text(self._buffer, self.cleanup_level)
+        return self._cleaned
+
+    def view(self, raw=False):
+        return self._buffer if raw else self.cleaned
+
+    def page(self, index, cleaned=False):
+        """Return the markdown of a single page (zero-based)."""
+        text = self._buffer[self._starts[index]:self._ends[index]]
+        if cleaned and self.cleanup_level is not None:
+            with metrics.CLEANUP_SECONDS.time():
+                return clean_ocr_text(text, self.cleanup_level)
+        return text
+
+    def pages(self, cleaned=False):
+        for index in range(len(self._starts)):
+            yield self.page(index, cleaned)
+
+    def word_count(self, raw=False):
+        """Get approximate word count from text."""
+        key = ("words", raw)
+        if key not in self._stats:
+            self._stats[key] = len(self.view(raw).split())
+        return self._stats[key]
+
+    def char_count(self, raw=False):
+        """Get character count from text."""
+        return len(self.view(raw))
+
+    def to_dict(self):
+        """Serializable form used by the job queue; see ``from_dict``."""
+        return {
+            "name": self.name,
+            "display_name": self.display_name,
+            "file_type": self.file_type,
+            "cleanup_level": self.cleanup_level,
+            "errors": list(self.errors),
+            "text": self._buffer,
+            "starts": self._starts.tolist(),
+            "ends": self._ends.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data, **kwargs):
+        return cls(
+            data["name"],
+            data["text"],
+            array("q", data["starts"]),
+            array("q", data["ends"]),
+            display_name=data.get("display_name"),
+            file_type=data.get("file_type", "PDF"),
+            cleanup_level=data.get("cleanup_level", "medium"),
+            errors=data.get("errors"),
+            **kwargs
+        )
+
+
+class DocumentBuilder:
+    """Accumulates page and note segments and packs them into an OCRDocument.
+
+    Notes (e.g. chunk error messages) are kept in the text in order but are
+    not counted as pages.
+    """
+
+    def __init__(self, page_markers=False):
+        self.page_markers = page_markers
+        self._segments = []
+        self._page_total = 0
+        self.errors = []
+
+    @property
+    def page_count(self):
+        return self._page_total
+
+    def add_page(self, markdown):
+        self._page_total += 1
+        if self.page_markers:
+            self._segments.append((f"--- Page {self._page_total} ---{PAGE_SEPARATOR}", markdown))
+        else:
+            self._segments.append(("", markdown))
+
+    def add_pages(self, pages):
+        for markdown in pages:
+            self.add_page(markdown)
+
+    def add_note(self, text):
+        self._segments.append((None, text))
+
+    def add_error(self, text):
+        """Record a failure message in the text flow and in ``errors``."""
+        self.errors.append(text)
+        self.add_note(text)
+
+    def build(self, name, **kwargs):
+        """Pack the segments into an OCRDocument; blank pages keep their (empty) offsets."""
+        kwargs.setdefault("errors", list(self.errors))
+        if not self._segments:
+            return OCRDocument(name, EMPTY_RESULT, **kwargs)
+
+        parts = []
+        starts = array("q")
+        ends = array("q")
+        offset = 0
+        for index, (prefix, text) in enumerate(self._segments):
+            if index:
+                parts.append(PAGE_SEPARATOR)
+                offset += len(PAGE_SEPARATOR)
+            if prefix is None:
+                parts.append(text)
+                offset += len(text)
+                continue
+            parts.append(prefix)
+            offset += len(prefix)
+            starts.append(offset)
+            parts.append(text)
+            offset += len(text)
+            ends.append(offset)
+
+        buffer = "".join(parts)
+        if not buffer and not starts:
+            return OCRDocument(name, EMPTY_RESULT, **kwargs)
+        return OCRDocument(name, buffer, starts, ends, **kwargs)
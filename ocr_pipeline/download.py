@@ -0,0 +1,272 @@
+import hashlib
+import io
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from .timing import NULL_TIMELINE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DOWNLOAD_BYTES = 200 * 1024 * 1024
+DEFAULT_LOCAL_THRESHOLD_BYTES = 2 * 1024 * 1024
+DOWNLOAD_TIMEOUT = 60.0
+READ_CHUNK_BYTES = 1024 * 1024
+PDF_SIGNATURE = b"%PDF-"
+DEFAULT_PREFETCH = 3
+DEFAULT_PREFETCH_BYTES = 256 * 1024 * 1024
+PREFETCH_WAIT = 0.25
+DOWNLOAD_SCHEMES = ("http", "https")
+
+
+class DownloadSkipped(Exception):
+    """Raised when a URL should be sent to the API as it is instead of downloaded."""
+
+
+def check_public_url(url):
+    """Raise ``DownloadSkipped`` unless ``url`` is http(s) on a host that resolves only to public addresses.
+
+    Keeps a server that downloads URLs given by its clients from being
+    pointed at itself or its private network. The host is resolved here
+    and again when connecting, so this does not stop DNS rebinding.
+    """
+    parts = urlparse(url)
+    if parts.scheme not in DOWNLOAD_SCHEMES or not parts.hostname:
+        raise DownloadSkipped(f"only {' and '.join(DOWNLOAD_SCHEMES)} URLs are downloaded")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+    except (OSError, UnicodeError, ValueError) as e:
+        raise DownloadSkipped(f"could not resolve {parts.hostname}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global:
+            raise DownloadSkipped(f"{parts.hostname} resolves to the non-public address {address}")
+
+
+class PdfDownloader:
+    """Fetches PDFs given by URL so they can be split and sent in chunks.
+
+    The response headers are checked before the body is read: a PDF whose
+    ``Content-Length`` is below ``local_threshold`` bytes, or a text
+    response, is left for the API to fetch in one request. Larger PDFs, or
+    ones of unknown size, are streamed in blocks and given up on once they
+    pass ``max_bytes``. With a ``cache_dir``, each download is kept with its
+    ``ETag`` and ``Last-Modified`` headers, and fetching the same URL again
+    sends a conditional request that reuses the copy when it has not
+    changed. With ``public_only``, each URL and redirect is checked with
+    ``check_public_url`` before it is requested.
+    """
+
+    def __init__(self, local_threshold=DEFAULT_LOCAL_THRESHOLD_BYTES, max_bytes=DEFAULT_MAX_DOWNLOAD_BYTES,
+                 cache_dir=None, timeout=DOWNLOAD_TIMEOUT, public_only=False):
+        self.local_threshold = local_threshold
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.public_only = public_only
+
+    def _cache_paths(self, url):
+        stem = os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest())
+        return stem + ".pdf", stem + ".json"
+
+    def _validators(self, url):
+        """``ETag`` and ``Last-Modified`` of the kept copy of ``url``, or {} if there is none."""
+        if not self.cache_dir:
+            return {}
+        data_path, meta_path = self._cache_paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return meta if os.path.exists(data_path) else {}
+
+    def _store(self, url, data, response):
+        meta = {key: response.headers[key] for key in ("ETag", "Last-Modified") if key in response.headers}
+        if not self.cache_dir or not meta:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data_path, meta_path = self._cache_paths(url)
+        for path, body in ((data_path, data), (meta_path, json.dumps(meta).encode("utf-8"))):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+
+    def fetch(self, url, cancel=None, on_bytes=None):
+        """The bytes of the PDF at ``url``.
+
+        ``on_bytes(size)``, if given, is called with the number of bytes
+        the download will hold at least: its ``Content-Length`` once the
+        headers are in, and the running total before each block is kept.
+        It may block to hold the download back.
+
+        Raises ``DownloadSkipped`` when the PDF is small enough to send by
+        URL, too large to download, not a PDF, or (with ``public_only``) on
+        a host that is not public, and lets network errors propagate.
+        """
+        from .client import _httpx
+
+        httpx = _httpx()
+        meta = self._validators(url)
+        headers = {}
+        if "ETag" in meta:
+            headers["If-None-Match"] = meta["ETag"]
+        if "Last-Modified" in meta:
+            headers["If-Modified-Since"] = meta["Last-Modified"]
+        event_hooks = {"request": [lambda request: check_public_url(str(request.url))]} if self.public_only else {}
+        with httpx.Client(follow_redirects=True, timeout=self.timeout, event_hooks=event_hooks) as http, \
+                http.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and meta:
+                with open(self._cache_paths(url)[0], "rb") as f:
+                    return f.read()
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type.startswith("text/"):
+                # Error and login pages; anything else is checked for the PDF signature once downloaded
+                raise DownloadSkipped(f"the response is {content_type}, not a PDF")
+            length = response.headers.get("Content-Length", "")
+            if length.isdigit() and int(length) < self.local_threshold:
+                raise DownloadSkipped(f"{int(length)} bytes is below the local threshold")
+            if length.isdigit() and int(length) > self.max_bytes:
+                raise DownloadSkipped(f"{int(length)} bytes is over the download limit")
+            if on_bytes is not None and length.isdigit():
+                on_bytes(int(length))
+            out = io.BytesIO()
+            for block in response.iter_bytes(READ_CHUNK_BYTES):
+                if out.tell() + len(block) > self.max_bytes:
+                    raise DownloadSkipped(f"over the download limit of {self.max_bytes} bytes")
+                if on_bytes is not None:
+                    on_bytes(out.tell() + len(block))
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                out.write(block)
+        data = out.getvalue()
+        if not data.startswith(PDF_SIGNATURE):
+            raise DownloadSkipped("the response is not a PDF")
+        if len(data) < self.local_threshold:
+            # No Content-Length (chunked or compressed responses) until the body was read
+            raise DownloadSkipped(f"{len(data)} bytes is below the local threshold")
+        self._store(url, data, response)
+        return data
+
+
+def download_pdf(downloader, name, url, timeline=NULL_TIMELINE, cancel=None, on_bytes=None):
+    """The PDF at ``url`` fetched with ``downloader``, or None to send the URL to the API as it is.
+
+    Downloads that fail or are skipped fall back to the URL, which is what
+    would have been sent without a downloader. ``on_bytes`` is passed to
+    ``PdfDownloader.fetch``.
+    """
+    start = time.perf_counter()
+    data = None
+    try:
+        data = downloader.fetch(url, cancel, on_bytes)
+    except DownloadSkipped as e:
+        logger.info("%s: sending by URL, %s", name, e)
+    except Exception as e:
+        if cancel is None or not cancel.cancelled:
+            logger.warning("%s: download failed, sending by URL: %s", name, e)
+    timeline.add("download_pdf", time.perf_counter() - start, document=name,
+                 mode="url" if data is None else "local", bytes=len(data) if data is not None else 0)
+    return data
+
+
+class Prefetcher:
+    """Downloads the PDFs of a batch ahead of the one being OCR'd, so fetching overlaps OCR.
+
+    ``get(i)`` returns what ``download_pdf`` returns for the ``i``-th
+    ``(name, url)`` of ``items``, waiting for it if it is not ready, and
+    keeps up to ``lookahead`` of the following URLs downloading on worker
+    threads. Downloads are held in memory until they are taken, and count
+    against ``max_held_bytes`` from their ``Content-Length`` or as their
+    blocks arrive: no new download starts while they add up to the cap,
+    and a download ahead of the current one stops reading while its next
+    block would go over it. Only the current download may pass the cap.
+    """
+
+    def __init__(self, downloader, items, lookahead=DEFAULT_PREFETCH, max_held_bytes=DEFAULT_PREFETCH_BYTES,
+                 timeline=NULL_TIMELINE, cancel=None):
+        self.downloader = downloader
+        self.items = list(items)
+        self.lookahead = lookahead
+        self.max_held_bytes = max_held_bytes
+        self.timeline = timeline
+        self.cancel = cancel
+        self._futures = {}
+        self._reserved = {}
+        self._next = 0
+        self._current = 0
+        self._closed = False
+        self._room = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=lookahead + 1, thread_name_prefix="ocr-prefetch")
+        self._fill(0)
+
+    def _held_bytes(self):
+        """Bytes of finished downloads not yet taken plus those reserved by downloads in progress."""
+        done = sum(len(future.result() or b"") for future in self._futures.values() if future.done())
+        return done + sum(self._reserved.values())
+
+    def _reserve(self, index, size):
+        """Count ``size`` bytes for download ``index``, waiting while a download ahead would pass the cap."""
+        with self._room:
+            while (index > self._current and not self._closed
+                   and self._held_bytes() - self._reserved.get(index, 0) + size > self.max_held_bytes):
+                if self.cancel is not None and self.cancel.cancelled:
+                    break
+                self._room.wait(PREFETCH_WAIT)
+            if self._closed:
+                raise DownloadSkipped("prefetching stopped")
+            self._reserved[index] = max(size, self._reserved.get(index, 0))
+
+    def _download(self, index, name, url):
+        try:
+            return download_pdf(self.downloader, name, url, self.timeline, self.cancel,
+                                on_bytes=lambda size: self._reserve(index, size))
+        finally:
+            with self._room:
+                self._reserved.pop(index, None)
+                self._room.notify_all()
+
+    def _fill(self, current):
+        """Start downloads up to ``lookahead`` past ``current``, which is always started."""
+        with self._room:
+            self._current = current
+            while self._next < len(self.items) and (
+                    self._next <= current or
+                    (self._next <= current + self.lookahead and self._held_bytes() < self.max_held_bytes)):
+                name, url = self.items[self._next]
+                self._futures[self._next] = self._executor.submit(self._download, self._next, name, url)
+                self._next += 1
+            self._room.notify_all()
+
+    def get(self, index):
+        self._fill(index)
+        with self._room:
+            future = self._futures.pop(index, None)
+        data = future.result() if future is not None else None
+        self._fill(index)
+        return data
+
+    def close(self):
+        """Drop downloads that have not started; ones in progress stop at their next block."""
+        with self._room:
+            self._closed = True
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+            self._room.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
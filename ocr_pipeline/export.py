@@ -0,0 +1,257 @@
+import io
+import json
+import logging
+import os
+import re
+from datetime import datetime
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("md", "txt", "json", "pdf")
+
+
+def create_pdf_from_markdown(markdown_text, file_name):
+    """Convert markdown text to a beautifully formatted PDF."""
+    # ReportLab takes a noticeable share of start-up time, so load it on first export
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+
+    try:
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(
+            buffer, 
+            pagesize=letter,
+            rightMargin=60, 
+            leftMargin=60,
+            topMargin=60, 
+            bottomMargin=60
+        )
+        
+        elements = []
+        styles = getSampleStyleSheet()
+        
+        # Custom styles
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Title'],
+            textColor=colors.HexColor('#6366f1'),
+            fontSize=24,
+            fontName='Helvetica-Bold',
+            spaceAfter=20,
+            alignment=TA_CENTER
+        )
+        
+        heading1_style = ParagraphStyle(
+            'CustomH1',
+            parent=styles['Heading1'],
+            textColor=colors.HexColor('#1f2937'),
+            fontSize=18,
+            fontName='Helvetica-Bold',
+            spaceBefore=20,
+            spaceAfter=12
+        )
+        
+        heading2_style = ParagraphStyle(
+            'CustomH2',
+            parent=styles['Heading2'],
+            textColor=colors.HexColor('#374151'),
+            fontSize=14,
+            fontName='Helvetica-Bold',
+            spaceBefore=16,
+            spaceAfter=8
+        )
+        
+        normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=10,
+            leading=14,
+            textColor=colors.HexColor('#4b5563'),
+            alignment=TA_JUSTIFY
+        )
+        
+        code_style = ParagraphStyle(
+            'CustomCode',
+            parent=styles['Normal'],
+            fontName='Courier',
+            fontSize=8,
+            backColor=colors.HexColor('#f3f4f6'),
+            borderPadding=8,
+            leading=12
+        )
+        
+        def sanitize_text(text):
+            text = re.sub(r'<([^>]+)>', r'&lt;\1&gt;', text)
+            replacements = {
+                '&': '&amp;',
+                '"': '&quot;',
+                "'": '&#39;',
+                '\u2028': ' ',
+                '\u2029': ' ',
+            }
+            for char, replacement in replacements.items():
+                text = text.replace(char, replacement)
+            return text
+        
+        sanitized_text = sanitize_text(markdown_text)
+        lines = sanitized_text.split('\n')
+        
+        # Add document header
+        elements.append(Paragraph(f"📄 {file_name}", title_style))
+        elements.append(Paragraph(f"Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", 
+                                 ParagraphStyle('Meta', parent=normal_style, alignment=TA_CENTER, textColor=colors.HexColor('#9ca3af'))))
+        elements.append(Spacer(1, 30))
+        
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            
+            if line.startswith('# '):
+                elements.append(Paragraph(sanitize_text(line[2:]), title_style))
+                elements.append(Spacer(1, 12))
+            elif line.startswith('## '):
+                elements.append(Paragraph(sanitize_text(line[3:]), heading1_style))
+                elements.append(Spacer(1, 10))
+            elif line.startswith('### '):
+                elements.append(Paragraph(sanitize_text(line[4:]), heading2_style))
+                elements.append(Spacer(1, 8))
+            elif line.startswith('|') and '|' in line[1:]:
+                table_data = []
+                table_row = [sanitize_text(cell.strip()) for cell in line.split('|') if cell.strip()]
+                table_data.append(table_row)
+                i += 1
+                if i < len(lines) and '---' in lines[i]:
+                    i += 1
+                while i < len(lines) and lines[i].strip().startswith('|'):
+                    table_row = [sanitize_text(cell.strip()) for cell in lines[i].split('|') if cell.strip()]
+                    table_data.append(table_row)
+                    i += 1
+                if table_data:
+                    max_cols = max(len(row) for row in table_data)
+                    for row in table_data:
+                        while len(row) < max_cols:
+                            row.append('')
+                    table = Table(table_data)
+                    table.setStyle(TableStyle([
+                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
+                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                        ('FONTSIZE', (0, 0), (-1, -1), 9),
+                        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                        ('TOPPADDING', (0, 0), (-1, 0), 12),
+                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
+                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
+                    ]))
+                    elements.append(table)
+                    elements.append(Spacer(1, 12))
+                continue
+            elif line.startswith('```'):
+                code_content = []
+                i += 1
+                while i < len(lines) and not lines[i].startswith('```'):
+                    code_content.append(sanitize_text(lines[i]))
+                    i += 1
+                if i < len(lines):
+                    i += 1
+                if code_content:
+                    code_text = '<pre>' + '\n'.join(code_content) + '</pre>'
+                    elements.append(Paragraph(code_text, code_style))
+                    elements.append(Spacer(1, 12))
+                continue
+            elif line and not line.startswith(('- ', '* ', '1. ')):
+                paragraph_text = line
+                next_idx = i + 1
+                while (next_idx < len(lines) and 
+                       lines[next_idx].strip() and 
+                       not lines[next_idx].strip().startswith(('# ', '## ', '### ', '- ', '* ', '1. ', '|', '```'))):
+                    paragraph_text += ' ' + lines[next_idx].strip()
+                    next_idx += 1
+                try:
+                    elements.append(Paragraph(sanitize_text(paragraph_text), normal_style))
+                    elements.append(Spacer(1, 8))
+                except Exception:
+                    elements.append(Paragraph('[Content rendering error]', normal_style))
+                    elements.append(Spacer(1, 8))
+                i = next_idx - 1
+            elif line.startswith(('- ', '* ')):
+                list_items = [line[2:]]
+                next_idx = i + 1
+                while next_idx < len(lines) and lines[next_idx].strip().startswith(('- ', '* ')):
+                    list_items.append(lines[next_idx].strip()[2:])
+                    next_idx += 1
+                for item in list_items:
+                    bullet_text = '• ' + sanitize_text(item)
+                    try:
+                        elements.append(Paragraph(bullet_text, normal_style))
+                    except Exception:
+                        elements.append(Paragraph('• [Item error]', normal_style))
+                elements.append(Spacer(1, 8))
+                i = next_idx - 1
+            
+            i += 1
+        
+        if len(elements) <= 3:
+            elements.append(Paragraph(f"{file_name} - Extracted Text", title_style))
+            elements.append(Spacer(1, 12))
+            elements.append(Paragraph("Document processed successfully.", normal_style))
+        
+        doc.build(elements)
+        pdf_data = buffer.getvalue()
+        buffer.close()
+        return pdf_data
+        
+    except Exception as e:
+        logger.warning("PDF generation error: %s", e)
+        return None
+
+
+def json_payload(doc, raw=False):
+    """Serialize a document the way the JSON download presents it."""
+    return json.dumps({
+        "filename": doc.name,
+        "extracted_at": datetime.now().isoformat(),
+        "word_count": doc.word_count(raw=raw),
+        "page_count": doc.page_count,
+        "content": doc.view(raw=raw)
+    }, ensure_ascii=False, indent=2)
+
+
+def output_paths(name, output_dir, formats=EXPORT_FORMATS):
+    """Map each export format to its file path for a document called ``name``.
+
+    ``name`` may be a relative path, whose directories are kept under
+    ``output_dir``.
+    """
+    paths = {}
+    for fmt in formats:
+        suffix = "_extracted.pdf" if fmt == "pdf" else f".{fmt}"
+        paths[fmt] = os.path.join(output_dir, f"{name}{suffix}")
+    return paths
+
+
+def write_outputs(doc, output_dir, formats=EXPORT_FORMATS, raw=False, name=None):
+    """Write ``doc`` to ``output_dir`` in each of ``formats`` under ``name`` (default its name); returns the paths written."""
+    written = []
+    text = doc.view(raw=raw)
+    for fmt, path in output_paths(name or doc.name, output_dir, formats).items():
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with metrics.EXPORT_SECONDS.labels(fmt).time():
+            if fmt == "json":
+                data = json_payload(doc, raw=raw).encode("utf-8")
+            elif fmt == "pdf":
+                data = create_pdf_from_markdown(text, doc.name)
+            else:
+                data = text.encode("utf-8")
+        if data is None:
+            continue
+        with open(path, "wb") as f:
+            f.write(data)
+        written.append(path)
+    return written
@@ -0,0 +1,266 @@
+import hashlib
+import io
+import re
+
+BLANK_INK_RATIO = 0.0001
+BLANK_CANDIDATE_BYTES_PER_PIXEL = 0.02
+THUMBNAIL_SIZE = (1024, 1024)
+PIXEL_HASH_WIDTH = 512
+PIXEL_HASH_LEVELS = 16
+INK_CONTRAST = 64
+MAX_FORM_DEPTH = 4
+# Annotations that draw nothing on the page, and the Hidden and NoView flags
+UNDRAWN_ANNOTATIONS = ("/Link", "/Popup")
+HIDDEN_ANNOTATION_FLAGS = 2 | 32
+# Content stream operators that show text, paint paths or images; a page without any is blank
+PAINT_OPERATORS = re.compile(rb"(?<![A-Za-z0-9*'\"])(?:Tj|TJ|'|\"|Do|sh|BI|[fFSsBb]\*?)(?![A-Za-z0-9*])")
+
+
+class PagePlan:
+    """Which pages of a document to OCR.
+
+    ``sources[i]`` is the page whose text page ``i`` gets: ``i`` itself
+    for pages that are sent, the first copy for a duplicate, and None for
+    a blank page, which gets no text. ``expand`` turns the responses for
+    the sent pages back into text for every page.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+        self._text = {}
+        self._failed = set()
+        self._failed_copies = {}
+
+    @classmethod
+    def from_fingerprints(cls, fingerprints):
+        """Plan from one ``(keys, blank)`` pair per page; pages sharing any key are duplicates."""
+        first_seen = {}
+        sources = []
+        for index, (keys, blank) in enumerate(fingerprints):
+            if blank:
+                sources.append(None)
+                continue
+            source = next((first_seen[key] for key in keys if key in first_seen), index)
+            for key in keys:
+                first_seen.setdefault(key, source)
+            sources.append(source)
+        return cls(sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+    @property
+    def blank(self):
+        return sum(source is None for source in self.sources)
+
+    @property
+    def duplicates(self):
+        return sum(source is not None and source != index for index, source in enumerate(self.sources))
+
+    @property
+    def skipped(self):
+        return self.blank + self.duplicates
+
+    def sent(self, first=0, count=None):
+        """Indices of the pages from ``first`` to send, out of the next ``count``."""
+        end = len(self.sources) if count is None else first + count
+        return [index for index in range(first, end) if self.sources[index] == index]
+
+    def fail(self, pages):
+        """Mark sent ``pages`` as not extracted, so their copies are reported rather than left empty."""
+        self._failed.update(pages)
+
+    def failed_copies(self, first=0, count=None):
+        """``{page: source}`` for the copies among the next ``count`` pages whose source was not extracted."""
+        end = len(self.sources) if count is None else first + count
+        return {index: source for index, source in self._failed_copies.items() if first <= index < end}
+
+    def expand(self, first, count, markdown, failed=()):
+        """Text for pages ``first`` to ``first + count`` from the ``markdown`` returned for their sent pages.
+
+        A list with one entry per page (a checkpointed chunk) is taken as
+        it is. Sent pages in ``failed`` could not be extracted (their
+        ``markdown`` is empty) and are marked as in ``fail``. A duplicate
+        of a page that was not extracted gets no text and is listed by
+        ``failed_copies``. Duplicates must come after their first copy.
+        """
+        self.fail(failed)
+        sent = self.sent(first, count)
+        if len(markdown) == count and len(sent) != count:
+            pages = list(markdown)
+        elif len(markdown) != len(sent):
+            raise ValueError(f"expected {len(sent)} pages, got {len(markdown)}")
+        else:
+            returned = {index: text for index, text in zip(sent, markdown) if index not in self._failed}
+            pages = []
+            for index in range(first, first + count):
+                source = self.sources[index]
+                if source is None:
+                    pages.append("")
+                elif source in returned:
+                    pages.append(returned[source])
+                elif source in self._text:
+                    pages.append(self._text[source])
+                else:
+                    if source != index:
+                        self._failed_copies[index] = source
+                    pages.append("")
+        for index, text in enumerate(pages, first):
+            if index not in self._failed and index not in self._failed_copies:
+                self._text[index] = text
+        return pages
+
+
+def image_fingerprint(data):
+    """``(keys, blank)`` for an image: its exact hash, a hash of its pixels and whether it is blank.
+
+    The pixel hash is taken over a greyscale thumbnail with few grey
+    levels, so the same picture saved again (with other metadata, or as
+    PNG instead of JPEG) usually matches while any visible difference does
+    not. Without Pillow, or for an image it cannot read, only the exact
+    hash is used.
+    """
+    keys = [hashlib.sha256(data).digest()]
+    try:
+        from PIL import Image, ImageOps
+
+        from .imaging import flatten
+
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("L", THUMBNAIL_SIZE)
+            image = flatten(ImageOps.exif_transpose(image)).convert("L")
+    except Exception:
+        return keys, False
+    height = max(1, round(image.height * PIXEL_HASH_WIDTH / image.width))
+    levels = image.resize((PIXEL_HASH_WIDTH, height), Image.Resampling.BOX)
+    levels = levels.point(lambda value: value * PIXEL_HASH_LEVELS // 256)
+    keys.append(b"pixels:" + hashlib.sha256(levels.tobytes()).digest())
+    image.thumbnail(THUMBNAIL_SIZE)
+    return keys, is_blank(image)
+
+
+def is_blank(image):
+    """True if the greyscale ``image`` has next to no marks darker than its background."""
+    histogram = image.histogram()
+    background = max(range(256), key=histogram.__getitem__)
+    ink = sum(histogram[:max(0, background - INK_CONTRAST)])
+    return ink <= BLANK_INK_RATIO * image.width * image.height
+
+
+def _xobjects(resources):
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    return [xobject.get_object() for xobject in xobjects.get_object().values()] if xobjects is not None else []
+
+
+def _draws(data, resources, digest, images, depth=0):
+    """Paint operators used by the content stream ``data``, following the forms it draws.
+
+    The data of every image and form is added to ``digest`` and the images
+    are collected in ``images``.
+    """
+    operators = {match.group() for match in PAINT_OPERATORS.finditer(data)}
+    for xobject in _xobjects(resources):
+        subtype = xobject.get("/Subtype", "")
+        digest.update(subtype.encode())
+        digest.update(getattr(xobject, "_data", b"") or b"")
+        if subtype == "/Image":
+            images.append(xobject)
+        elif subtype == "/Form" and depth < MAX_FORM_DEPTH:
+            operators |= _draws(xobject.get_data(), xobject.get("/Resources"), digest, images, depth + 1)
+        else:
+            operators.add(b"Form")
+    return operators
+
+
+def _annotation_draws(page, digest, images):
+    """Paint operators used by the appearances of ``page``'s visible annotations, as ``_draws``.
+
+    Each annotation's type, text and field value go into ``digest`` too. An
+    annotation without an appearance stream is drawn by the viewer, so it
+    counts as painting.
+    """
+    operators = set()
+    annotations = page.get("/Annots")
+    for annotation in annotations.get_object() if annotations is not None else []:
+        annotation = annotation.get_object()
+        subtype = annotation.get("/Subtype", "")
+        if subtype in UNDRAWN_ANNOTATIONS or int(annotation.get("/F", 0)) & HIDDEN_ANNOTATION_FLAGS:
+            continue
+        digest.update(subtype.encode())
+        for key in ("/Contents", "/V"):
+            if key in annotation:
+                digest.update(str(annotation[key]).encode("utf-8", "replace"))
+        appearance = annotation.get("/AP")
+        normal = appearance.get_object().get("/N") if appearance is not None else None
+        normal = normal.get_object() if normal is not None else None
+        if normal is not None and not hasattr(normal, "get_data"):
+            # Appearances per state, e.g. a checkbox's /Yes and /Off
+            state = normal.get(annotation.get("/AS", ""))
+            normal = state.get_object() if state is not None else None
+        if normal is None:
+            operators.add(b"Annot")
+            continue
+        data = normal.get_data()
+        digest.update(data)
+        operators |= _draws(data, normal.get("/Resources"), digest, images, 1)
+    return operators
+
+
+def _blank_scan(xobject):
+    """True if the image XObject compresses to almost nothing and shows no ink."""
+    from PyPDF2.filters import _xobj_to_image
+
+    pixels = int(xobject.get("/Width", 0)) * int(xobject.get("/Height", 0))
+    raw = getattr(xobject, "_data", b"") or b""
+    if not pixels or len(raw) > BLANK_CANDIDATE_BYTES_PER_PIXEL * pixels:
+        return False
+    filters = xobject.get("/Filter")
+    if (filters[-1] if isinstance(filters, list) and filters else filters) == "/DCTDecode":
+        # PyPDF2 undoes any outer filters and leaves the JPEG as it is
+        data = xobject.get_data()
+    else:
+        extension, data = _xobj_to_image(xobject)
+        if extension is None:
+            return False
+    return image_fingerprint(data)[1]
+
+
+def pdf_page_fingerprint(page):
+    """``(keys, blank)`` for a PyPDF2 page: a hash of what it draws and whether it draws nothing.
+
+    The hash covers the page's content stream, the data of the images and
+    forms it uses and its visible annotations (filled form fields, stamps,
+    comments), so a page repeated in the same document (or saved again by
+    another tool) matches. A page is blank if neither its content nor its
+    annotations show text or paint anything, or they only paint scanned
+    images that are themselves blank.
+    """
+    contents = page.get_contents()
+    if contents is None:
+        data = b""
+    elif hasattr(contents, "get_data"):
+        data = contents.get_data()
+    else:
+        # Some PyPDF2 versions return a page's several content streams as an array
+        data = b"\n".join(part.get_object().get_data() for part in contents)
+    digest = hashlib.sha256(data)
+    images = []
+    operators = _draws(data, page.get("/Resources"), digest, images)
+    operators |= _annotation_draws(page, digest, images)
+    keys = [digest.digest()]
+    if operators - {b"Do"}:
+        return keys, False
+    try:
+        return keys, all(_blank_scan(image) for image in images)
+    except Exception:
+        return keys, False
+
+
+def plan_pdf_pages(pages):
+    """``PagePlan`` for a sequence of PyPDF2 pages."""
+    return PagePlan.from_fingerprints([pdf_page_fingerprint(page) for page in pages])
+
+
+def plan_images(images):
+    """``PagePlan`` for a list of image bytes, one page each."""
+    return PagePlan.from_fingerprints([image_fingerprint(data) for data in images])
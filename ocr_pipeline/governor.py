@@ -0,0 +1,178 @@
+import concurrent.futures
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from . import metrics
+from .timing import NULL_TIMELINE
+
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get("OCR_MAX_IN_FLIGHT", "8"))
+DEFAULT_MAX_IN_FLIGHT_BYTES = int(os.environ.get("OCR_MAX_IN_FLIGHT_MB", "256")) * 1024 * 1024
+WAIT_POLL = 0.25
+
+
+class Ticket:
+    """One request's place in the governor: waiting until ``future`` resolves, then admitted."""
+
+    __slots__ = ("group", "size", "order", "future", "admitted", "queued_at")
+
+    def __init__(self, group, size, order):
+        self.group = group
+        self.size = size
+        self.order = order
+        self.future = concurrent.futures.Future()
+        # Running futures can't be cancelled, so only ``release`` takes a ticket out of the queue
+        self.future.set_running_or_notify_cancel()
+        self.admitted = False
+        self.queued_at = time.perf_counter()
+
+
+class Governor:
+    """Process-wide admission control for OCR requests, shared fairly between batches.
+
+    At most ``max_requests`` requests and ``max_bytes`` of payload are in
+    flight at once across every session, worker thread and dispatcher in
+    the process. Requests that don't fit wait in one queue per group (a
+    batch; the pipeline uses its cancel token). When a slot frees up, the
+    group with the fewest requests in flight goes next, and among equals
+    the one served longest ago, so groups take turns: a batch with
+    hundreds of chunks queued lets a session sending one image go after
+    its current request instead of after all of them. A request larger
+    than ``max_bytes`` is admitted once nothing else is in flight.
+    """
+
+    def __init__(self, max_requests=DEFAULT_MAX_IN_FLIGHT, max_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES):
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._waiting = {}
+        self._in_flight = {}
+        self._served = {}
+        self._requests = 0
+        self._bytes = 0
+
+    def configure(self, max_requests=None, max_bytes=None):
+        """Change the caps; requests already in flight are not affected."""
+        with self._lock:
+            if max_requests is not None:
+                self.max_requests = max_requests
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._grant()
+
+    def _fits(self, ticket):
+        if self._requests >= self.max_requests:
+            return False
+        return self._requests == 0 or self._bytes + ticket.size <= self.max_bytes
+
+    @staticmethod
+    def _next(heads, in_flight, served):
+        """Group to admit next from ``heads`` (group -> order of its oldest waiting request)."""
+        return min(heads, key=lambda group: (in_flight.get(group, 0), served.get(group, -1), heads[group]), default=None)
+
+    def _grant(self):
+        while self._waiting:
+            heads = {group: queue[0].order for group, queue in self._waiting.items()}
+            group = self._next(heads, self._in_flight, self._served)
+            ticket = self._waiting[group][0]
+            # The fair choice waits for room rather than letting smaller requests past it
+            if not self._fits(ticket):
+                return
+            self._waiting[group].popleft()
+            if not self._waiting[group]:
+                del self._waiting[group]
+            ticket.admitted = True
+            self._served[group] = next(self._order)
+            self._in_flight[group] = self._in_flight.get(group, 0) + 1
+            self._requests += 1
+            self._bytes += ticket.size
+            metrics.REQUESTS_QUEUED.dec()
+            ticket.future.set_result(ticket)
+
+    def request(self, group, size=0):
+        """Queue a request of ``size`` bytes for ``group``; its ``future`` resolves once it is admitted."""
+        with self._lock:
+            ticket = Ticket(group, size, next(self._order))
+            self._waiting.setdefault(group, deque()).append(ticket)
+            metrics.REQUESTS_QUEUED.inc()
+            self._grant()
+        return ticket
+
+    def release(self, ticket):
+        """Free an admitted request's slot, or withdraw one still waiting."""
+        with self._lock:
+            if ticket.admitted:
+                ticket.admitted = False
+                self._in_flight[ticket.group] -= 1
+                if not self._in_flight[ticket.group]:
+                    del self._in_flight[ticket.group]
+                    if ticket.group not in self._waiting:
+                        del self._served[ticket.group]
+                self._requests -= 1
+                self._bytes -= ticket.size
+            elif ticket in self._waiting.get(ticket.group, ()):
+                self._waiting[ticket.group].remove(ticket)
+                if not self._waiting[ticket.group]:
+                    del self._waiting[ticket.group]
+                    if ticket.group not in self._in_flight:
+                        self._served.pop(ticket.group, None)
+                metrics.REQUESTS_QUEUED.dec()
+            self._grant()
+
+    @staticmethod
+    def waited(ticket, timeline=NULL_TIMELINE, **span_attrs):
+        """Record how long an admitted ``ticket`` queued, if it had to."""
+        duration = time.perf_counter() - ticket.queued_at
+        if duration > 0.001:
+            timeline.add("admission_wait", duration, **span_attrs)
+
+    @contextmanager
+    def admit(self, group, size=0, cancel=None, timeline=NULL_TIMELINE, **span_attrs):
+        """Hold a slot for one request from a blocking caller, waiting for it first."""
+        ticket = self.request(group, size)
+        try:
+            while not ticket.future.done():
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                concurrent.futures.wait([ticket.future], timeout=WAIT_POLL if cancel is not None else None)
+            self.waited(ticket, timeline, **span_attrs)
+            yield
+        finally:
+            self.release(ticket)
+
+    def position(self, group):
+        """How many waiting requests of other groups will be admitted before the next one from ``group``.
+
+        None when ``group`` has no request waiting. Turns are simulated
+        with the counts in flight now, as if nothing finished meanwhile.
+        """
+        with self._lock:
+            if group not in self._waiting:
+                return None
+            in_flight = dict(self._in_flight)
+            served = dict(self._served)
+            queues = {key: [ticket.order for ticket in queue] for key, queue in self._waiting.items()}
+        clock = itertools.count(max(served.values(), default=0) + 1)
+        ahead = 0
+        while True:
+            chosen = self._next({key: queue[0] for key, queue in queues.items()}, in_flight, served)
+            if chosen == group:
+                return ahead
+            ahead += 1
+            served[chosen] = next(clock)
+            in_flight[chosen] = in_flight.get(chosen, 0) + 1
+            queues[chosen].pop(0)
+            if not queues[chosen]:
+                del queues[chosen]
+
+    def status(self):
+        """``(requests in flight, bytes in flight, requests waiting)`` across the process."""
+        with self._lock:
+            return self._requests, self._bytes, sum(len(queue) for queue in self._waiting.values())
+
+
+GOVERNOR = Governor()
@@ -0,0 +1,143 @@
+import importlib.util
+import io
+import math
+
+from . import metrics
+
+DEFAULT_MAX_PIXELS = 6_000_000
+DEFAULT_TARGET_DPI = 300
+DEFAULT_QUALITY = 85
+PALETTE_COLORS = 256
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "icc_profile")
+EXIF_ORIENTATION = 0x0112
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def pillow_available():
+    """True if Pillow is installed, so images can be preprocessed."""
+    return importlib.util.find_spec("PIL") is not None
+
+
+def has_transparency(image):
+    return image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+
+
+def flatten(image, keep_bilevel=False):
+    """``image`` as an opaque "L" (when it is grey) or "RGB" image, composited onto white."""
+    from PIL import Image, ImageChops
+
+    if has_transparency(image):
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", image.size, "white")
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode == "1" and keep_bilevel:
+        return image
+    elif image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    if image.mode == "RGB":
+        red, green, blue = image.split()
+        if ImageChops.difference(red, green).getbbox() is None and ImageChops.difference(green, blue).getbbox() is None:
+            image = red
+    return image
+
+
+def encode_image(image, quality=DEFAULT_QUALITY):
+    """Smallest of PNG (for images with few colours) and JPEG as ``(data, mime_type)``."""
+    candidates = []
+    if image.mode == "1" or image.getcolors(PALETTE_COLORS) is not None:
+        png = image.quantize(PALETTE_COLORS) if image.mode == "RGB" else image
+        out = io.BytesIO()
+        png.save(out, "PNG", optimize=True)
+        candidates.append((out.getvalue(), "image/png"))
+    if image.mode != "1":
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True)
+        candidates.append((out.getvalue(), "image/jpeg"))
+    return min(candidates, key=lambda candidate: len(candidate[0]))
+
+
+class PreparedImage:
+    """Image bytes ready to upload, with what preprocessing changed."""
+
+    __slots__ = ("data", "mime_type", "original_bytes", "size", "original_size", "changes")
+
+    def __init__(self, data, mime_type, original_bytes, size=None, original_size=None, changes=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.size = size
+        self.original_size = original_size
+        self.changes = changes or []
+
+    def __repr__(self):
+        return f"PreparedImage({self.original_bytes} -> {len(self.data)} bytes, changes={self.changes!r})"
+
+    @property
+    def saved_bytes(self):
+        return self.original_bytes - len(self.data)
+
+
+class ImagePrep:
+    """Downscales, re-encodes and normalizes images before they are uploaded.
+
+    Images are turned upright from their EXIF orientation, scaled down to
+    ``target_dpi`` (when the file records its DPI) and to at most
+    ``max_pixels``, flattened onto white and saved without metadata. Images
+    with few colours (scans, line art) become PNG, or JPEG if that is
+    smaller; photos become JPEG at ``quality``. The original bytes are sent
+    when nothing needed correcting and re-encoding would not make them
+    smaller.
+    """
+
+    def __init__(self, max_pixels=DEFAULT_MAX_PIXELS, target_dpi=DEFAULT_TARGET_DPI, quality=DEFAULT_QUALITY):
+        self.max_pixels = max_pixels
+        self.target_dpi = target_dpi
+        self.quality = quality
+
+    def _scale(self, image):
+        width, height = image.size
+        scale = 1.0
+        dpi = image.info.get("dpi")
+        if self.target_dpi and dpi and max(dpi) > self.target_dpi:
+            scale = self.target_dpi / max(dpi)
+        if self.max_pixels and width * height * scale * scale > self.max_pixels:
+            scale = math.sqrt(self.max_pixels / (width * height))
+        return scale
+
+    def apply(self, data, mime_type):
+        """Return a ``PreparedImage`` for the image ``data`` of type ``mime_type``."""
+        from PIL import Image, ImageOps
+
+        changes = []
+        with Image.open(io.BytesIO(data)) as image:
+            original_size = image.size
+            scale = self._scale(image)
+            width, height = (math.ceil(side * scale) for side in original_size)
+            if scale < 1:
+                # JPEGs can decode straight to a fraction of their size
+                image.draft(image.mode, (width, height))
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            if orientation != 1:
+                changes.append("rotated upright")
+            if image.getexif() or any(key in image.info for key in METADATA_KEYS):
+                changes.append("stripped metadata")
+            image = ImageOps.exif_transpose(image)
+
+        if scale < 1:
+            size = (height, width) if orientation in ROTATED_ORIENTATIONS else (width, height)
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            changes.append(f"resized {original_size[0]}x{original_size[1]} to {size[0]}x{size[1]}")
+        if has_transparency(image):
+            changes.append("flattened transparency")
+        image = flatten(image, keep_bilevel=True)
+
+        encoded, encoded_type = encode_image(image, self.quality)
+        if not changes and len(encoded) >= len(data):
+            prepared = PreparedImage(data, mime_type, len(data), image.size, original_size)
+        else:
+            if encoded_type != mime_type:
+                changes.append(f"re-encoded as {encoded_type.split('/')[1].upper()}")
+            prepared = PreparedImage(encoded, encoded_type, len(data), image.size, original_size, changes)
+        metrics.IMAGE_BYTES.labels("original").inc(len(data))
+        metrics.IMAGE_BYTES.labels("prepared").inc(len(prepared.data))
+        return prepared
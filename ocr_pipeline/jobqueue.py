@@ -0,0 +1,333 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from . import metrics
+from .journal import DEFAULT_JOURNAL_DIR
+
+LEASE_SECONDS = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_items (
+    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    url TEXT,
+    payload_path TEXT,
+    mime_type TEXT,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    result_path TEXT,
+    page_count INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_items_status ON queue_items (status, item_id);
+CREATE INDEX IF NOT EXISTS queue_items_job ON queue_items (job_id, position);
+"""
+
+ITEM_FIELDS = (
+    "item_id", "job_id", "position", "name", "file_type", "url", "payload_path", "mime_type",
+    "options", "status", "attempts", "worker", "error", "result_path", "page_count",
+    "created_at", "updated_at",
+)
+
+
+class JobQueue:
+    """Persistent FIFO of documents waiting for OCR, stored in SQLite.
+
+    Uploaded files are spooled to ``uploads/`` and finished documents are
+    written to ``outputs/`` as JSON, so the queue survives restarts and can
+    be shared by several worker threads or processes.
+    """
+
+    def __init__(self, directory=DEFAULT_JOURNAL_DIR):
+        self.directory = directory
+        self.uploads_dir = os.path.join(directory, "uploads")
+        self.outputs_dir = os.path.join(directory, "outputs")
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "queue.sqlite"),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(queue_items)")}
+        if "lease_until" not in columns:
+            try:
+                self._conn.execute("ALTER TABLE queue_items ADD COLUMN lease_until REAL")
+            except sqlite3.OperationalError:
+                # Another process added it first
+                pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _item(row):
+        item = dict(zip(ITEM_FIELDS, row))
+        item["options"] = json.loads(item["options"])
+        return item
+
+    def submit(self, documents, options=None, job_id=None, order=None):
+        """Queue a job and return its id.
+
+        Each entry of ``documents`` is a dict with ``name``, ``file_type``
+        ("PDF" or "Image") and either ``url`` or ``data`` (bytes) plus an
+        optional ``mime_type``. Workers claim them in the order of the
+        indices in ``order`` (by default as given); results keep the
+        position of the document in ``documents``.
+        """
+        job_id = job_id or uuid.uuid4().hex[:12]
+        options = json.dumps(options or {}, sort_keys=True)
+        now = time.time()
+        job_dir = os.path.join(self.uploads_dir, job_id)
+        for position in order if order is not None else range(len(documents)):
+            entry = documents[position]
+            payload_path = None
+            if entry.get("data") is not None:
+                os.makedirs(job_dir, exist_ok=True)
+                payload_path = os.path.join(job_dir, f"{position:05d}")
+                with open(payload_path, "wb") as f:
+                    f.write(entry["data"])
+            self._execute(
+                "INSERT INTO queue_items (job_id, position, name, file_type, url, payload_path, mime_type,"
+                " options, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, position, entry["name"], entry.get("file_type", "PDF"), entry.get("url"),
+                 payload_path, entry.get("mime_type"), options, now, now)
+            )
+        return job_id
+
+    def claim(self, worker, lease=LEASE_SECONDS):
+        """Atomically move the oldest queued item to ``running`` and return it.
+
+        ``worker`` is the owner's name, ``host:pid:thread`` for the worker
+        pools; it holds the item for ``lease`` seconds unless ``renew``
+        extends it.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(ITEM_FIELDS)} FROM queue_items WHERE status = 'queued'"
+                    " ORDER BY item_id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE queue_items SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1,"
+                    " updated_at = ? WHERE item_id = ?",
+                    (worker, now + lease, now, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        item = self._item(row)
+        item["status"] = "running"
+        item["worker"] = worker
+        return item
+
+    def renew(self, workers, lease=LEASE_SECONDS):
+        """Extend the lease on every item ``workers`` are processing by ``lease`` seconds."""
+        workers = list(workers)
+        if not workers:
+            return
+        self._execute(
+            f"UPDATE queue_items SET lease_until = ? WHERE status IN ('running', 'cancelling')"
+            f" AND worker IN ({', '.join('?' * len(workers))})",
+            (time.time() + lease, *workers)
+        )
+
+    def _owns(self, item):
+        rows = self._execute("SELECT worker FROM queue_items WHERE item_id = ?", (item["item_id"],))
+        return bool(rows) and rows[0][0] == item["worker"]
+
+    def complete(self, item, doc):
+        """Store a finished document and mark its queue item done or failed.
+
+        Nothing is written if the item was requeued and claimed by another
+        worker in the meantime.
+        """
+        if not self._owns(item):
+            return
+        job_dir = os.path.join(self.outputs_dir, item["job_id"])
+        os.makedirs(job_dir, exist_ok=True)
+        result_path = os.path.join(job_dir, f"{item['position']:05d}.json")
+        with open(result_path, "w", encoding="utf-8") as f:
+            result = doc.to_dict()
+            result["page_count"] = doc.page_count
+            result["cleaned"] = doc.cleaned
+            json.dump(result, f, ensure_ascii=False)
+        status = "failed" if doc.errors else "done"
+        self._execute(
+            "UPDATE queue_items SET status = CASE status WHEN 'cancelling' THEN 'cancelled' ELSE ? END,"
+            " result_path = ?, page_count = ?, error = ?, updated_at = ? WHERE item_id = ? AND worker = ?",
+            (status, result_path, doc.page_count, "; ".join(doc.errors) or None, time.time(), item["item_id"],
+             item["worker"])
+        )
+        if item.get("payload_path") and os.path.exists(item["payload_path"]):
+            os.remove(item["payload_path"])
+
+    def fail(self, item, error):
+        self._execute(
+            "UPDATE queue_items SET status = CASE status WHEN 'cancelling' THEN 'cancelled' ELSE 'failed' END,"
+            " error = ?, updated_at = ? WHERE item_id = ? AND worker = ?",
+            (str(error), time.time(), item["item_id"], item["worker"])
+        )
+
+    def cancel(self, job_id):
+        """Cancel a job: queued items are dropped, running ones are asked to stop.
+
+        Workers notice a ``cancelling`` item between chunks, keep the pages
+        they have and store them with status ``cancelled``. Returns the
+        number of items affected.
+        """
+        now = time.time()
+        with self._lock:
+            payloads = self._conn.execute(
+                "SELECT payload_path FROM queue_items WHERE job_id = ? AND status = 'queued'", (job_id,)
+            ).fetchall()
+            dropped = self._conn.execute(
+                "UPDATE queue_items SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (now, job_id)
+            ).rowcount
+            stopping = self._conn.execute(
+                "UPDATE queue_items SET status = 'cancelling', updated_at = ? WHERE job_id = ? AND status = 'running'",
+                (now, job_id)
+            ).rowcount
+        for (payload_path,) in payloads:
+            if payload_path and os.path.exists(payload_path):
+                os.remove(payload_path)
+        return dropped + stopping
+
+    def is_cancelled(self, item_id):
+        rows = self._execute("SELECT status FROM queue_items WHERE item_id = ?", (item_id,))
+        return bool(rows) and rows[0][0] in ("cancelling", "cancelled")
+
+    def requeue_stale(self):
+        """Return items whose worker is gone to the queue; returns how many.
+
+        An item is abandoned once its lease has expired, or as soon as its
+        owner is a process on this host that is no longer running. Items a
+        live worker is processing, in this process or any other sharing the
+        queue, are left alone. Abandoned ``cancelling`` items become
+        ``cancelled``.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_id, status, worker, lease_until FROM queue_items WHERE status IN ('running', 'cancelling')"
+            ).fetchall()
+        stale = [row for row in rows if row[3] is None or row[3] < now or not _owner_alive(row[2])]
+        requeued = 0
+        with self._lock:
+            # Each row is only changed if it still has the owner and lease it was judged stale by
+            for item_id, status, worker, lease_until in stale:
+                match = (item_id, status, worker, lease_until)
+                if status == "cancelling":
+                    self._conn.execute(
+                        "UPDATE queue_items SET status = 'cancelled', updated_at = ?"
+                        " WHERE item_id = ? AND status = ? AND worker IS ? AND lease_until IS ?",
+                        (now, *match)
+                    )
+                else:
+                    requeued += self._conn.execute(
+                        "UPDATE queue_items SET status = 'queued', worker = NULL, lease_until = NULL, updated_at = ?"
+                        " WHERE item_id = ? AND status = ? AND worker IS ? AND lease_until IS ?",
+                        (now, *match)
+                    ).rowcount
+        metrics.RETRIES.labels("requeue").inc(requeued)
+        return requeued
+
+    def depth(self):
+        """Number of items waiting to be claimed."""
+        return self._execute("SELECT COUNT(*) FROM queue_items WHERE status = 'queued'")[0][0]
+
+    def items(self, job_id):
+        rows = self._execute(
+            f"SELECT {', '.join(ITEM_FIELDS)} FROM queue_items WHERE job_id = ? ORDER BY position",
+            (job_id,)
+        )
+        return [self._item(row) for row in rows]
+
+    def job_status(self, job_id):
+        """Summarize a job, or return None if it is unknown."""
+        items = self.items(job_id)
+        if not items:
+            return None
+        counts = {}
+        for item in items:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        if counts.get("cancelling"):
+            status = "cancelling"
+        elif counts.get("queued", 0) + counts.get("running", 0):
+            status = "running" if counts.get("running") or counts.get("done") or counts.get("failed") else "queued"
+        elif counts.get("cancelled"):
+            status = "cancelled"
+        else:
+            status = "failed" if counts.get("failed") else "done"
+        return {
+            "job_id": job_id,
+            "status": status,
+            "counts": counts,
+            "documents": [
+                {
+                    "index": item["position"],
+                    "name": item["name"],
+                    "file_type": item["file_type"],
+                    "status": item["status"],
+                    "page_count": item["page_count"],
+                    "error": item["error"],
+                }
+                for item in items
+            ],
+        }
+
+    def load_result(self, job_id, position):
+        """Return the stored result dict for one document of a job, or None."""
+        rows = self._execute(
+            "SELECT result_path FROM queue_items WHERE job_id = ? AND position = ?",
+            (job_id, position)
+        )
+        if not rows or not rows[0][0]:
+            return None
+        with open(rows[0][0], encoding="utf-8") as f:
+            return json.load(f)
+
+
+def _owner_alive(worker):
+    """False if ``worker`` (``host:pid:thread``) names a process on this host that has exited."""
+    host, _, rest = (worker or "").partition(":")
+    pid = rest.split(":")[0]
+    if host != socket.gethostname() or not pid.isdigit() or os.name == "nt":
+        # Other hosts, and Windows (where os.kill would terminate the process), rely on the lease
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
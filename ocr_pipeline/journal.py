@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_JOURNAL_DIR = os.environ.get("OCR_JOURNAL_DIR", ".ocr_jobs")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    options TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    job_id TEXT NOT NULL,
+    doc_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    source TEXT,
+    status TEXT NOT NULL,
+    page_count INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, doc_key)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    doc_key TEXT NOT NULL,
+    first_page INTEGER NOT NULL,
+    page_count INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    result_path TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (doc_key, first_page, page_count)
+);
+"""
+
+
+def document_key(data, **options):
+    """Content hash identifying a document and the options that affect its OCR output."""
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def source_key(data, url=False):
+    """``document_key`` for a file's bytes, or for a URL sent to the API as it is when ``url``.
+
+    The app, the CLI and the workers all key checkpoints with it, so a
+    document started in one of them resumes in any other.
+    """
+    from .pipeline import OCR_MODEL
+
+    return document_key(data, model=OCR_MODEL, source_type="URL" if url else "Local Upload")
+
+
+class JobJournal:
+    """Durable SQLite record of jobs, documents and completed chunks.
+
+    Chunk results are keyed by document content hash and page range rather
+    than by job, so resubmitting the same file after a crash or a lost
+    session reuses every chunk that already finished. Page text is written
+    to JSON files under ``results/`` and the database keeps their location.
+    """
+
+    def __init__(self, directory=DEFAULT_JOURNAL_DIR):
+        self.directory = directory
+        self.results_dir = os.path.join(directory, "results")
+        os.makedirs(self.results_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "journal.sqlite"),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # Jobs
+
+    def create_job(self, options=None, job_id=None):
+        """Create a job, or reopen ``job_id`` if it already exists."""
+        job_id = job_id or uuid.uuid4().hex[:12]
+        now = time.time()
+        self._execute(
+            "INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, 'running', ?)",
+            (job_id, now, now, json.dumps(options or {}, sort_keys=True))
+        )
+        self._execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE job_id = ?", (now, job_id))
+        return job_id
+
+    def finish_job(self, job_id, status="done"):
+        self._execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, time.time(), job_id))
+
+    def get_job(self, job_id):
+        rows = self._execute("SELECT job_id, created_at, updated_at, status, options FROM jobs WHERE job_id = ?", (job_id,))
+        if not rows:
+            return None
+        job_id, created_at, updated_at, status, options = rows[0]
+        return {
+            "job_id": job_id,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "status": status,
+            "options": json.loads(options),
+            "documents": self.job_documents(job_id),
+        }
+
+    def list_jobs(self, status=None, limit=20):
+        if status:
+            rows = self._execute(
+                "SELECT job_id FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?", (status, limit)
+            )
+        else:
+            rows = self._execute("SELECT job_id FROM jobs ORDER BY updated_at DESC LIMIT ?", (limit,))
+        return [self.get_job(row[0]) for row in rows]
+
+    # Documents
+
+    def start_document(self, job_id, doc_key, name, source=None):
+        self._execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, 'running', NULL, ?)",
+            (job_id, doc_key, name, source, time.time())
+        )
+
+    def finish_document(self, job_id, doc_key, page_count, status="done"):
+        self._execute(
+            "UPDATE documents SET status = ?, page_count = ?, updated_at = ? WHERE job_id = ? AND doc_key = ?",
+            (status, page_count, time.time(), job_id, doc_key)
+        )
+
+    def job_documents(self, job_id):
+        rows = self._execute(
+            "SELECT doc_key, name, source, status, page_count FROM documents WHERE job_id = ? ORDER BY updated_at",
+            (job_id,)
+        )
+        return [
+            {"doc_key": k, "name": n, "source": s, "status": st, "page_count": p, "chunks_done": self.chunks_done(k)}
+            for k, n, s, st, p in rows
+        ]
+
+    # Chunks
+
+    def chunks_done(self, doc_key):
+        rows = self._execute("SELECT COUNT(*) FROM chunks WHERE doc_key = ? AND status = 'done'", (doc_key,))
+        return rows[0][0]
+
+    def load_chunk(self, doc_key, first_page, page_count):
+        """Return the stored page texts for a finished chunk, or None."""
+        rows = self._execute(
+            "SELECT result_path FROM chunks WHERE doc_key = ? AND first_page = ? AND page_count = ? AND status = 'done'",
+            (doc_key, first_page, page_count)
+        )
+        if not rows:
+            return None
+        try:
+            with open(rows[0][0], encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_chunk(self, doc_key, first_page, page_count, pages):
+        doc_dir = os.path.join(self.results_dir, doc_key[:2], doc_key)
+        os.makedirs(doc_dir, exist_ok=True)
+        path = os.path.join(doc_dir, f"{first_page:06d}-{page_count:06d}.json")
+        # Unique per writer: worker processes and threads can save the same chunk at once
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(pages), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._execute(
+            "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, 'done', ?, NULL, ?)",
+            (doc_key, first_page, page_count, path, time.time())
+        )
+
+    def fail_chunk(self, doc_key, first_page, page_count, error):
+        self._execute(
+            "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, 'failed', NULL, ?, ?)",
+            (doc_key, first_page, page_count, str(error), time.time())
+        )
+
+    def checkpoint(self, job_id, doc_key, name, source=None):
+        """Start tracking a document within ``job_id`` and return its checkpoint."""
+        self.start_document(job_id, doc_key, name, source)
+        return DocumentCheckpoint(self, job_id, doc_key)
+
+
+class DocumentCheckpoint:
+    """Chunk-level checkpoint handle passed into the pipeline for one document."""
+
+    def __init__(self, journal, job_id, doc_key):
+        self.journal = journal
+        self.job_id = job_id
+        self.doc_key = doc_key
+        self.resumed = 0
+
+    def get(self, first_page, page_count):
+        pages = self.journal.load_chunk(self.doc_key, first_page, page_count)
+        if pages is not None:
+            self.resumed += 1
+        return pages
+
+    def put(self, first_page, page_count, pages):
+        self.journal.save_chunk(self.doc_key, first_page, page_count, pages)
+
+    def fail(self, first_page, page_count, error):
+        self.journal.fail_chunk(self.doc_key, first_page, page_count, error)
+
+    def finish(self, doc):
+        status = "failed" if doc.errors else "done"
+        self.journal.finish_document(self.job_id, self.doc_key, doc.page_count, status)
@@ -0,0 +1,283 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(v) for v in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        return self.labels(*([""] * len(self.labelnames))) if self.labelnames else self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class _CallbackValue(_Value):
+    def __init__(self, function):
+        super().__init__()
+        self.function = function
+
+    def samples(self, name, labelnames, values):
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[n] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labelnames, values, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {count}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        """Report ``function()`` at scrape time instead of a stored value."""
+        with self._lock:
+            self._children[()] = _CallbackValue(function)
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    """Process-wide collection of metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("ocr_requests_in_flight", "OCR API requests currently in flight.")
+REQUESTS_QUEUED = REGISTRY.gauge("ocr_requests_queued", "OCR API requests waiting for admission under the process-wide caps.")
+REQUEST_SECONDS = REGISTRY.histogram("ocr_request_duration_seconds", "OCR API request latency.", ("outcome",))
+RESPONSES = REGISTRY.counter("ocr_responses_total", "OCR API responses by HTTP status class.", ("status_class",))
+UPLOAD_BYTES = REGISTRY.counter("ocr_upload_bytes_total", "Document payload bytes sent to the OCR API.")
+DOWNLOAD_BYTES = REGISTRY.counter("ocr_download_bytes_total", "Markdown and image bytes received from the OCR API.")
+RETRIES = REGISTRY.counter("ocr_retries_total", "Requests or queue items retried after a failure.", ("reason",))
+CACHE_LOOKUPS = REGISTRY.counter("ocr_cache_lookups_total", "Result cache lookups by outcome.", ("cache", "result"))
+QUEUE_DEPTH = REGISTRY.gauge("ocr_queue_depth", "Items waiting in the local job queue.")
+DOCUMENTS = REGISTRY.counter("ocr_documents_total", "Documents processed, by outcome.", ("outcome",))
+PAGES = REGISTRY.counter("ocr_pages_total", "Pages extracted.")
+PAGES_SKIPPED = REGISTRY.counter("ocr_pages_skipped_total", "Pages not sent because they were blank or repeated an earlier page.", ("reason",))
+CLEANUP_SECONDS = REGISTRY.histogram("ocr_cleanup_duration_seconds", "Time spent in clean_ocr_text.")
+EXPORT_SECONDS = REGISTRY.histogram("ocr_export_duration_seconds", "Time spent exporting results.", ("format",))
+IMAGE_BYTES = REGISTRY.counter("ocr_image_bytes_total", "Image bytes before and after local preprocessing.", ("stage",))
+
+
+def status_code(error):
+    """HTTP status of an exception from the OCR client, or None if it has none."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "raw_response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def status_class(error):
+    """Map an exception from the OCR client to a status class label."""
+    status = status_code(error)
+    if status is not None:
+        return f"{status // 100}xx"
+    return "error"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve ``/metrics`` on a daemon thread; later calls return the same server.
+
+    The port defaults to ``$OCR_METRICS_PORT``; nothing is started when
+    neither is set.
+    """
+    global _server
+    port = port or int(os.environ.get("OCR_METRICS_PORT") or 0)
+    with _server_lock:
+        if _server is None and port:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="ocr-metrics", daemon=True).start()
+    return _server
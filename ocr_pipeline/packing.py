@@ -0,0 +1,192 @@
+import io
+import math
+import struct
+
+DEFAULT_BUNDLE_PAGES = 20
+DEFAULT_BUNDLE_BYTES = 8 * 1024 * 1024
+SMALL_IMAGE_BYTES = 1024 * 1024
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+TIFF_SIGNATURES = (b"II*\x00", b"MM\x00*")
+PREVIEW_SIZE = (1600, 1600)
+ROTATED_JPEG_QUALITY = 95
+
+
+def _png_chunks(data, kind):
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk = struct.unpack(">I4s", data[pos:pos + 8])
+        if chunk == kind:
+            yield data[pos + 8:pos + 8 + length]
+        pos += length + 12
+
+
+def _png_passthrough(data):
+    """Colour space and bit depth for embedding a PNG's pixel data as is, or None.
+
+    Non-interlaced grey, palette and 8-bit RGB PNGs without transparency
+    qualify.
+    """
+    if not data.startswith(PNG_SIGNATURE) or b"tRNS" in data[:data.find(b"IDAT")]:
+        return None
+    depth, color_type, interlace = data[24], data[25], data[28]
+    if interlace != 0:
+        return None
+    if color_type == 0 and depth in (1, 2, 4, 8):
+        return "/DeviceGray", 1, depth
+    if color_type == 2 and depth == 8:
+        return "/DeviceRGB", 3, depth
+    if color_type == 3 and depth in (1, 2, 4, 8):
+        palette = b"".join(_png_chunks(data, b"PLTE"))
+        return f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]", 1, depth
+    return None
+
+
+def _image_xobject(data):
+    """PDF image dictionary and stream for ``data``, with its size in pixels.
+
+    JPEGs are embedded as they are, and so is the compressed pixel data of
+    most PNGs, decoded by the PDF's PNG predictor. Anything else is
+    flattened and re-encoded losslessly. A PDF ignores EXIF, so an image
+    with an EXIF orientation is turned upright first and re-encoded (JPEGs
+    at ``ROTATED_JPEG_QUALITY``).
+    """
+    from PIL import Image, ImageOps
+
+    from .imaging import EXIF_ORIENTATION, flatten
+
+    with Image.open(io.BytesIO(data)) as image:
+        source_format = image.format
+        upright = image.getexif().get(EXIF_ORIENTATION, 1) == 1
+        if not upright:
+            image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        if source_format == "JPEG" and image.mode in ("L", "RGB"):
+            if not upright:
+                out = io.BytesIO()
+                image.save(out, "JPEG", quality=ROTATED_JPEG_QUALITY)
+                data = out.getvalue()
+            colorspace = "/DeviceGray" if image.mode == "L" else "/DeviceRGB"
+            header = f"/Width {width} /Height {height} /ColorSpace {colorspace} /BitsPerComponent 8 /Filter /DCTDecode"
+            return header, data, width, height
+        embed = _png_passthrough(data) if source_format == "PNG" and upright else None
+        if embed is None:
+            out = io.BytesIO()
+            flatten(image).save(out, "PNG", compress_level=6)
+            data = out.getvalue()
+            embed = _png_passthrough(data)
+    colorspace, colors, depth = embed
+    header = (
+        f"/Width {width} /Height {height} /ColorSpace {colorspace} /BitsPerComponent {depth} /Filter /FlateDecode"
+        f" /DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent {depth} /Columns {width} >>"
+    )
+    return header, b"".join(_png_chunks(data, b"IDAT")), width, height
+
+
+def images_to_pdf(images):
+    """A PDF with one page per image in ``images``, each page sized one point per pixel."""
+    objects = [None, None]
+    kids = []
+    for data in images:
+        header, stream, width, height = _image_xobject(data)
+        objects.append(f"<< /Type /XObject /Subtype /Image {header} /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        image_id = len(objects)
+        content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode()
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}]"
+            f" /Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {image_id + 1} 0 R >>"
+        ).encode())
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def plan_bundles(sizes, max_pages=DEFAULT_BUNDLE_PAGES, max_bytes=DEFAULT_BUNDLE_BYTES, small_bytes=SMALL_IMAGE_BYTES):
+    """Group image indices into bundles of at most ``max_pages`` images and ``max_bytes`` bytes.
+
+    Images larger than ``small_bytes`` get a group of their own. Groups
+    are returned in order of their first image.
+    """
+    groups = []
+    current, current_bytes = [], 0
+    for index, size in enumerate(sizes):
+        if size > small_bytes:
+            groups.append([index])
+            continue
+        if current and (len(current) >= max_pages or current_bytes + size > max_bytes):
+            groups.append(current)
+            current, current_bytes = [], 0
+        current.append(index)
+        current_bytes += size
+    if current:
+        groups.append(current)
+    return sorted(groups)
+
+
+def is_tiff(data):
+    """True if ``data`` is a TIFF, which may hold many pages and is sent as PDF chunks."""
+    return data[:4] in TIFF_SIGNATURES
+
+
+class FrameChunks:
+    """The frames of a multi-page image (a TIFF) as PDFs of ``chunk_size`` pages, built on access.
+
+    ``chunks[i]`` decodes and encodes only chunk ``i``'s frames, one at a
+    time, so chunks that are checkpointed are never decoded and only the
+    chunks being requested are held in memory. It can be used in place of
+    the list of PDF chunks returned by ``pipeline.split_pdf``.
+    """
+
+    def __init__(self, data, chunk_size=100):
+        from PIL import Image
+
+        self._image = Image.open(io.BytesIO(data))
+        self.frame_count = getattr(self._image, "n_frames", 1)
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return math.ceil(self.frame_count / self.chunk_size)
+
+    def _frame(self, number):
+        from .imaging import flatten
+
+        self._image.seek(number)
+        return flatten(self._image.copy(), keep_bilevel=True)
+
+    def __getitem__(self, index):
+        from .imaging import encode_image
+
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        first = index * self.chunk_size
+        last = min(first + self.chunk_size, self.frame_count)
+        return images_to_pdf(encode_image(self._frame(number))[0] for number in range(first, last))
+
+    def preview(self):
+        """The first frame as a PNG no larger than ``PREVIEW_SIZE``, for display."""
+        frame = self._frame(0)
+        frame.thumbnail(PREVIEW_SIZE)
+        out = io.BytesIO()
+        frame.save(out, "PNG")
+        return out.getvalue()
+
+    def close(self):
+        self._image.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
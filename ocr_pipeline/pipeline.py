@@ -0,0 +1,930 @@
+import base64
+import io
+import logging
+import time
+from collections import deque
+
+from . import metrics
+from .cancellation import Cancelled
+from .document import DocumentBuilder
+from .governor import GOVERNOR
+from .singleflight import IN_FLIGHT, request_key
+from .timing import NULL_TIMELINE
+
+logger = logging.getLogger(__name__)
+
+OCR_MODEL = "mistral-ocr-latest"
+REQUEST_PAUSE = 0.5
+PARTIAL_NOTE = "Partial result"
+BISECT_MAX_REQUESTS = 32
+# Failures that say nothing about the pages sent, so smaller requests would fail the same way
+UNSPLITTABLE_STATUSES = (401, 403, 429)
+
+
+class TextPage:
+    """Stands in for a response page whose markdown was put together locally."""
+
+    __slots__ = ("markdown",)
+
+    def __init__(self, markdown):
+        self.markdown = markdown
+
+
+def _write_pages(pdf_reader, page_numbers):
+    import PyPDF2
+
+    pdf_writer = PyPDF2.PdfWriter()
+    for page_num in page_numbers:
+        pdf_writer.add_page(pdf_reader.pages[page_num])
+    output = io.BytesIO()
+    pdf_writer.write(output)
+    return output.getvalue()
+
+
+def split_pdf(pdf_bytes, chunk_size=100):
+    """Split large PDFs into smaller chunks for processing."""
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    total_pages = len(pdf_reader.pages)
+
+    if total_pages <= chunk_size:
+        return [pdf_bytes], total_pages
+
+    chunks = [
+        _write_pages(pdf_reader, range(i, min(i + chunk_size, total_pages)))
+        for i in range(0, total_pages, chunk_size)
+    ]
+    return chunks, total_pages
+
+
+def estimate_pages(data):
+    """Page count of a PDF or TIFF (1 for other images), read from its structure; None if it can't be read."""
+    try:
+        if data[:5] == b"%PDF-":
+            import PyPDF2
+
+            return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+        from .packing import is_tiff
+
+        if is_tiff(data):
+            from PIL import Image
+
+            with Image.open(io.BytesIO(data)) as image:
+                return getattr(image, "n_frames", 1)
+    except Exception:
+        return None
+    return 1
+
+
+def shortest_first(documents):
+    """Indices of ``documents`` ordered from the least OCR work to the most.
+
+    Each entry is the document's bytes, or None for a URL, whose size is
+    not known before it is fetched. Documents are ranked by page count,
+    then by size; URLs go last, and ties keep their order.
+    """
+    def cost(index):
+        data = documents[index]
+        if data is None:
+            return 1, 0, 0
+        pages = estimate_pages(data)
+        return 0, pages if pages is not None else float("inf"), len(data)
+
+    return sorted(range(len(documents)), key=cost)
+
+
+def split_pdf_skipping(pdf_bytes, chunk_size=100, name=None, timeline=NULL_TIMELINE):
+    """Like ``split_pdf``, but leaving out blank and repeated pages; returns ``(chunks, total_pages, plan)``.
+
+    Pages are fingerprinted first (see ``fingerprint.plan_pdf_pages``).
+    Chunks still cover ``chunk_size`` pages each, but hold only the pages
+    ``plan`` sends, and are None when there are none.
+    """
+    import PyPDF2
+
+    from .fingerprint import plan_pdf_pages
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    total_pages = len(pdf_reader.pages)
+    start = time.perf_counter()
+    plan = plan_pdf_pages(pdf_reader.pages)
+    duration = time.perf_counter() - start
+
+    if total_pages <= chunk_size and not plan.skipped:
+        chunks = [pdf_bytes]
+    else:
+        chunks = []
+        for i in range(0, total_pages, chunk_size):
+            sent = plan.sent(i, min(chunk_size, total_pages - i))
+            chunks.append(_write_pages(pdf_reader, sent) if sent else None)
+    _record_plan(plan, name, duration, sum(chunk is None for chunk in chunks), timeline)
+    return chunks, total_pages, plan
+
+
+def _record_plan(plan, name, duration, requests_saved, timeline=NULL_TIMELINE):
+    metrics.PAGES_SKIPPED.labels("blank").inc(plan.blank)
+    metrics.PAGES_SKIPPED.labels("duplicate").inc(plan.duplicates)
+    timeline.add("fingerprint_pages", duration, document=name, pages=len(plan), blank=plan.blank,
+                 duplicates=plan.duplicates, requests_saved=requests_saved)
+    if plan.skipped:
+        logger.info("%s: skipping %d blank and %d duplicate page(s) of %d, %d request(s) saved",
+                    name, plan.blank, plan.duplicates, len(plan), requests_saved)
+
+
+def data_uri(data, mime_type):
+    """Inline bytes as a base64 data URI."""
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def extract_pages(ocr_response):
+    """Return the page list from an OCR response."""
+    if hasattr(ocr_response, "pages"):
+        return ocr_response.pages
+    if isinstance(ocr_response, list):
+        return ocr_response
+    return []
+
+
+def response_bytes(pages):
+    """Approximate size of the markdown and inline images in a response."""
+    total = 0
+    for page in pages:
+        total += len(getattr(page, "markdown", "") or "")
+        for image in getattr(page, "images", None) or []:
+            total += len(getattr(image, "image_base64", None) or "")
+    return total
+
+
+def ocr_request(client, payload, include_image_base64=True, timeline=NULL_TIMELINE, dispatcher=None,
+                cancel=None, **span_attrs):
+    """Send one document payload to the OCR endpoint and return its pages.
+
+    With a ``dispatch.Dispatcher`` the request runs on its event loop, with
+    its timeout and concurrency limit, instead of on the calling thread.
+    Nothing is sent once ``cancel`` (a ``cancellation.CancelToken``) trips.
+    An identical request already in flight in this process is waited for
+    instead of sent again (see ``singleflight.InFlightRequests``).
+    """
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+    if dispatcher is not None:
+        return dispatcher.request(client, payload, include_image_base64, timeline=timeline, cancel=cancel, **span_attrs)
+    return IN_FLIGHT.run(
+        request_key(OCR_MODEL, payload, include_image_base64),
+        lambda: _send(client, payload, include_image_base64, timeline, cancel, **span_attrs),
+        cancel, timeline, **span_attrs
+    )
+
+
+def _send(client, payload, include_image_base64, timeline=NULL_TIMELINE, cancel=None, **span_attrs):
+    source = payload.get("document_url") or payload.get("image_url") or ""
+    with GOVERNOR.admit(cancel, len(source), cancel, timeline, **span_attrs):
+        metrics.UPLOAD_BYTES.inc(len(source) if source.startswith("data:") else 0)
+        start = time.perf_counter()
+        try:
+            with timeline.span("ocr_request", **span_attrs), metrics.REQUESTS_IN_FLIGHT.track_inprogress():
+                ocr_response = client.ocr.process(
+                    model=OCR_MODEL,
+                    document=payload,
+                    include_image_base64=include_image_base64
+                )
+        except Exception as e:
+            metrics.REQUEST_SECONDS.labels("error").observe(time.perf_counter() - start)
+            metrics.RESPONSES.labels(metrics.status_class(e)).inc()
+            raise
+    metrics.REQUEST_SECONDS.labels("ok").observe(time.perf_counter() - start)
+    metrics.RESPONSES.labels("2xx").inc()
+    pages = extract_pages(ocr_response)
+    metrics.DOWNLOAD_BYTES.inc(response_bytes(pages))
+    with timeline.span("pause", **span_attrs):
+        time.sleep(REQUEST_PAUSE)
+    return pages
+
+
+def _load_checkpoint(checkpoint, first_page, page_count, timeline, **span_attrs):
+    if checkpoint is None:
+        return None
+    with timeline.span("checkpoint_load", **span_attrs):
+        pages = checkpoint.get(first_page, page_count)
+    metrics.CACHE_LOOKUPS.labels("checkpoint", "miss" if pages is None else "hit").inc()
+    return pages
+
+
+def _chunk_result(get_pages, first_page, page_count, checkpoint, timeline, plan=None, **span_attrs):
+    """The markdown of a chunk's pages from ``get_pages``, checkpointed if complete.
+
+    A chunk with copies of pages that were not extracted (see
+    ``fingerprint.PagePlan.failed_copies``) is not checkpointed, so a
+    rerun fills them in.
+    """
+    try:
+        pages = [page.markdown for page in get_pages()]
+    except Cancelled:
+        raise
+    except Exception as e:
+        if checkpoint is not None:
+            checkpoint.fail(first_page, page_count, e)
+        raise
+    if checkpoint is not None and (plan is None or not plan.failed_copies(first_page, page_count)):
+        with timeline.span("checkpoint_save", **span_attrs):
+            checkpoint.put(first_page, page_count, pages)
+    return pages
+
+
+def ocr_chunk(client, payload, first_page, page_count, checkpoint=None, timeline=NULL_TIMELINE,
+              dispatcher=None, cancel=None, **span_attrs):
+    """OCR one chunk, reusing a checkpointed result when there is one."""
+    pages = _load_checkpoint(checkpoint, first_page, page_count, timeline, **span_attrs)
+    if pages is not None:
+        return pages
+    return _chunk_result(
+        lambda: ocr_request(client, payload, timeline=timeline, dispatcher=dispatcher, cancel=cancel, **span_attrs),
+        first_page, page_count, checkpoint, timeline, **span_attrs
+    )
+
+
+def _finish(builder, name, checkpoint, timeline=NULL_TIMELINE, **doc_kwargs):
+    with timeline.span("assemble", document=name):
+        doc = builder.build(name, **doc_kwargs)
+    metrics.DOCUMENTS.labels("failed" if doc.errors else "done").inc()
+    metrics.PAGES.inc(doc.page_count)
+    if checkpoint is not None:
+        checkpoint.finish(doc)
+    return doc
+
+
+def _publish(on_partial, builder, name, done, total, **doc_kwargs):
+    """Hand ``on_partial`` the document as it stands after ``done`` of ``total`` chunks."""
+    if on_partial is None or done >= total:
+        return
+    note = f"{PARTIAL_NOTE}: {done} of {total} chunks"
+    on_partial(builder.build(name, errors=builder.errors + [note], **doc_kwargs), done, total)
+
+
+def _cancelled_note(done, total):
+    return f"Cancelled after {done} of {total} chunk{'s' if total != 1 else ''}"
+
+
+def _chunk_bytes(pdf_chunks, index, timeline, **span_attrs):
+    """PDF of chunk ``index``; a ``packing.FrameChunks`` chunk is rendered here."""
+    if isinstance(pdf_chunks, list):
+        return pdf_chunks[index]
+    with timeline.span("render_frames", **span_attrs):
+        return pdf_chunks[index]
+
+
+def _chunk_document(pdf_chunks, index, timeline, **span_attrs):
+    """Request payload for chunk ``index``."""
+    chunk = _chunk_bytes(pdf_chunks, index, timeline, **span_attrs)
+    with timeline.span("encode", bytes=len(chunk), **span_attrs):
+        return {"type": "document_url", "document_url": data_uri(chunk, "application/pdf")}
+
+
+def _splittable(error):
+    return not isinstance(error, Cancelled) and metrics.status_code(error) not in UNSPLITTABLE_STATUSES
+
+
+def _bisect_chunk(client, chunk_pdf, page_numbers, error, timeline=NULL_TIMELINE, dispatcher=None, cancel=None,
+                  **span_attrs):
+    """Recover what can be read of a failed chunk by requesting it again in halves.
+
+    ``chunk_pdf`` is the PDF that failed with ``error``, holding pages
+    ``page_numbers`` of the document. A half that fails is split again,
+    down to single pages, until ``BISECT_MAX_REQUESTS`` requests have been
+    sent; with a ``dispatcher`` both halves are in flight at once. Returns
+    the markdown of each page, "" for the pages that could not be
+    extracted, and ``{page number: error}`` for those pages.
+    """
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(io.BytesIO(chunk_pdf))
+    markdown = [""] * len(page_numbers)
+    failed = {}
+    budget = BISECT_MAX_REQUESTS
+
+    def document(part, attrs):
+        pdf_bytes = _write_pages(reader, part)
+        with timeline.span("encode", bytes=len(pdf_bytes), **attrs):
+            return {"type": "document_url", "document_url": data_uri(pdf_bytes, "application/pdf")}
+
+    def split(part, error):
+        nonlocal budget
+        if len(part) == 1 or budget < 2 or not _splittable(error):
+            failed.update((page_numbers[index], error) for index in part)
+            return
+        budget -= 2
+        halves = [part[:len(part) // 2], part[len(part) // 2:]]
+        metrics.RETRIES.labels("bisect").inc(len(halves))
+        attrs = [dict(span_attrs, pages=len(half), first_page=page_numbers[half[0]]) for half in halves]
+        futures = None
+        if dispatcher is not None:
+            futures = [dispatcher.submit(client, document(half, attrs[n]), timeline=timeline, cancel=cancel, **attrs[n])
+                       for n, half in enumerate(halves)]
+        try:
+            for n, half in enumerate(halves):
+                try:
+                    if futures is not None:
+                        pages = dispatcher.result(futures[n], cancel)
+                    else:
+                        pages = ocr_request(client, document(half, attrs[n]), timeline=timeline, cancel=cancel, **attrs[n])
+                    if len(pages) != len(half):
+                        raise ValueError(f"expected {len(half)} pages, got {len(pages)}")
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    split(half, e)
+                    continue
+                for index, page in zip(half, pages):
+                    markdown[index] = page.markdown
+        finally:
+            for future in futures or []:
+                future.cancel()
+
+    split(list(range(len(page_numbers))), error)
+    return markdown, failed
+
+
+def _page_ranges(failed):
+    """``(label, error)`` for each run of consecutive page numbers in ``failed`` with the same error."""
+    runs = []
+    for number in sorted(failed):
+        if runs and number == runs[-1][1] + 1 and str(failed[number]) == str(runs[-1][2]):
+            runs[-1][1] = number
+        else:
+            runs.append([number, number, failed[number]])
+    return [(f"page {first + 1}" if first == last else f"pages {first + 1}-{last + 1}", error)
+            for first, last, error in runs]
+
+
+def _report_failed_copies(builder, plan, first_page, page_count):
+    """Report the chunk's duplicates of pages that could not be extracted, which ``plan`` left empty."""
+    if plan is None:
+        return
+    copies = {index: f"repeats page {source + 1}, which could not be extracted"
+              for index, source in plan.failed_copies(first_page, page_count).items()}
+    for label, error in _page_ranges(copies):
+        builder.add_error(f"Could not extract {label}: {error}")
+
+
+def _chunk_failed(client, name, pdf_chunks, index, first_page, page_count, error, builder, checkpoint,
+                  timeline, dispatcher, cancel, plan=None, **span_attrs):
+    """Record chunk ``index`` failing with ``error``, keeping the pages ``_bisect_chunk`` recovers.
+
+    Only a fully recovered chunk is checkpointed, so a rerun retries the
+    pages that could not be extracted. Raises ``Cancelled`` if ``cancel``
+    trips while the halves are being requested.
+    """
+    if plan is not None:
+        page_numbers = plan.sent(first_page, page_count)
+    else:
+        page_numbers = list(range(first_page, first_page + page_count))
+    if len(page_numbers) > 1 and _splittable(error):
+        logger.warning("%s: chunk %d failed, retrying it in halves: %s", name, index + 1, error)
+        try:
+            chunk_pdf = _chunk_bytes(pdf_chunks, index, timeline, **span_attrs)
+            markdown, failed = _bisect_chunk(client, chunk_pdf, page_numbers, error, timeline, dispatcher, cancel,
+                                             **span_attrs)
+            pages = plan.expand(first_page, page_count, markdown, failed) if plan is not None else markdown
+        except Cancelled:
+            raise
+        except Exception as e:
+            logger.warning("%s: could not split chunk %d: %s", name, index + 1, e)
+        else:
+            complete = not failed and (plan is None or not plan.failed_copies(first_page, page_count))
+            if complete and checkpoint is not None:
+                with timeline.span("checkpoint_save", **span_attrs):
+                    checkpoint.put(first_page, page_count, pages)
+            builder.add_pages(pages)
+            for label, page_error in _page_ranges(failed):
+                builder.add_error(f"Could not extract {label}: {page_error}")
+            _report_failed_copies(builder, plan, first_page, page_count)
+            return
+    if plan is not None:
+        plan.fail(page_numbers)
+    if len(pdf_chunks) > 1:
+        builder.add_error(f"Error in chunk {index+1}: {error}")
+    else:
+        builder.add_error(f"Error extracting result: {error}")
+
+
+def _expanded(plan, first_page, page_count, get_pages):
+    """``get_pages`` with its response for the sent pages expanded to every page of the chunk by ``plan``."""
+    if plan is None:
+        return get_pages
+    return lambda: [TextPage(text) for text in plan.expand(first_page, page_count, [page.markdown for page in get_pages()])]
+
+
+def _dispatch_chunks(client, name, pdf_chunks, chunk_size, doc_pages, builder, on_chunk,
+                     checkpoint, timeline, dispatcher, cancel, on_partial, doc_kwargs, plan=None):
+    """Submit chunks to ``dispatcher`` ahead of the one being collected and add the results in page order.
+
+    At most the dispatcher's ``max_concurrency`` requests are outstanding:
+    the next chunk is encoded (and, for a ``packing.FrameChunks``,
+    rendered) only once an earlier one has been collected, so a long
+    document never holds every chunk's payload in memory at once. On
+    cancellation only the finished chunks before the first dropped one
+    are kept, so page numbering stays contiguous.
+    """
+    window = max(1, dispatcher.max_concurrency)
+    pending = deque()
+    outstanding = 0
+    next_chunk = 0
+
+    def submit(i):
+        first_page = i * chunk_size
+        page_count = min(chunk_size, doc_pages - first_page)
+        span_attrs = {"document": name, "chunk": i, "pages": page_count}
+        pages = _load_checkpoint(checkpoint, first_page, page_count, timeline, **span_attrs)
+        if pages is None and (plan is None or plan.sent(first_page, page_count)):
+            document = _chunk_document(pdf_chunks, i, timeline, **span_attrs)
+            pages = dispatcher.submit(client, document, timeline=timeline, cancel=cancel, **span_attrs)
+        return i, first_page, page_count, span_attrs, pages
+
+    def in_flight(pages):
+        # Checkpointed chunks are lists of pages and chunks with nothing to send are None
+        return pages is not None and not isinstance(pages, list)
+
+    try:
+        while pending or next_chunk < len(pdf_chunks):
+            while next_chunk < len(pdf_chunks) and outstanding < window:
+                pending.append(submit(next_chunk))
+                if in_flight(pending[-1][4]):
+                    outstanding += 1
+                next_chunk += 1
+            i, first_page, page_count, span_attrs, pages = pending.popleft()
+            if in_flight(pages):
+                outstanding -= 1
+            if on_chunk:
+                on_chunk(i, len(pdf_chunks))
+            try:
+                if isinstance(pages, list):
+                    if plan is not None:
+                        pages = plan.expand(first_page, page_count, pages)
+                else:
+                    future = pages
+                    pages = _chunk_result(
+                        _expanded(plan, first_page, page_count,
+                                  lambda: [] if future is None else dispatcher.result(future, cancel)),
+                        first_page, page_count, checkpoint, timeline, plan, **span_attrs
+                    )
+                builder.add_pages(pages)
+                _report_failed_copies(builder, plan, first_page, page_count)
+            except Cancelled:
+                builder.add_error(_cancelled_note(i, len(pdf_chunks)))
+                break
+            except Exception as e:
+                try:
+                    _chunk_failed(client, name, pdf_chunks, i, first_page, page_count, e, builder, checkpoint,
+                                  timeline, dispatcher, cancel, plan, **span_attrs)
+                except Cancelled:
+                    builder.add_error(_cancelled_note(i, len(pdf_chunks)))
+                    break
+            _publish(on_partial, builder, name, i + 1, len(pdf_chunks), **doc_kwargs)
+    finally:
+        for *_, pages in pending:
+            if in_flight(pages):
+                pages.cancel()
+
+
+def _ocr_chunks(client, name, pdf_chunks, chunk_size, doc_pages, builder, on_chunk,
+                checkpoint, timeline, dispatcher, cancel, on_partial, partial_kwargs, plan=None):
+    """OCR ``pdf_chunks`` (a list of PDFs or a ``packing.FrameChunks``) in page order into ``builder``.
+
+    With a ``fingerprint.PagePlan`` each chunk holds only its sent pages,
+    or is None, and its results are expanded to every page before they are
+    checkpointed.
+    """
+    if dispatcher is not None:
+        _dispatch_chunks(client, name, pdf_chunks, chunk_size, doc_pages, builder, on_chunk,
+                         checkpoint, timeline, dispatcher, cancel, on_partial, partial_kwargs, plan)
+        return
+    for i in range(len(pdf_chunks)):
+        if cancel is not None and cancel.cancelled:
+            builder.add_error(_cancelled_note(i, len(pdf_chunks)))
+            break
+        if on_chunk:
+            on_chunk(i, len(pdf_chunks))
+        first_page = i * chunk_size
+        page_count = min(chunk_size, doc_pages - first_page)
+        span_attrs = {"document": name, "chunk": i, "pages": page_count}
+        try:
+            pages = _load_checkpoint(checkpoint, first_page, page_count, timeline, **span_attrs)
+            if pages is not None:
+                if plan is not None:
+                    pages = plan.expand(first_page, page_count, pages)
+            else:
+                if plan is not None and not plan.sent(first_page, page_count):
+                    request = lambda: []
+                else:
+                    document = _chunk_document(pdf_chunks, i, timeline, **span_attrs)
+                    request = lambda: ocr_request(client, document, timeline=timeline, **span_attrs)
+                pages = _chunk_result(_expanded(plan, first_page, page_count, request),
+                                      first_page, page_count, checkpoint, timeline, plan, **span_attrs)
+            builder.add_pages(pages)
+            _report_failed_copies(builder, plan, first_page, page_count)
+        except Exception as e:
+            try:
+                _chunk_failed(client, name, pdf_chunks, i, first_page, page_count, e, builder, checkpoint,
+                              timeline, None, cancel, plan, **span_attrs)
+            except Cancelled:
+                builder.add_error(_cancelled_note(i, len(pdf_chunks)))
+                break
+        _publish(on_partial, builder, name, i + 1, len(pdf_chunks), **partial_kwargs)
+
+
+def process_pdf_bytes(client, name, pdf_bytes, chunk_size=100, page_markers=False,
+                      cleanup_level="medium", on_split=None, on_chunk=None, on_partial=None, checkpoint=None,
+                      timeline=NULL_TIMELINE, dispatcher=None, cancel=None, skip_redundant=False, **doc_kwargs):
+    """OCR a local PDF, splitting it into chunks of ``chunk_size`` pages.
+
+    ``on_split(total_pages, chunk_count)`` is called once after splitting and
+    ``on_chunk(index, chunk_count)`` before each chunk request. Chunks already
+    recorded in ``checkpoint`` (see ``journal.DocumentCheckpoint``) are not
+    sent again. Stage timings are recorded in ``timeline`` when given. With
+    a ``dispatcher`` all chunks are requested concurrently and ``on_chunk``
+    is called as each one is collected, in page order. When ``cancel`` trips,
+    remaining chunks are dropped and the pages finished so far are kept.
+
+    ``on_partial(doc, chunks_done, chunk_count)`` receives the document built
+    so far after every chunk but the last, so callers can show pages as they
+    arrive; its ``errors`` include a "Partial result" note.
+
+    With ``skip_redundant`` blank pages are not sent and get no text, and
+    pages that repeat an earlier page get its text (see
+    ``split_pdf_skipping``); page numbering is unchanged.
+    """
+    builder = DocumentBuilder(page_markers=page_markers)
+    plan = None
+    with timeline.span("split_pdf", document=name, bytes=len(pdf_bytes)):
+        if skip_redundant:
+            pdf_chunks, doc_pages, plan = split_pdf_skipping(pdf_bytes, chunk_size, name, timeline)
+        else:
+            pdf_chunks, doc_pages = split_pdf(pdf_bytes, chunk_size)
+    if on_split:
+        on_split(doc_pages, len(pdf_chunks))
+
+    _ocr_chunks(client, name, pdf_chunks, chunk_size, doc_pages, builder, on_chunk, checkpoint, timeline,
+                dispatcher, cancel, on_partial, {"file_type": "PDF", "cleanup_level": cleanup_level, **doc_kwargs}, plan)
+
+    if "preview_src" not in doc_kwargs:
+        with timeline.span("encode_preview", document=name, bytes=len(pdf_bytes)):
+            doc_kwargs["preview_src"] = data_uri(pdf_bytes, "application/pdf")
+    return _finish(builder, name, checkpoint, timeline, file_type="PDF", cleanup_level=cleanup_level, **doc_kwargs)
+
+
+def process_pdf_url(client, name, url, page_markers=False, cleanup_level="medium",
+                    checkpoint=None, timeline=NULL_TIMELINE, dispatcher=None, cancel=None, **doc_kwargs):
+    """OCR a PDF that the API fetches directly from ``url``."""
+    builder = DocumentBuilder(page_markers=page_markers)
+    try:
+        document = {"type": "document_url", "document_url": url}
+        builder.add_pages(ocr_chunk(client, document, 0, 0, checkpoint, timeline, dispatcher, cancel, document=name, chunk=0))
+    except Exception as e:
+        builder.add_error(f"Error extracting result: {e}")
+
+    doc_kwargs.setdefault("preview_src", url)
+    return _finish(builder, name, checkpoint, timeline, file_type="PDF", cleanup_level=cleanup_level, **doc_kwargs)
+
+
+def process_image_frames(client, name, image_bytes, chunk_size=100, page_markers=False,
+                         cleanup_level="medium", on_split=None, on_chunk=None, on_partial=None, checkpoint=None,
+                         timeline=NULL_TIMELINE, dispatcher=None, cancel=None, **doc_kwargs):
+    """OCR a multi-page image such as a TIFF, one page per frame.
+
+    Frames are decoded one at a time into PDF chunks of ``chunk_size``
+    pages as each chunk is sent (see ``packing.FrameChunks``), and the
+    chunks go through the same sequential or dispatched loop as
+    ``process_pdf_bytes``, with the same callbacks. The preview is the
+    first frame.
+    """
+    from .packing import FrameChunks
+
+    builder = DocumentBuilder(page_markers=page_markers)
+    try:
+        with timeline.span("open_frames", document=name, bytes=len(image_bytes)):
+            frames = FrameChunks(image_bytes, chunk_size)
+    except Exception as e:
+        builder.add_error(f"Error reading image: {e}")
+        return _finish(builder, name, checkpoint, timeline, file_type="Image", cleanup_level=cleanup_level, **doc_kwargs)
+    with frames:
+        if on_split:
+            on_split(frames.frame_count, len(frames))
+        if "image_bytes" not in doc_kwargs:
+            with timeline.span("encode_preview", document=name):
+                doc_kwargs["image_bytes"] = frames.preview()
+        _ocr_chunks(client, name, frames, chunk_size, frames.frame_count, builder, on_chunk, checkpoint, timeline,
+                    dispatcher, cancel, on_partial, {"file_type": "Image", "cleanup_level": cleanup_level, **doc_kwargs})
+    return _finish(builder, name, checkpoint, timeline, file_type="Image", cleanup_level=cleanup_level, **doc_kwargs)
+
+
+def prepare_image(image_prep, name, image_bytes, mime_type, timeline=NULL_TIMELINE):
+    """Run ``image_prep`` (an ``imaging.ImagePrep``) on one image; returns ``(bytes, mime_type)``.
+
+    Preprocessing only saves bandwidth, so an image Pillow cannot read is
+    sent unchanged.
+    """
+    start = time.perf_counter()
+    try:
+        prepared = image_prep.apply(image_bytes, mime_type)
+    except Exception as e:
+        logger.warning("%s: image preprocessing skipped: %s", name, e)
+        return image_bytes, mime_type
+    timeline.add("preprocess_image", time.perf_counter() - start, document=name,
+                 bytes=prepared.original_bytes, prepared_bytes=len(prepared.data))
+    if prepared.changes:
+        logger.info("%s: image %d -> %d bytes (%s)", name, prepared.original_bytes, len(prepared.data), ", ".join(prepared.changes))
+    return prepared.data, prepared.mime_type
+
+
+def should_tile(tiler, name, image_bytes):
+    """True if ``tiler`` (a ``tiling.ImageTiler``) would split the image; an unreadable image is sent whole."""
+    try:
+        return tiler.oversized(image_bytes)
+    except Exception as e:
+        logger.warning("%s: image tiling skipped: %s", name, e)
+        return False
+
+
+def ocr_tiles(client, name, image_bytes, tiler, checkpoint=None, timeline=NULL_TIMELINE, dispatcher=None, cancel=None):
+    """OCR an oversized image as overlapping tiles sent concurrently, merged into one page.
+
+    Every tile is submitted at once, through the process-wide dispatcher
+    when none is given. Returns ``(pages, errors)``: the merged page holds
+    the text of every tile that succeeded, and it is only checkpointed
+    when they all did. Raises if none did.
+    """
+    from .dispatch import get_dispatcher
+    from .tiling import merge_tile_text
+
+    pages = _load_checkpoint(checkpoint, 0, 1, timeline, document=name, chunk=0, pages=1)
+    if pages is not None:
+        return pages, []
+    start = time.perf_counter()
+    tiles = tiler.split(image_bytes) or []
+    timeline.add("split_tiles", time.perf_counter() - start, document=name, bytes=len(image_bytes), tiles=len(tiles))
+    logger.info("%s: split into %d tiles", name, len(tiles))
+    dispatcher = dispatcher or get_dispatcher()
+    futures = []
+    try:
+        for number, tile in enumerate(tiles):
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            with timeline.span("encode", document=name, chunk=number, bytes=len(tile.data)):
+                document = {"type": "image_url", "image_url": data_uri(tile.data, tile.mime_type)}
+            futures.append(dispatcher.submit(client, document, timeline=timeline, cancel=cancel,
+                                             document=name, chunk=number, pages=1))
+        done, texts, errors = [], [], []
+        for number, (tile, future) in enumerate(zip(tiles, futures)):
+            try:
+                texts.append("\n\n".join(page.markdown for page in dispatcher.result(future, cancel)))
+            except Cancelled:
+                raise
+            except Exception as e:
+                errors.append(f"Error in tile {number + 1} of {len(tiles)}: {e}")
+                continue
+            done.append(tile)
+    finally:
+        for future in futures:
+            future.cancel()
+    if not done:
+        error = RuntimeError(errors[0] if errors else "Image could not be split into tiles")
+        if checkpoint is not None:
+            checkpoint.fail(0, 1, error)
+        raise error
+    with timeline.span("merge_tiles", document=name, tiles=len(done)):
+        merged = TextPage(merge_tile_text(done, texts))
+    if errors:
+        return [merged.markdown], errors
+    return _chunk_result(lambda: [merged], 0, 1, checkpoint, timeline, document=name, chunk=0, pages=1), []
+
+
+def _blank_image(name, image_bytes, timeline=NULL_TIMELINE):
+    from .fingerprint import plan_images
+
+    start = time.perf_counter()
+    plan = plan_images([image_bytes])
+    _record_plan(plan, name, time.perf_counter() - start, plan.blank, timeline)
+    return plan.blank
+
+
+def process_image(client, name, image_bytes=None, mime_type=None, url=None,
+                  cleanup_level="medium", checkpoint=None, timeline=NULL_TIMELINE, dispatcher=None, cancel=None,
+                  image_prep=None, tiler=None, skip_redundant=False, **doc_kwargs):
+    """OCR a single image given either its bytes and MIME type or a URL.
+
+    With an ``imaging.ImagePrep`` the image bytes are downscaled and
+    re-encoded before upload; the document's ``image_bytes`` keep the
+    original. With a ``tiling.ImageTiler`` an oversized image is sent as
+    overlapping tiles instead, see ``ocr_tiles``. With ``skip_redundant``
+    a blank image is not sent and gets one empty page.
+    """
+    builder = DocumentBuilder()
+    if url is not None:
+        image_src = url
+    else:
+        doc_kwargs.setdefault("image_bytes", image_bytes)
+        if skip_redundant and _blank_image(name, image_bytes, timeline):
+            builder.add_page("")
+            doc_kwargs.setdefault("preview_src", data_uri(image_bytes, mime_type))
+            return _finish(builder, name, checkpoint, timeline, file_type="Image", cleanup_level=cleanup_level, **doc_kwargs)
+        if tiler is not None and should_tile(tiler, name, image_bytes):
+            try:
+                pages, errors = ocr_tiles(client, name, image_bytes, tiler, checkpoint, timeline, dispatcher, cancel)
+                builder.add_pages(pages)
+                for error in errors:
+                    builder.add_error(error)
+            except Exception as e:
+                builder.add_error(f"Error extracting result: {e}")
+            doc_kwargs.setdefault("preview_src", data_uri(image_bytes, mime_type))
+            return _finish(builder, name, checkpoint, timeline, file_type="Image", cleanup_level=cleanup_level, **doc_kwargs)
+        if image_prep is not None:
+            image_bytes, mime_type = prepare_image(image_prep, name, image_bytes, mime_type, timeline)
+        with timeline.span("encode", document=name, chunk=0, bytes=len(image_bytes)):
+            image_src = data_uri(image_bytes, mime_type)
+
+    try:
+        document = {"type": "image_url", "image_url": image_src}
+        builder.add_pages(ocr_chunk(client, document, 0, 1, checkpoint, timeline, dispatcher, cancel, document=name, chunk=0, pages=1))
+    except Exception as e:
+        builder.add_error(f"Error extracting result: {e}")
+
+    doc_kwargs.setdefault("preview_src", image_src)
+    return _finish(builder, name, checkpoint, timeline, file_type="Image", cleanup_level=cleanup_level, **doc_kwargs)
+
+
+def _request_group(client, group, uploads, timeline, dispatcher, cancel, label):
+    """Send one image, or a PDF bundle of several; returns a future with a dispatcher, else the pages."""
+    from .packing import images_to_pdf
+
+    span_attrs = {"document": label, "chunk": 0, "pages": len(group)}
+    if len(group) == 1:
+        data, mime_type = uploads[group[0]]
+        with timeline.span("encode", bytes=len(data), **span_attrs):
+            document = {"type": "image_url", "image_url": data_uri(data, mime_type)}
+    else:
+        with timeline.span("pack_images", **span_attrs):
+            pdf_bytes = images_to_pdf([uploads[index][0] for index in group])
+        with timeline.span("encode", bytes=len(pdf_bytes), **span_attrs):
+            document = {"type": "document_url", "document_url": data_uri(pdf_bytes, "application/pdf")}
+    if dispatcher is not None:
+        return dispatcher.submit(client, document, timeline=timeline, cancel=cancel, **span_attrs)
+    return ocr_request(client, document, timeline=timeline, cancel=cancel, **span_attrs)
+
+
+def process_images(client, images, cleanup_level="medium", timeline=NULL_TIMELINE, dispatcher=None, cancel=None,
+                   image_prep=None, max_pages=None, max_bytes=None, small_bytes=None, tiler=None, skip_redundant=False):
+    """OCR many images, packing small ones into multi-page PDF requests.
+
+    ``images`` is a list of dicts with ``name``, ``data`` and ``mime_type``,
+    an optional ``checkpoint`` and any other ``OCRDocument`` fields such as
+    ``display_name``. Images up to ``small_bytes`` are sent up to
+    ``max_pages`` and ``max_bytes`` at a time as one PDF, one page per
+    image, and the response pages are mapped back to the images in order.
+    One document per image is yielded, in input order, matching what
+    ``process_image`` returns. A bundle that fails, or whose response does
+    not have one page per image, is retried one image at a time. With a
+    ``dispatcher`` every request is sent at once. With a ``tiler``,
+    oversized images are sent as tiles by ``ocr_tiles`` when their turn
+    comes instead. With ``skip_redundant`` blank images are not sent and
+    get one empty page, and images that repeat an earlier one get its
+    result (see ``fingerprint.image_fingerprint``).
+    """
+    from .fingerprint import plan_images
+    from .packing import DEFAULT_BUNDLE_BYTES, DEFAULT_BUNDLE_PAGES, SMALL_IMAGE_BYTES, plan_bundles
+
+    uploads = {}
+    results = {}
+    tiled = set()
+    reuse = {}
+    if skip_redundant:
+        start = time.perf_counter()
+        plan = plan_images([image["data"] for image in images])
+        fingerprint_seconds = time.perf_counter() - start
+        reuse = {index: source for index, source in enumerate(plan.sources) if source != index}
+    for index, image in enumerate(images):
+        if index in reuse:
+            uploads[index] = (image["data"], image["mime_type"])
+            continue
+        if tiler is not None and should_tile(tiler, image["name"], image["data"]):
+            tiled.add(index)
+            uploads[index] = (image["data"], image["mime_type"])
+            continue
+        pages = _load_checkpoint(image.get("checkpoint"), 0, 1, timeline, document=image["name"], chunk=0, pages=1)
+        if pages is not None:
+            results[index] = pages
+        if image_prep is not None and pages is None:
+            uploads[index] = prepare_image(image_prep, image["name"], image["data"], image["mime_type"], timeline)
+        else:
+            uploads[index] = (image["data"], image["mime_type"])
+
+    def bundles(indices):
+        sizes = [len(uploads[index][0]) for index in indices]
+        return [
+            [indices[position] for position in group]
+            for group in plan_bundles(sizes, max_pages or DEFAULT_BUNDLE_PAGES, max_bytes or DEFAULT_BUNDLE_BYTES,
+                                      small_bytes or SMALL_IMAGE_BYTES)
+        ]
+
+    todo = [index for index in range(len(images)) if index not in results and index not in tiled and index not in reuse]
+    groups = bundles(todo)
+    if skip_redundant:
+        requests_saved = len(bundles(sorted(todo + list(reuse)))) - len(groups)
+        _record_plan(plan, f"{len(images)} images", fingerprint_seconds, requests_saved, timeline)
+
+    def send(group):
+        if cancel is not None and cancel.cancelled:
+            return Cancelled("Cancelled before it was sent")
+        label = images[group[0]]["name"] if len(group) == 1 else f"bundle of {len(group)} images"
+        try:
+            return _request_group(client, group, uploads, timeline, dispatcher, cancel, label)
+        except Exception as e:
+            return e
+
+    def collect(response):
+        if isinstance(response, Exception):
+            raise response
+        return dispatcher.result(response, cancel) if dispatcher is not None else response
+
+    def send_alone(index):
+        metrics.RETRIES.labels("bundle").inc()
+        document = {"type": "image_url", "image_url": data_uri(*uploads[index])}
+        return ocr_request(client, document, timeline=timeline, dispatcher=dispatcher, cancel=cancel,
+                           document=images[index]["name"], chunk=0, pages=1)
+
+    def settle(index, get_pages):
+        try:
+            results[index] = _chunk_result(get_pages, 0, 1, images[index].get("checkpoint"), timeline,
+                                           document=images[index]["name"], chunk=0, pages=1)
+        except Exception as e:
+            results[index] = e
+
+    def tile(index):
+        try:
+            return ocr_tiles(client, images[index]["name"], images[index]["data"], tiler, images[index].get("checkpoint"),
+                             timeline, dispatcher, cancel)
+        except Exception as e:
+            return e, []
+
+    next_index = 0
+    reused = {}
+    sources = set(reuse.values())
+
+    def finished():
+        nonlocal next_index
+        while next_index in results or next_index in tiled or next_index in reuse:
+            errors = []
+            if next_index in tiled:
+                outcome, errors = tile(next_index)
+            elif next_index in reuse:
+                outcome = [""] if reuse[next_index] is None else reused[reuse[next_index]]
+            else:
+                outcome = results.pop(next_index)
+            if next_index in sources:
+                reused[next_index] = outcome
+            yield _image_document(images[next_index], uploads[next_index], outcome, cleanup_level, timeline, errors)
+            next_index += 1
+
+    # With a dispatcher everything is in flight at once; otherwise each group is sent when it is reached
+    submitted = [send(group) for group in groups] if dispatcher is not None else None
+    try:
+        yield from finished()
+        for number, group in enumerate(groups):
+            response = submitted[number] if submitted is not None else send(group)
+            if len(group) == 1:
+                settle(group[0], lambda: collect(response))
+            else:
+                try:
+                    pages = collect(response)
+                    if len(pages) != len(group):
+                        raise ValueError(f"expected {len(group)} pages, got {len(pages)}")
+                except Cancelled as e:
+                    for index in group:
+                        results[index] = e
+                except Exception as e:
+                    logger.warning("Bundle of %d images failed, sending them one at a time: %s", len(group), e)
+                    for index in group:
+                        settle(index, lambda index=index: send_alone(index))
+                else:
+                    for index, page in zip(group, pages):
+                        settle(index, lambda page=page: [page])
+            yield from finished()
+    finally:
+        for response in submitted or []:
+            if not isinstance(response, Exception):
+                response.cancel()
+
+
+def _image_document(image, upload, outcome, cleanup_level, timeline, errors=()):
+    doc_kwargs = {key: value for key, value in image.items() if key not in ("name", "data", "mime_type", "checkpoint")}
+    doc_kwargs.setdefault("image_bytes", image["data"])
+    doc_kwargs.setdefault("preview_src", data_uri(*upload))
+    builder = DocumentBuilder()
+    if isinstance(outcome, Exception):
+        builder.add_error(f"Error extracting result: {outcome}")
+    else:
+        builder.add_pages(outcome)
+    for error in errors:
+        builder.add_error(error)
+    return _finish(builder, image["name"], image.get("checkpoint"), timeline, file_type="Image",
+                   cleanup_level=cleanup_level, **doc_kwargs)
@@ -0,0 +1,128 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILED_STAGES = frozenset({"split_pdf", "render_frames", "ocr_request", "clean_ocr_text", "create_pdf_from_markdown", "export"})
+SAMPLE_INTERVAL = 0.005
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """Profiles the hot stages of one run.
+
+    Attach it to a ``Timeline`` and every span whose stage is in ``stages``
+    runs under ``cProfile`` (for a pstats file) while a background thread
+    samples the stacks of the threads inside those spans (for a
+    collapsed-stack file that flamegraph tools read directly). Only one
+    thread at a time can hold ``cProfile``; the sampler covers all of them.
+    """
+
+    def __init__(self, stages=PROFILED_STAGES, interval=SAMPLE_INTERVAL):
+        self.stages = frozenset(stages)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._profile = cProfile.Profile()
+        self._profile_owner = None
+        self._profiled = False
+        self._active = {}
+        self._samples = Counter()
+        self._sampler = None
+
+    @contextmanager
+    def section(self, stage, frame=None):
+        """Profile the body of the ``with`` block; ``frame`` is the caller's frame."""
+        ident = threading.get_ident()
+        entry = frame or sys._getframe(2)
+        with self._lock:
+            outer = self._active.get(ident)
+            if outer is None:
+                self._active[ident] = [stage, entry, 1]
+            else:
+                outer[2] += 1
+            if self._profile_owner is None:
+                try:
+                    self._profile.enable()
+                    self._profile_owner = ident
+                    self._profiled = True
+                except ValueError:
+                    pass
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name="ocr-profiler", daemon=True)
+                self._sampler.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                state = self._active[ident]
+                state[2] -= 1
+                if state[2] == 0:
+                    del self._active[ident]
+                    if self._profile_owner == ident:
+                        self._profile.disable()
+                        self._profile_owner = None
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                active = [(ident, stage, entry) for ident, (stage, entry, _) in self._active.items()]
+            for ident, stage, entry in active:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    if frame is entry:
+                        break
+                    frame = frame.f_back
+                stack.append(stage)
+                self._samples[";".join(reversed(stack))] += 1
+
+    def stats(self):
+        """``pstats.Stats`` for the profiled sections, or None if none ran."""
+        if not self._profiled:
+            return None
+        return pstats.Stats(self._profile)
+
+    def pstats_bytes(self):
+        """The profile in the binary format written by ``pstats.Stats.dump_stats``."""
+        stats = self.stats()
+        return marshal.dumps(stats.stats) if stats is not None else b""
+
+    def collapsed(self):
+        """Sampled stacks as ``frame;frame;frame count`` lines."""
+        return "".join(f"{stack} {count}\n" for stack, count in self._samples.most_common())
+
+    def report(self, sort="cumulative", limit=30):
+        stats = self.stats()
+        if stats is None:
+            return ""
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def save(self, directory, prefix="profile"):
+        """Write ``<prefix>.pstats`` and ``<prefix>.collapsed``; returns the paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for suffix, data in (("pstats", self.pstats_bytes()), ("collapsed", self.collapsed().encode("utf-8"))):
+            path = os.path.join(directory, f"{prefix}.{suffix}")
+            with open(path, "wb") as f:
+                f.write(data)
+            paths.append(path)
+        return paths
@@ -0,0 +1,251 @@
+import argparse
+import base64
+import json
+import logging
+import os
+import re
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from . import metrics
+from .document import OCRDocument
+from .jobqueue import JobQueue
+from .journal import DEFAULT_JOURNAL_DIR, JobJournal
+from .pipeline import shortest_first
+from .workers import ProcessWorkerPool, WorkerPool
+
+logger = logging.getLogger(__name__)
+
+OPTION_FIELDS = {"chunk_size": int, "cleanup_level": str, "page_markers": bool, "preprocess_images": bool, "tile_images": bool,
+                 "skip_redundant_pages": bool,
+                 "download_pdf_urls": bool, "shortest_first": bool}
+JOB_PATH = re.compile(r"^/jobs/(?P<job>[\w-]+)$")
+DOCUMENT_PATH = re.compile(r"^/jobs/(?P<job>[\w-]+)/documents/(?P<doc>\d+)$")
+PAGE_PATH = re.compile(r"^/jobs/(?P<job>[\w-]+)/documents/(?P<doc>\d+)/pages/(?P<page>\d+)$")
+
+
+class BadRequest(Exception):
+    pass
+
+
+def guess_file_type(name, mime_type=None):
+    if (mime_type or "").startswith("image/"):
+        return "Image"
+    if (mime_type or "") == "application/pdf" or name.lower().endswith(".pdf"):
+        return "PDF"
+    return "Image" if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff")) else "PDF"
+
+
+def parse_options(raw):
+    options = {}
+    for field, cast in OPTION_FIELDS.items():
+        if field not in raw:
+            continue
+        value = raw[field]
+        if cast is bool and isinstance(value, str):
+            value = value.lower() in ("1", "true", "yes")
+        try:
+            options[field] = cast(value)
+        except (TypeError, ValueError):
+            raise BadRequest(f"Invalid value for {field!r}")
+    if options.get("cleanup_level") == "none":
+        options["cleanup_level"] = None
+    return options
+
+
+def parse_json_submission(body):
+    """Turn a JSON job request into queue entries and options."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise BadRequest("Request body is not valid JSON")
+    entries = []
+    for n, entry in enumerate(payload.get("documents") or []):
+        if entry.get("url"):
+            url = entry["url"].strip()
+            name = entry.get("name") or url.split("/")[-1] or f"url_document_{n+1}"
+            entries.append({
+                "name": os.path.splitext(name)[0] or f"url_document_{n+1}",
+                "url": url,
+                "file_type": entry.get("file_type") or guess_file_type(name),
+            })
+        elif entry.get("content_base64"):
+            name = entry.get("name") or f"document_{n+1}"
+            try:
+                data = base64.b64decode(entry["content_base64"], validate=True)
+            except ValueError:
+                raise BadRequest(f"Document {n} has invalid base64 content")
+            entries.append({
+                "name": os.path.splitext(name)[0],
+                "data": data,
+                "mime_type": entry.get("mime_type"),
+                "file_type": entry.get("file_type") or guess_file_type(name, entry.get("mime_type")),
+            })
+        else:
+            raise BadRequest(f"Document {n} needs either 'url' or 'content_base64'")
+    if not entries:
+        raise BadRequest("No documents given")
+    return entries, parse_options(payload.get("options") or {})
+
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    """JSON API for submitting OCR jobs and reading their results."""
+
+    server_version = "MistralOCR/1.0"
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.server.max_upload_bytes:
+            raise BadRequest(f"Upload exceeds {self.server.max_upload_bytes} bytes")
+        return self.rfile.read(length)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            return self._send_json(404, {"error": "Not found"})
+        try:
+            content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+            body = self._read_body()
+            if content_type == "application/json":
+                entries, options = parse_json_submission(body)
+            else:
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                name = query.get("name") or "document"
+                if not body:
+                    raise BadRequest("Empty upload")
+                entries = [{
+                    "name": os.path.splitext(name)[0],
+                    "data": body,
+                    "mime_type": content_type or None,
+                    "file_type": guess_file_type(name, content_type),
+                }]
+                options = parse_options(query)
+        except BadRequest as e:
+            return self._send_json(400, {"error": str(e)})
+
+        order = shortest_first([entry.get("data") for entry in entries]) if options.get("shortest_first") else None
+        job_id = self.server.queue.submit(entries, options, order=order)
+        self._send_json(202, {"job_id": job_id, "status_url": f"/jobs/{job_id}", "documents": len(entries)})
+
+    def do_DELETE(self):
+        match = JOB_PATH.match(urlparse(self.path).path.rstrip("/"))
+        if not match:
+            return self._send_json(404, {"error": "Not found"})
+        queue = self.server.queue
+        if queue.job_status(match["job"]) is None:
+            return self._send_json(404, {"error": "Unknown job"})
+        queue.cancel(match["job"])
+        self._send_json(202, queue.job_status(match["job"]))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/") or "/"
+        queue = self.server.queue
+
+        if path == "/health":
+            return self._send_json(200, {"status": "ok", "queue_depth": queue.depth()})
+
+        if path == "/metrics":
+            body = metrics.REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        match = JOB_PATH.match(path)
+        if match:
+            status = queue.job_status(match["job"])
+            if status is None:
+                return self._send_json(404, {"error": "Unknown job"})
+            return self._send_json(200, status)
+
+        match = DOCUMENT_PATH.match(path) or PAGE_PATH.match(path)
+        if not match:
+            return self._send_json(404, {"error": "Not found"})
+        result = queue.load_result(match["job"], int(match["doc"]))
+        if result is None:
+            status = queue.job_status(match["job"])
+            if status is None or int(match["doc"]) >= len(status["documents"]):
+                return self._send_json(404, {"error": "Unknown document"})
+            return self._send_json(409, {"error": "Document not finished", "status": status["documents"][int(match["doc"])]["status"]})
+
+        if "page" not in match.groupdict():
+            raw = parse_qs(url.query).get("raw", ["0"])[0] in ("1", "true")
+            return self._send_json(200, {
+                "name": result["name"],
+                "page_count": result["page_count"],
+                "errors": result["errors"],
+                "content": result["text"] if raw else result["cleaned"],
+            })
+        page = int(match["page"])
+        if page >= result["page_count"]:
+            return self._send_json(404, {"error": "Unknown page"})
+        return self._send_json(200, {"name": result["name"], "page": page, "markdown": OCRDocument.from_dict(result).page(page)})
+
+
+class OCRServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, queue, max_upload_bytes):
+        super().__init__(address, OCRRequestHandler)
+        self.queue = queue
+        self.max_upload_bytes = max_upload_bytes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m ocr_pipeline.server",
+        description="HTTP job API in front of the OCR pipeline."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8502, help="Port (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=4, help="Worker threads processing the queue (default: %(default)s)")
+    parser.add_argument("--processes", type=int, default=0, help="Run --workers threads in each of this many worker processes instead of in the server process")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="Queue and journal location (default: %(default)s)")
+    parser.add_argument("--max-upload-mb", type=int, default=200, help="Largest accepted request body (default: %(default)s)")
+    parser.add_argument("--api-key", default=os.environ.get("MISTRAL_API_KEY"), help="Mistral API key (default: $MISTRAL_API_KEY)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.api_key:
+        logger.error("No API key given; pass --api-key or set MISTRAL_API_KEY")
+        return 2
+
+    queue = JobQueue(args.journal_dir)
+    metrics.QUEUE_DEPTH.set_function(queue.depth)
+    if args.processes:
+        pool = ProcessWorkerPool(args.api_key, args.journal_dir, args.processes, args.workers)
+    else:
+        pool = WorkerPool(queue, args.api_key, size=args.workers, journal=JobJournal(args.journal_dir))
+    pool.start()
+    server = OCRServer((args.host, args.port), queue, args.max_upload_mb * 1024 * 1024)
+    logger.info("Listening on http://%s:%d with %d worker(s)", args.host, args.port, args.workers * max(1, args.processes))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.stop(timeout=5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import concurrent.futures
+import hashlib
+import os
+import threading
+import time
+
+from . import metrics
+from .cancellation import Cancelled
+from .timing import NULL_TIMELINE
+
+WAIT_POLL = 0.25
+
+
+def request_key(model, payload, include_image_base64=True):
+    """Hash of everything that determines an OCR response: the model, the options and the document."""
+    digest = hashlib.sha256(f"{model}\0{include_image_base64}\0{payload.get('type', '')}\0".encode("utf-8"))
+    digest.update((payload.get("document_url") or payload.get("image_url") or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+class InFlightRequests:
+    """Process-wide registry of OCR requests being sent, so identical ones share a single call.
+
+    The first caller for a key sends the request; callers that arrive
+    while it is in flight wait for its response instead of sending their
+    own, whichever session, worker thread or dispatcher they come from. A
+    failed or cancelled request is not shared: callers waiting on it send
+    their own, so one session's error or cancellation never reaches
+    another. With ``enabled`` false every caller sends its own request.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._flights)
+
+    def join(self, key):
+        """``(future, leader)`` for ``key``: a new flight to complete if ``leader``, else one to wait for."""
+        if not self.enabled:
+            future = concurrent.futures.Future()
+            future.set_running_or_notify_cancel()
+            return future, True
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                metrics.CACHE_LOOKUPS.labels("in_flight", "hit").inc()
+                return future, False
+            future = concurrent.futures.Future()
+            # Running futures can't be cancelled, so a waiter giving up never cancels the flight
+            future.set_running_or_notify_cancel()
+            self._flights[key] = future
+        metrics.CACHE_LOOKUPS.labels("in_flight", "miss").inc()
+        return future, True
+
+    def land(self, key, future, result=None, error=None):
+        """Complete the flight ``future`` the leader for ``key`` started and remove it."""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    def wait(future, cancel=None):
+        """The shared response, or None if the flight failed and the caller should send its own."""
+        while not future.done():
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            concurrent.futures.wait([future], timeout=WAIT_POLL if cancel is not None else None)
+        return None if future.exception() is not None else future.result()
+
+    def run(self, key, call, cancel=None, timeline=NULL_TIMELINE, **span_attrs):
+        """``call()``, or the response of an identical call already in flight."""
+        future, leader = self.join(key)
+        if not leader:
+            start = time.perf_counter()
+            pages = self.wait(future, cancel)
+            if pages is None:
+                return call()
+            timeline.add("ocr_shared", time.perf_counter() - start, **span_attrs)
+            return pages
+        try:
+            pages = call()
+        except BaseException as e:
+            self.land(key, future, error=e if isinstance(e, Exception) else Cancelled("Interrupted"))
+            raise
+        self.land(key, future, pages)
+        return pages
+
+
+IN_FLIGHT = InFlightRequests(enabled=os.environ.get("OCR_SHARE_REQUESTS", "1") != "0")
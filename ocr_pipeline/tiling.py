@@ -0,0 +1,144 @@
+import io
+import math
+import re
+
+from .imaging import DEFAULT_QUALITY, encode_image, flatten
+
+DEFAULT_TILE_SIZE = 2048
+DEFAULT_TILE_OVERLAP = 192
+DEFAULT_MIN_TILE_PIXELS = 16_000_000
+OVERLAP_WINDOW = 8
+MIN_OVERLAP_CHARS = 12
+
+
+def _spans(length, size, overlap):
+    """``(start, end)`` ranges of at most ``size`` covering ``length``, each overlapping the next by ``overlap``."""
+    if length <= size:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (size - overlap))
+    step = (length - overlap) / count
+    return [(round(i * step), min(length, round((i + 1) * step + overlap))) for i in range(count)]
+
+
+def plan_tiles(width, height, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP):
+    """Tile boxes ``(row, column, (left, top, right, bottom))`` for a ``width`` x ``height`` image, row by row.
+
+    Tiles are ``tile_size`` high and up to twice as wide, so most pages
+    are cut into full-width strips and lines of text stay whole; only very
+    wide images are also split into columns.
+    """
+    rows = _spans(height, tile_size, overlap)
+    columns = _spans(width, 2 * tile_size, overlap)
+    return [
+        (row, column, (left, top, right, bottom))
+        for row, (top, bottom) in enumerate(rows)
+        for column, (left, right) in enumerate(columns)
+    ]
+
+
+class Tile:
+    """One encoded tile of a larger image and its place in the grid."""
+
+    __slots__ = ("row", "column", "box", "data", "mime_type")
+
+    def __init__(self, row, column, box, data, mime_type):
+        self.row = row
+        self.column = column
+        self.box = box
+        self.data = data
+        self.mime_type = mime_type
+
+    def __repr__(self):
+        return f"Tile(row={self.row}, column={self.column}, box={self.box}, {len(self.data)} bytes)"
+
+
+class ImageTiler:
+    """Splits oversized images into overlapping tiles that are OCR'd separately.
+
+    Images over ``min_pixels`` are turned upright, flattened and cut into
+    tiles ``tile_size`` pixels high that overlap by ``overlap`` pixels, so
+    a line of text cut by one tile edge appears whole in the neighbouring
+    tile. Each tile is encoded like ``imaging.ImagePrep`` output.
+    """
+
+    def __init__(self, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP, min_pixels=DEFAULT_MIN_TILE_PIXELS,
+                 quality=DEFAULT_QUALITY):
+        if overlap >= tile_size:
+            raise ValueError("Tile overlap must be smaller than the tile size")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.min_pixels = min_pixels
+        self.quality = quality
+
+    def oversized(self, data):
+        """True if the image ``data`` is large enough to be tiled; reads only the header."""
+        from PIL import Image
+
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+        return width * height > self.min_pixels
+
+    def split(self, data):
+        """The tiles of the image ``data`` in reading order, or None if it is small enough to send whole."""
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            if width * height <= self.min_pixels:
+                return None
+            image = flatten(ImageOps.exif_transpose(image), keep_bilevel=True)
+        tiles = []
+        for row, column, box in plan_tiles(*image.size, self.tile_size, self.overlap):
+            encoded, mime_type = encode_image(image.crop(box), self.quality)
+            tiles.append(Tile(row, column, box, encoded, mime_type))
+        return tiles
+
+
+def _normalize(line):
+    return re.sub(r"\s+", " ", line).strip().lower()
+
+
+def _overlap(previous, lines, window=OVERLAP_WINDOW):
+    """Lines to drop where ``lines`` overlap ``previous``, the text of the tile above.
+
+    The longest run of lines at the top of this tile that matches the
+    bottom of the tile above is repeated text from the overlap. Either
+    side may also have one line cut in half by its tile edge. Returns how
+    many leading ``lines`` to drop and the index of a cut line at the end
+    of ``previous`` to drop, or None.
+    """
+    tail = [(position, _normalize(line)) for position, line in enumerate(previous) if line.strip()][-window:]
+    head = [(position, _normalize(line)) for position, line in enumerate(lines) if line.strip()][:window]
+    for length in range(min(len(tail), len(head)), 0, -1):
+        for skip in (0, 1):
+            for trim in (0, 1):
+                run = head[skip:skip + length]
+                end = len(tail) - trim
+                if len(run) < length or end < length:
+                    continue
+                if [text for _, text in run] == [text for _, text in tail[end - length:end]] and \
+                        sum(len(text) for _, text in run) >= MIN_OVERLAP_CHARS:
+                    return run[-1][0] + 1, tail[-1][0] if trim else None
+    return 0, None
+
+
+def merge_tile_text(tiles, texts):
+    """Join the markdown ``texts`` of ``tiles`` in reading order, dropping lines repeated in the overlaps.
+
+    Each tile's text is compared with the text of the tile above it; the
+    overlap shared with the tile to its left cuts across lines, so it is
+    kept as is.
+    """
+    above = {}
+    parts = []
+    for tile, text in zip(tiles, texts):
+        lines = text.splitlines()
+        if tile.column in above:
+            previous = above[tile.column]
+            drop, cut = _overlap(previous, lines)
+            lines = lines[drop:]
+            if cut is not None:
+                previous[cut] = ""
+        parts.append(lines)
+        above[tile.column] = lines
+    return "\n\n".join(text for text in ("\n".join(lines).strip() for lines in parts) if text)
@@ -0,0 +1,113 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Timeline:
+    """Collects timing spans for the stages of one processing run.
+
+    Spans are recorded as offsets from the start of the run, with
+    attributes such as the document name and chunk index, so a slow run
+    can be broken down by stage, document and chunk. With a
+    ``profiling.Profiler`` attached, its stages are also profiled.
+    """
+
+    def __init__(self, profiler=None):
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+        self.profiler = profiler
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        if self.profiler is not None and stage in self.profiler.stages:
+            with self.profiler.section(stage, sys._getframe(2)), self._timed(stage, attrs):
+                yield
+        else:
+            with self._timed(stage, attrs):
+                yield
+
+    @contextmanager
+    def profiled(self, stage):
+        """Profile the block as ``stage`` without recording a span, for a span's work done on another thread."""
+        if self.profiler is not None and stage in self.profiler.stages:
+            with self.profiler.section(stage, sys._getframe(2)):
+                yield
+        else:
+            yield
+
+    @contextmanager
+    def _timed(self, stage, attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, start - self._origin, **attrs)
+
+    def add(self, stage, duration, offset=None, **attrs):
+        if offset is None:
+            offset = time.perf_counter() - self._origin - duration
+        with self._lock:
+            self.spans.append({"stage": stage, "start": round(offset, 6), "duration": round(duration, 6), **attrs})
+
+    def summary(self):
+        """Per-stage totals: calls, total, mean and max seconds."""
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = stages.setdefault(span["stage"], {"calls": 0, "total": 0.0, "max": 0.0})
+            entry["calls"] += 1
+            entry["total"] += span["duration"]
+            entry["max"] = max(entry["max"], span["duration"])
+        for entry in stages.values():
+            entry["mean"] = entry["total"] / entry["calls"]
+        return dict(sorted(stages.items(), key=lambda item: -item[1]["total"]))
+
+    def by_document(self):
+        """Per-document, per-stage total seconds."""
+        documents = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            name = span.get("document")
+            if name is None:
+                continue
+            stages = documents.setdefault(name, {})
+            stages[span["stage"]] = stages.get(span["stage"], 0.0) + span["duration"]
+        return documents
+
+    def to_json(self):
+        with self._lock:
+            spans = list(self.spans)
+        return json.dumps({
+            "started_at": self.started_at,
+            "summary": self.summary(),
+            "spans": spans,
+        }, indent=2)
+
+
+class NullTimeline:
+    """Stand-in used when no timeline is passed; records nothing."""
+
+    profiler = None
+
+    def __bool__(self):
+        return False
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        yield
+
+    @contextmanager
+    def profiled(self, stage):
+        yield
+
+    def add(self, stage, duration, offset=None, **attrs):
+        pass
+
+
+NULL_TIMELINE = NullTimeline()
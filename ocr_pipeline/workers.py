@@ -0,0 +1,263 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from .cancellation import PollingCancelToken
+from .client import get_client
+from .download import PdfDownloader, download_pdf
+from .imaging import ImagePrep
+from .jobqueue import LEASE_SECONDS, JobQueue
+from .journal import DEFAULT_JOURNAL_DIR, JobJournal, source_key
+from .packing import is_tiff
+from .pipeline import process_image, process_image_frames, process_pdf_bytes, process_pdf_url
+from .tiling import ImageTiler
+
+logger = logging.getLogger(__name__)
+
+
+def process_item(client, item, journal=None, cancel=None):
+    """Run one queue item through the pipeline and return its OCRDocument."""
+    options = item["options"]
+    cleanup_level = options.get("cleanup_level", "medium")
+    doc_kwargs = {"display_name": item["url"] or item["name"], "preview_src": None}
+
+    data = None
+    if item["payload_path"]:
+        with open(item["payload_path"], "rb") as f:
+            data = f.read()
+    elif item["file_type"] == "PDF" and options.get("download_pdf_urls"):
+        # Large PDFs are fetched here and chunked like uploads; None keeps the URL. Queue items can
+        # come from API clients, so only public hosts are fetched
+        downloader = PdfDownloader(cache_dir=os.path.join(journal.directory, "downloads") if journal is not None else None,
+                                   public_only=True)
+        data = download_pdf(downloader, item["name"], item["url"], cancel=cancel)
+
+    checkpoint = None
+    if journal is not None:
+        checkpoint = journal.checkpoint(
+            item["job_id"],
+            source_key(data) if data is not None else source_key(item["url"].encode("utf-8"), url=True),
+            item["name"],
+            item["url"] or item["name"]
+        )
+
+    if item["file_type"] == "PDF" and data is None:
+        return process_pdf_url(
+            client, item["name"], item["url"],
+            page_markers=options.get("page_markers", False),
+            cleanup_level=cleanup_level,
+            checkpoint=checkpoint,
+            cancel=cancel,
+            **doc_kwargs
+        )
+    if item["file_type"] == "PDF":
+        return process_pdf_bytes(
+            client, item["name"], data,
+            chunk_size=options.get("chunk_size", 100),
+            page_markers=options.get("page_markers", False),
+            cleanup_level=cleanup_level,
+            checkpoint=checkpoint,
+            cancel=cancel,
+            skip_redundant=options.get("skip_redundant_pages", False),
+            **doc_kwargs
+        )
+    if data is None:
+        return process_image(
+            client, item["name"], url=item["url"],
+            cleanup_level=cleanup_level,
+            checkpoint=checkpoint,
+            cancel=cancel,
+            **doc_kwargs
+        )
+    if is_tiff(data):
+        return process_image_frames(
+            client, item["name"], data,
+            chunk_size=options.get("chunk_size", 100),
+            page_markers=options.get("page_markers", False),
+            cleanup_level=cleanup_level,
+            checkpoint=checkpoint,
+            cancel=cancel,
+            image_bytes=None,
+            **doc_kwargs
+        )
+    return process_image(
+        client, item["name"], image_bytes=data, mime_type=item["mime_type"] or "image/png",
+        cleanup_level=cleanup_level,
+        checkpoint=checkpoint,
+        cancel=cancel,
+        image_prep=ImagePrep() if options.get("preprocess_images") else None,
+        tiler=ImageTiler() if options.get("tile_images") else None,
+        skip_redundant=options.get("skip_redundant_pages", False),
+        **doc_kwargs
+    )
+
+
+class WorkerPool:
+    """Threads that claim items from a JobQueue and process them.
+
+    A heartbeat thread renews the lease on the items they hold every
+    ``heartbeat`` seconds, so other pools sharing the queue never take them
+    over. With ``requeue`` it also returns items abandoned by a worker
+    that died (see ``JobQueue.requeue_stale``) to the queue, at start and
+    on every heartbeat.
+    """
+
+    def __init__(self, queue, api_key, size=4, journal=None, poll_interval=1.0, requeue=True,
+                 heartbeat=LEASE_SECONDS / 4):
+        self.queue = queue
+        self.requeue = requeue
+        self.api_key = api_key
+        self.size = size
+        self.journal = journal
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._stop = threading.Event()
+        self._threads = []
+        self._names = []
+
+    def start(self):
+        if self.requeue:
+            requeued = self.queue.requeue_stale()
+            if requeued:
+                logger.info("Requeued %d item(s) abandoned by a stopped worker", requeued)
+        client = get_client(self.api_key, max_connections=self.size)
+        for n in range(self.size):
+            name = f"{socket.gethostname()}:{os.getpid()}:{n}"
+            self._names.append(name)
+            thread = threading.Thread(target=self._run, args=(client, name), name=f"ocr-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._beat, name="ocr-worker-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _beat(self):
+        while not self._stop.wait(self.heartbeat):
+            try:
+                self.queue.renew(self._names)
+                if self.requeue:
+                    self.queue.requeue_stale()
+            except Exception:
+                logger.exception("Worker heartbeat failed")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._names = []
+
+    def _run(self, client, name):
+        while not self._stop.is_set():
+            item = self.queue.claim(name)
+            if item is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            cancel = PollingCancelToken(lambda: self.queue.is_cancelled(item["item_id"]))
+            try:
+                doc = process_item(client, item, self.journal, cancel)
+                self.queue.complete(item, doc)
+                logger.info("%s: job %s document %d done (%d pages)", name, item["job_id"], item["position"], doc.page_count)
+            except Exception as e:
+                logger.exception("%s: job %s document %d failed", name, item["job_id"], item["position"])
+                self.queue.fail(item, e)
+
+
+def _worker_process(directory, api_key, threads, stop_event):
+    """Entry point of one worker process: a thread pool on its own SQLite connections."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    queue = JobQueue(directory)
+    pool = WorkerPool(queue, api_key, size=threads, journal=JobJournal(directory))
+    pool.start()
+    stop_event.wait()
+    pool.stop()
+    queue.close()
+
+
+class ProcessWorkerPool:
+    """Worker processes sharing one on-disk JobQueue.
+
+    Splitting, base64 encoding, cleanup and result serialization run in the
+    worker processes, so a heavy batch uses the machine's cores instead of
+    competing for the GIL with the process that submitted it.
+    """
+
+    def __init__(self, api_key, directory=DEFAULT_JOURNAL_DIR, processes=None, threads_per_process=2):
+        self.api_key = api_key
+        self.directory = directory
+        self.processes = processes or os.cpu_count() or 1
+        self.threads_per_process = threads_per_process
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._procs = []
+
+    @property
+    def alive(self):
+        return sum(1 for proc in self._procs if proc.is_alive())
+
+    def start(self):
+        queue = JobQueue(self.directory)
+        requeued = queue.requeue_stale()
+        queue.close()
+        if requeued:
+            logger.info("Requeued %d item(s) abandoned by a stopped worker", requeued)
+        for n in range(self.processes):
+            proc = self._context.Process(
+                target=_worker_process,
+                args=(self.directory, self.api_key, self.threads_per_process, self._stop),
+                name=f"ocr-worker-{n}",
+                daemon=True
+            )
+            proc.start()
+            self._procs.append(proc)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m ocr_pipeline.workers",
+        description="Run worker processes that drain the local OCR job queue."
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=2, help="Concurrent documents per process (default: %(default)s)")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="Queue and journal location (default: %(default)s)")
+    parser.add_argument("--api-key", default=os.environ.get("MISTRAL_API_KEY"), help="Mistral API key (default: $MISTRAL_API_KEY)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.api_key:
+        logger.error("No API key given; pass --api-key or set MISTRAL_API_KEY")
+        return 2
+    pool = ProcessWorkerPool(args.api_key, args.journal_dir, args.processes, args.threads)
+    pool.start()
+    logger.info("Started %d worker process(es) x %d thread(s)", args.processes, args.threads)
+    try:
+        while pool.alive:
+            time.sleep(1)
+        logger.error("All worker processes exited")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import os
+
+from ocr_pipeline.cli import is_up_to_date, iter_input_paths, output_clashes
+from ocr_pipeline.export import output_paths
+
+
+def touch(path, data=b""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_same_stem_inputs_get_their_own_outputs(tmp_path):
+    inputs = tmp_path / "in"
+    for relative in ("x.pdf", "x.png", os.path.join("a", "report.pdf"), os.path.join("b", "report.pdf")):
+        touch(os.path.join(inputs, relative))
+    found = list(iter_input_paths([str(inputs)]))
+    names = sorted(name for _, name in found)
+    assert names == sorted(["x.pdf", "x.png", os.path.join("a", "report.pdf"), os.path.join("b", "report.pdf")])
+    assert output_clashes(found) == []
+    outputs = [output_paths(name, str(tmp_path / "out"), ("md",))["md"] for _, name in found]
+    assert len(set(outputs)) == len(outputs)
+
+
+def test_output_of_one_stem_does_not_make_another_up_to_date(tmp_path):
+    pdf = touch(os.path.join(tmp_path, "in", "x.pdf"))
+    png = touch(os.path.join(tmp_path, "in", "x.png"))
+    out = str(tmp_path / "out")
+    touch(output_paths("x.pdf", out, ("md",))["md"])
+    os.utime(pdf, (0, 0))
+    os.utime(png, (0, 0))
+    assert is_up_to_date(pdf, "x.pdf", out, ("md",))
+    assert not is_up_to_date(png, "x.png", out, ("md",))
+
+
+def test_inputs_named_alike_from_different_roots_clash(tmp_path):
+    first = touch(os.path.join(tmp_path, "a", "report.pdf"))
+    second = touch(os.path.join(tmp_path, "b", "report.pdf"))
+    found = list(iter_input_paths([first, second]))
+    assert [name for _, name in found] == ["report.pdf", "report.pdf"]
+    assert output_clashes(found) == [[first, second]]
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+PyPDF2 = pytest.importorskip("PyPDF2")
+
+from ocr_pipeline.fingerprint import pdf_page_fingerprint
+
+
+def stream(data, extra=""):
+    return f"<< /Length {len(data)}{extra} >>\nstream\n{data}\nendstream"
+
+
+def build_pdf(pages):
+    """A PDF with a page per ``(content, annotations)``; annotations are dictionary strings that
+    may use ``{stream}`` to refer to an appearance stream given after them."""
+    objects = [None, None]
+    kids = []
+    for content, annotations in pages:
+        objects.append(stream(content))
+        content_id = len(objects)
+        annotation_ids = []
+        for annotation, appearance in annotations:
+            if appearance is not None:
+                objects.append(stream(appearance, " /Type /XObject /Subtype /Form /BBox [0 0 200 50]"
+                                                  " /Resources << /Font << /F1 << /Type /Font /Subtype /Type1"
+                                                  " /BaseFont /Helvetica >> >> >>"))
+                annotation = annotation.replace("{stream}", f"{len(objects)} 0 R")
+            objects.append(annotation)
+            annotation_ids.append(len(objects))
+        annots = f" /Annots [{' '.join(f'{i} 0 R' for i in annotation_ids)}]" if annotation_ids else ""
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content_id} 0 R{annots} >>")
+        kids.append(len(objects))
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    out.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return PyPDF2.PdfReader(io.BytesIO(out.getvalue())).pages
+
+
+def free_text(text):
+    return (f"<< /Type /Annot /Subtype /FreeText /Rect [100 600 300 650] /Contents ({text}) /AP << /N {{stream}} >> >>",
+            f"BT /F1 12 Tf 5 20 Td ({text}) Tj ET")
+
+
+def test_annotation_only_pages_are_not_blank():
+    pages = build_pdf([
+        ("", []),
+        ("", [free_text("Approved")]),
+        ("", [free_text("Rejected")]),
+        ("", [("<< /Type /Annot /Subtype /Widget /FT /Tx /Rect [100 600 300 650] /AP << /N {stream} >> >>", "")]),
+        ("", [("<< /Type /Annot /Subtype /Stamp /F 2 /Rect [100 600 300 650] /AP << /N {stream} >> >>",
+               "0 0 m 10 10 l S")]),
+        ("", [("<< /Type /Annot /Subtype /Text /Rect [100 600 120 620] /Contents (Note) >>", None)]),
+    ])
+    fingerprints = [pdf_page_fingerprint(page) for page in pages]
+    # Empty page, FreeText, another FreeText, empty form field, hidden stamp, note drawn by the viewer
+    assert [blank for _, blank in fingerprints] == [True, False, False, True, True, False]
+    keys = [keys[0] for keys, _ in fingerprints]
+    assert len({keys[0], keys[1], keys[2]}) == 3
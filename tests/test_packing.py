@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+pytest.importorskip("PIL")
+PyPDF2 = pytest.importorskip("PyPDF2")
+
+from PIL import Image, ImageOps
+
+from ocr_pipeline.imaging import EXIF_ORIENTATION
+from ocr_pipeline.packing import images_to_pdf
+
+
+def rotated_jpeg(orientation):
+    # Wide image with a red block in its top-left corner, stored sideways
+    image = Image.new("RGB", (120, 60), "white")
+    image.paste((255, 0, 0), (0, 0, 30, 30))
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=95, exif=exif)
+    return out.getvalue()
+
+
+def embedded_image(pdf):
+    page = PyPDF2.PdfReader(io.BytesIO(pdf)).pages[0]
+    xobject = page["/Resources"]["/XObject"]["/Im0"].get_object()
+    return page, xobject
+
+
+@pytest.mark.parametrize("orientation", [3, 6, 8])
+def test_rotated_jpeg_is_packed_upright(orientation):
+    data = rotated_jpeg(orientation)
+    with Image.open(io.BytesIO(data)) as image:
+        expected = ImageOps.exif_transpose(image).convert("RGB")
+
+    page, xobject = embedded_image(images_to_pdf([data]))
+    assert (xobject["/Width"], xobject["/Height"]) == expected.size
+    assert [float(side) for side in page.mediabox[2:]] == list(expected.size)
+    with Image.open(io.BytesIO(xobject.get_data())) as embedded:
+        assert embedded.getexif().get(EXIF_ORIENTATION, 1) == 1
+        embedded = embedded.convert("RGB")
+        red = [(x, y) for x, y in ((5, 5), (expected.width - 5, 5), (5, expected.height - 5),
+                                   (expected.width - 5, expected.height - 5))
+               if expected.getpixel((x, y))[0] > 200 and expected.getpixel((x, y))[1] < 80]
+        assert len(red) == 1
+        pixel = embedded.getpixel(red[0])
+        assert pixel[0] > 200 and pixel[1] < 80
+
+
+def test_upright_jpeg_is_embedded_as_is():
+    data = rotated_jpeg(1)
+    _, xobject = embedded_image(images_to_pdf([data]))
+    assert xobject.get_data() == data